@@ -0,0 +1,153 @@
+# answer_checkers.py
+# How each activity type is graded. Every type registers a compile function that turns a
+# lesson into a Checker: the question and answer shown back to the kid, and an accepts()
+# that does the least possible work per response (answers and option sets are normalized
+# once, when the catalog loads the lesson; see lesson_catalog.py). Grading an answer is
+# then a dict lookup for the lesson's checker plus that comparison.
+#
+# To add an activity type, register a compile function for it here (or from another module
+# imported at startup) and give it a bit and a field in lesson_progress.ACTIVITY_BITS and
+# ACTIVITY_FIELDS; a lesson has the activity when that field is set.
+import logging
+import os
+import re
+from fractions import Fraction
+
+from lesson_progress import ACTIVITY_FIELDS
+
+logger = logging.getLogger(__name__)
+
+# activity_type -> compile function (lesson -> Checker)
+CHECKERS = {}
+
+# Math answers: an optional sign, digits and an optional decimal part, or a simple a/b.
+# Checked before Fraction() sees the text, since Fraction also takes exponents and
+# "1e10000000" would tie up a worker.
+MAX_NUMBER_LENGTH = 32
+NUMBER_RE = re.compile(r'[+-]?(?:\d+(?:\.\d*)?|\.\d+|\d+/\d+)', re.ASCII)
+
+class Checker:
+    __slots__ = ('question', 'correct_answer', 'accepts')
+
+    def __init__(self, question, correct_answer, accepts):
+        self.question = question
+        self.correct_answer = correct_answer
+        self.accepts = accepts
+
+def register(activity_type):
+    def decorator(compile_fn):
+        CHECKERS[activity_type] = compile_fn
+        return compile_fn
+    return decorator
+
+def compile_lesson(lesson):
+    """{activity_type: Checker} for the activities this lesson has. An activity whose checker
+    fails to compile (bad lesson data) is left out, which also leaves it out of the lesson's
+    expected progress mask, so the rest of the lesson can still be completed."""
+    checkers = {}
+    for activity_type, compile_fn in CHECKERS.items():
+        if getattr(lesson, ACTIVITY_FIELDS[activity_type], None) is None:
+            continue
+        try:
+            checkers[activity_type] = compile_fn(lesson)
+        except Exception as e:
+            logger.error(f"Could not compile {activity_type} checker for lesson {lesson.id}, "
+                         f"leaving the activity out: {e}")
+    return checkers
+
+def never(response):
+    return False
+
+def spelling_tolerance():
+    """Typos forgiven in spell/sound answers (edit distance); 0, the default, means exact."""
+    return int(os.environ.get('SPELLING_EDIT_TOLERANCE', 0))
+
+def within_edit_distance(a, b, limit):
+    """Whether a and b are at most `limit` insertions, deletions or substitutions apart."""
+    if abs(len(a) - len(b)) > limit:
+        return False
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return False
+        previous = current
+    return previous[-1] <= limit
+
+def option_checker(question, answer, options, lesson_id, activity_type):
+    # A response must be one of the options exactly; it is right if it equals the answer
+    # ignoring case, so the accepted set is the options that do
+    options = frozenset(options)
+    accepted = frozenset(option for option in options if option.lower() == answer.lower())
+
+    def accepts(response):
+        if response in accepted:
+            return True
+        if response and response not in options:
+            logger.info(f"Invalid {activity_type} option '{response}' for lesson {lesson_id}, options: {sorted(options)}")
+        return False
+    return Checker(question, answer, accepts)
+
+def word_checker(question, answer):
+    if not answer:
+        return Checker(question, answer, never)
+    target = answer.lower()
+    tolerance = spelling_tolerance()
+
+    def accepts(response):
+        response = response.strip().lower()
+        if not response:
+            return False
+        return response == target or (tolerance > 0 and within_edit_distance(response, target, tolerance))
+    return Checker(question, answer, accepts)
+
+def parse_number(text):
+    """The value of "5", " 05 ", "2.50" or "1/2", or None if it isn't a number."""
+    text = text.strip()
+    if len(text) > MAX_NUMBER_LENGTH or not NUMBER_RE.fullmatch(text):
+        return None
+    try:
+        return Fraction(text)
+    except (ValueError, ZeroDivisionError):
+        return None
+
+@register('mc')
+def compile_mc(lesson):
+    return option_checker(lesson.mc_question, lesson.mc_answer, lesson.mc_options, lesson.id, 'mc')
+
+@register('sentence')
+def compile_sentence(lesson):
+    return option_checker(lesson.sentence_question, lesson.sentence_answer, lesson.sentence_options, lesson.id, 'sentence')
+
+@register('spell')
+def compile_spell(lesson):
+    return word_checker(f'Spell the word: {lesson.spell_word}', lesson.spell_word)
+
+@register('sound')
+def compile_sound(lesson):
+    # The kid says the whole word, so the answer is spell_word
+    return word_checker(f'Repeat the sound: /{lesson.sound}/', lesson.spell_word)
+
+@register('trace')
+def compile_trace(lesson):
+    # Any drawing counts; the strokes are kept for the parent (see drawings.py)
+    return Checker(f'Trace the word: {lesson.trace_word}', lesson.trace_word, lambda response: True)
+
+@register('math')
+def compile_math(lesson):
+    answer = lesson.math_answer
+    target = answer.strip().lower()
+    value = parse_number(answer)
+
+    def accepts(response):
+        response = response.strip()
+        if not response:
+            return False
+        if value is not None:
+            number = parse_number(response)
+            if number is not None:
+                return number == value
+        return response.lower() == target
+    return Checker(lesson.math_question, answer, accepts)
@@ -2,25 +2,26 @@
 # app.py (updated: Added /api/notifications_count and /api/mark_notifications_read routes)
 import os
 import secrets
-from flask import Flask, request, jsonify, render_template, redirect, url_for, session, flash, send_from_directory, abort
+from flask import Flask, jsonify, render_template, redirect, url_for, session, send_from_directory, abort
 from dotenv import load_dotenv
 import logging
 from logging.handlers import RotatingFileHandler
-from urllib.parse import urlparse
 import mimetypes
-from werkzeug.utils import secure_filename
 from flask_cors import CORS
-from datetime import datetime
 
-from db import get_db, close_db, init_db, reset_db, check_db_schema
-from auth import register, login, logout, set_theme, set_language
+from db import close_db, init_db
+from auth import register, login, logout, set_theme, set_language, is_admin
 from db_routes import reset_db_route
-from home_routes import index, home, landing
+from home_routes import index, home, landing, api_feed, post_comments
 from post_routes import create_post, like_post, repost_post, add_comment
-from lesson_routes import check_lesson, complete_lesson, reset_lesson, lessons, generate_lesson, schedule_lessons, add_to_feed
+from lesson_routes import check_lesson, submit_lesson, drawing_file, complete_lesson, reset_lesson, lessons, generate_lesson, schedule_lessons, add_to_feed, assign_lessons, search_lessons
 from assess_routes import assess, take_test, game
 from user_routes import profile, parent_dashboard, update_points, update_coins, beta, feedback, confirm_lesson, restore_lesson, register_child, update_profile_picture
 from game_routes import phonics_game, games, number_game
+from notification_routes import notifications_count, mark_notifications_read, notifications_stream, notifications_list
+import maintenance
+from feed_cache import feed_cache
+from interactions import interaction_cache
 
 load_dotenv()
 
@@ -55,6 +56,11 @@ def allowed_file(filename):
 def teardown_db(error):
     close_db(error)
 
+# Maintenance runs in a background thread per worker, started on the first request after fork
+@app.before_request
+def start_maintenance():
+    maintenance.scheduler.ensure_started()
+
 @app.route('/static/<path:filename>')
 def serve_static(filename):
     try:
@@ -95,33 +101,26 @@ def view_logs():
         logger.error(f"Failed to read logs: {e}")
         return render_template('error.html.j2', error="Cannot read logs", theme=session.get('theme', 'astronaut'), language=session.get('language', 'en')), 500
 
-# NEW: API route for notifications count
-@app.route('/api/notifications_count')
-def notifications_count():
+@app.route('/admin/maintenance')
+def maintenance_status():
     if 'user_id' not in session:
-        return jsonify({'count': 0})
-    conn = get_db()
-    c = conn.cursor()
-    c.execute("SELECT last_feed_view FROM users WHERE id=?", (session['user_id'],))
-    row = c.fetchone()
-    last_view = row['last_feed_view'] if row else None
-    if not last_view:
-        return jsonify({'count': 0})
-    c.execute("SELECT COUNT(*) FROM posts WHERE created_at > ?", (last_view,))
-    count = c.fetchone()[0]
-    return jsonify({'count': count})
-
-# NEW: API route to mark notifications as read
-@app.route('/api/mark_notifications_read', methods=['POST'])
-def mark_notifications_read():
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    if not is_admin():
+        return jsonify({'success': False, 'error': 'Admins only'}), 403
+    try:
+        return jsonify({'success': True, 'tasks': maintenance.status()})
+    except Exception as e:
+        logger.error(f"Failed to read maintenance status: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/admin/feed_cache')
+def feed_cache_stats():
     if 'user_id' not in session:
         return jsonify({'success': False, 'error': 'Unauthorized'}), 401
-    conn = get_db()
-    c = conn.cursor()
-    now = datetime.now().isoformat()
-    c.execute("UPDATE users SET last_feed_view = ? WHERE id=?", (now, session['user_id']))
-    conn.commit()
-    return jsonify({'success': True})
+    if not is_admin():
+        return jsonify({'success': False, 'error': 'Admins only'}), 403
+    # Counters are per worker; the pid says which one answered
+    return jsonify({'success': True, 'stats': feed_cache.stats(), 'interactions': interaction_cache.stats()})
 
 def init_app():
     with app.app_context():
@@ -153,17 +152,27 @@ app.add_url_rule('/reset_db', 'reset_db_route', reset_db_route)
 app.add_url_rule('/', 'index', index)
 app.add_url_rule('/home', 'home', home)
 app.add_url_rule('/landing', 'landing', landing)
+app.add_url_rule('/api/feed', 'api_feed', api_feed)
+app.add_url_rule('/api/posts/<int:post_id>/comments', 'post_comments', post_comments)
+app.add_url_rule('/api/notifications_count', 'notifications_count', notifications_count)
+app.add_url_rule('/api/mark_notifications_read', 'mark_notifications_read', mark_notifications_read, methods=['POST'])
+app.add_url_rule('/api/notifications/stream', 'notifications_stream', notifications_stream)
+app.add_url_rule('/api/notifications', 'notifications_list', notifications_list)
 app.add_url_rule('/create_post', 'create_post', create_post, methods=['POST'])
 app.add_url_rule('/like/<int:post_id>', 'like_post', like_post, methods=['POST'])
 app.add_url_rule('/repost/<int:post_id>', 'repost_post', repost_post, methods=['POST'])
 app.add_url_rule('/comment/<int:post_id>', 'add_comment', add_comment, methods=['POST'])
 app.add_url_rule('/check_lesson', 'check_lesson', check_lesson, methods=['POST'])
+app.add_url_rule('/api/lessons/<int:lesson_id>/submit', 'submit_lesson', submit_lesson, methods=['POST'])
+app.add_url_rule('/drawings/<digest>.png', 'drawing_file', drawing_file)
 app.add_url_rule('/complete_lesson/<int:lesson_id>', 'complete_lesson', complete_lesson, methods=['GET'])
 app.add_url_rule('/reset_lesson/<int:lesson_id>', 'reset_lesson', reset_lesson, methods=['GET'])
 app.add_url_rule('/lessons', 'lessons', lessons, methods=['GET'])
 app.add_url_rule('/generate_lesson', 'generate_lesson', generate_lesson, methods=['POST'])
 app.add_url_rule('/add_to_feed', 'add_to_feed', add_to_feed, methods=['POST'])
 app.add_url_rule('/schedule_lessons', 'schedule_lessons', schedule_lessons, methods=['POST'])
+app.add_url_rule('/api/lessons/assign', 'assign_lessons', assign_lessons, methods=['POST'])
+app.add_url_rule('/api/lessons/search', 'search_lessons', search_lessons, methods=['GET'])
 app.add_url_rule('/assess', 'assess', assess, methods=['GET', 'POST'])
 app.add_url_rule('/test', 'take_test', take_test, methods=['GET', 'POST'])
 app.add_url_rule('/game', 'game', game)
@@ -3,10 +3,17 @@ from flask import jsonify, request, render_template, redirect, url_for, session,
 from werkzeug.security import check_password_hash, generate_password_hash
 from db import get_db
 import logging
+import os
 import sqlite3
 
 logger = logging.getLogger(__name__)
 
+def is_admin():
+    """Whether the logged-in user may see the /admin pages: their email must be listed in
+    ADMIN_EMAILS (comma-separated). With it unset nobody can."""
+    admins = {email.strip().lower() for email in os.environ.get('ADMIN_EMAILS', '').split(',') if email.strip()}
+    return 'user_id' in session and session.get('email', '').lower() in admins
+
 def register():
     if request.method == 'POST':
         email = request.form.get('email')
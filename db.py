@@ -1,17 +1,129 @@
-﻿import sqlite3
+import sqlite3
 import os
+import queue
+import threading
 from flask import g
 import logging
 import json
+import hashlib
 from datetime import datetime
+import ranking
+from lesson_catalog import bump_version
 
 logger = logging.getLogger(__name__)
 
+# Connection settings are read from the environment the first time the pool is
+# built (app.py loads .env after importing this module).
+DEFAULT_DB_SETTINGS = {
+    'DATABASE_PATH': 'database.db',
+    'SQLITE_POOL_SIZE': '8',
+    'SQLITE_BUSY_TIMEOUT_MS': '5000',
+    'SQLITE_CACHE_SIZE': '-16000',      # negative = KiB, so ~16 MB page cache per connection
+    'SQLITE_MMAP_SIZE': '134217728',    # 128 MB memory-mapped I/O
+    'SQLITE_SYNCHRONOUS': 'NORMAL',     # safe with WAL, avoids an fsync per commit
+}
+
+def db_settings():
+    return {key: os.environ.get(key, default) for key, default in DEFAULT_DB_SETTINGS.items()}
+
+def db_path():
+    return os.environ.get('DATABASE_PATH', DEFAULT_DB_SETTINGS['DATABASE_PATH'])
+
+class PooledConnection(sqlite3.Connection):
+    """Connection owned by the pool. Routes still call conn.close() in their finally
+    blocks; here that only discards uncommitted work so the connection can be reused."""
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+    def close_for_real(self):
+        super().close()
+
+def apply_pragmas(conn, settings):
+    conn.execute(f"PRAGMA busy_timeout = {int(settings['SQLITE_BUSY_TIMEOUT_MS'])}")
+    # Only takes effect on a brand-new file; existing databases need one VACUUM (python maintenance.py --vacuum)
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute(f"PRAGMA synchronous = {settings['SQLITE_SYNCHRONOUS'].upper()}")
+    conn.execute(f"PRAGMA cache_size = {int(settings['SQLITE_CACHE_SIZE'])}")
+    conn.execute(f"PRAGMA mmap_size = {int(settings['SQLITE_MMAP_SIZE'])}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+
+def connect(factory=sqlite3.Connection):
+    """Open a standalone connection with the same PRAGMAs as pooled ones (used by init/scripts)."""
+    settings = db_settings()
+    conn = sqlite3.connect(settings['DATABASE_PATH'], detect_types=sqlite3.PARSE_DECLTYPES,
+                           timeout=int(settings['SQLITE_BUSY_TIMEOUT_MS']) / 1000,
+                           # pooled connections are handed to whichever request thread asks next
+                           check_same_thread=factory is not PooledConnection, factory=factory)
+    apply_pragmas(conn, settings)
+    # SQL functions used by the feed (hot_score)
+    ranking.register(conn)
+    return conn
+
+class ConnectionPool:
+    """Per-worker pool of reusable connections. Each gunicorn worker builds its own pool
+    after fork (tracked by pid); request threads check a connection out in get_db and
+    hand it back in close_db."""
+    def __init__(self):
+        self.settings = db_settings()
+        self.pid = os.getpid()
+        self.idle = queue.LifoQueue(maxsize=max(int(self.settings['SQLITE_POOL_SIZE']), 1))
+        self.opened = 0
+
+    def acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            conn = connect(factory=PooledConnection)
+            conn.row_factory = sqlite3.Row
+            self.opened += 1
+            logger.debug(f"Opened pooled connection #{self.opened} (pid {self.pid})")
+            return conn
+
+    def release(self, conn):
+        try:
+            conn.close()  # rollback of anything left uncommitted
+            self.idle.put_nowait(conn)
+        except queue.Full:
+            conn.close_for_real()
+        except sqlite3.Error as e:
+            logger.warning(f"Dropping broken pooled connection: {str(e)}")
+            try:
+                conn.close_for_real()
+            except sqlite3.Error:
+                pass
+
+    def close_all(self):
+        while True:
+            try:
+                self.idle.get_nowait().close_for_real()
+            except queue.Empty:
+                break
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    if _pool is None or _pool.pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool.pid != os.getpid():
+                # Connections inherited across fork must not be reused; just drop the references
+                _pool = ConnectionPool()
+    return _pool
+
+def reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool.pid == os.getpid():
+            _pool.close_all()
+        _pool = None
+
 def get_db():
     if 'db' not in g:
         try:
-            g.db = sqlite3.connect('database.db', detect_types=sqlite3.PARSE_DECLTYPES)
-            g.db.row_factory = sqlite3.Row
+            g.db = get_pool().acquire()
         except sqlite3.Error as e:
             logger.error(f"Failed to connect to database: {str(e)}")
             raise
@@ -21,14 +133,12 @@ def close_db(error=None):
     db = g.pop('db', None)
     if db is not None:
         try:
-            db.close()
+            get_pool().release(db)
         except sqlite3.Error as e:
             logger.error(f"Failed to close database: {str(e)}")
 
-def init_tables():
+def init_tables(c):
     try:
-        conn = sqlite3.connect('database.db')
-        c = conn.cursor()
         # Users table
         c.execute('''CREATE TABLE IF NOT EXISTS users 
                      (id INTEGER PRIMARY KEY AUTOINCREMENT, 
@@ -178,108 +288,152 @@ def init_tables():
                       comments TEXT, 
                       submitted_date TEXT DEFAULT (datetime('now')), 
                       FOREIGN KEY (user_id) REFERENCES users(id))''')
-        conn.commit()
+        # Key/value store for seed hashes and other bookkeeping
+        c.execute('''CREATE TABLE IF NOT EXISTS app_meta 
+                     (key TEXT PRIMARY KEY, 
+                      value TEXT)''')
     except sqlite3.Error as e:
         logger.error(f"Error initializing tables: {str(e)}")
         raise
-    finally:
-        conn.close()
 
 def init_db():
+    """Bring the schema up to date and reseed lessons if the seed content changed.
+    On an already-migrated database this is two cheap reads."""
+    conn = None
     try:
-        init_tables()
-        conn = sqlite3.connect('database.db')
-        from achievements_db import init_achievements_tables
-        init_achievements_tables(conn.cursor())
-        conn.commit()
-        check_db_schema()
-        seed_lessons()
+        conn = connect()
+        from migrations import run_migrations
+        run_migrations(conn)
+        seed_lessons(conn)
     except Exception as e:
         logger.error(f"Database initialization failed: {str(e)}")
         raise
     finally:
-        conn.close()
+        if conn:
+            conn.close()
 
 def reset_db():
     try:
-        if os.path.exists('database.db'):
-            os.remove('database.db')
+        reset_pool()
+        path = db_path()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
         init_db()
         logger.info("Database reset complete")
     except Exception as e:
         logger.error(f"Database reset failed: {str(e)}")
         raise
 
-def seed_lessons():
+def get_meta(c, key):
+    c.execute("SELECT value FROM app_meta WHERE key = ?", (key,))
+    row = c.fetchone()
+    return row[0] if row else None
+
+def set_meta(c, key, value):
+    c.execute("INSERT OR REPLACE INTO app_meta (key, value) VALUES (?, ?)", (key, value))
+
+def lesson_seed_rows(now):
+    return [
+        # Week 1 Mon: Oct 6, 2025
+        ('Week 1 Mon: Counting Apples (Math)', 1, 'math', 'Count fall apples and add small groups.', 'Practice number sense with seasonal fruits.', now, None, None, None, None, None, None, None, None, None, 'How many apples? 3 + 2 = ?', '5'),
+        ('Week 1 Mon: Phonics - Short A (Language)', 1, 'language', 'Identify words with short A sound.', 'Build phonics skills for reading readiness.', now, 'apple', 'apple', '/æpəl/', 'Which word has short A?', json.dumps(['apple', 'igloo', 'umbrella']), 'apple', 'I see a red ___.', json.dumps(['apple', 'banana', 'car']), 'apple', None, None),
+        ('Week 1 Mon: Fall Leaves Change (Science)', 1, 'science', 'Observe why leaves change in fall.', 'Explore seasons and plant life cycles.', now, None, None, None, 'What color do leaves turn in fall?', json.dumps(['red', 'blue', 'yellow']), 'red', None, None, None, None, None),
+        ('Week 1 Mon: My Family Roles (Social Studies)', 1, 'social_studies', 'Learn about family members and their jobs.', 'Understand family structures.', now, 'mom', 'mom', '/mɒm/', 'Who cooks dinner?', json.dumps(['mom', 'teacher', 'doctor']), 'mom', 'My ___ helps at home.', json.dumps(['mom', 'dad', 'friend']), 'mom', None, None),
+        # Week 1 Tue: Oct 7, 2025
+        ('Week 1 Tue: Shapes in Nature (Math)', 1, 'math', 'Identify circles and squares in leaves.', 'Connect shapes to the environment.', now, None, None, None, None, None, None, None, None, None, 'How many sides on a square?', '4'),
+        ('Week 1 Tue: Sight Word - The (Language)', 1, 'language', 'Practice reading "the".', 'Build high-frequency word recognition.', now, 'the', 'the', '/ðə/', 'Spell the word for /ðə/.', json.dumps(['the', 'tha', 'thee']), 'the', '___ cat is happy.', json.dumps(['The', 'A', 'An']), 'The', None, None),
+        ('Week 1 Tue: Animals Prepare for Winter (Science)', 1, 'science', 'Discuss how squirrels gather nuts.', 'Learn animal adaptations.', now, 'nut', 'nut', '/nʌt/', 'What do squirrels collect?', json.dumps(['nuts', 'leaves', 'rocks']), 'nuts', None, None, None, None, None),
+        ('Week 1 Tue: Community Helpers - Teacher (Social Studies)', 1, 'social_studies', 'Role of teachers in school.', 'Explore jobs in the community.', now, 'teach', 'teach', '/tiːtʃ/', 'Who helps you learn?', json.dumps(['teacher', 'firefighter', 'chef']), 'teacher', 'The ___ reads stories.', json.dumps(['teacher', 'doctor', 'pilot']), 'teacher', None, None),
+        # Week 1 Wed: Oct 8, 2025
+        ('Week 1 Wed: Addition - 1+1=2 (Math)', 1, 'math', 'Add two groups of one.', 'Basic addition facts.', now, None, None, None, None, None, None, None, None, None, '1 + 1 = ?', '2'),
+        ('Week 1 Wed: CVC Word - Cat (Language)', 1, 'language', 'Blend C-V-C sounds for "cat".', 'Phonics blending practice.', now, 'cat', 'cat', '/kæt/', 'Spell /k/ /æ/ /t/.', json.dumps(['cat', 'cot', 'cut']), 'cat', 'The ___ sat on the mat.', json.dumps(['cat', 'dog', 'bat']), 'cat', None, None),
+        ('Week 1 Wed: Weather in Fall (Science)', 1, 'science', 'What is cooler weather?', 'Seasonal weather patterns.', now, None, None, None, 'What do we wear in fall?', json.dumps(['coat', 'swimsuit', 'sunglasses']), 'coat', None, None, None, None, None),
+        ('Week 1 Wed: My School Rules (Social Studies)', 1, 'social_studies', 'Importance of following rules.', 'School community basics.', now, 'rule', 'rule', '/ruːl/', 'What is a rule?', json.dumps(['rule', 'toy', 'book']), 'rule', 'We follow the ___ at school.', json.dumps(['rule', 'game', 'song']), 'rule', None, None),
+        # Week 1 Thu: Oct 9, 2025
+        ('Week 1 Thu: Counting to 5 (Math)', 1, 'math', 'Count objects up to 5.', 'Number sequencing.', now, None, None, None, None, None, None, None, None, None, 'Count: 1,2,3,?,5', '4'),
+        ('Week 1 Thu: Rhyming Words (Language)', 1, 'language', 'Find words that rhyme with "hat".', 'Rhyming awareness.', now, 'hat', 'hat', '/hæt/', 'What rhymes with hat?', json.dumps(['cat', 'house', 'sun']), 'cat', 'The ___ is on my head.', json.dumps(['hat', 'shoe', 'book']), 'hat', None, None),
+        ('Week 1 Thu: Plants in Fall (Science)', 1, 'science', 'How do trees lose leaves?', 'Plant life cycles.', now, 'leaf', 'leaf', '/liːf/', 'What falls from trees?', json.dumps(['leaves', 'apples', 'birds']), 'leaves', None, None, None, None, None),
+        ('Week 1 Thu: Helping at Home (Social Studies)', 1, 'social_studies', 'Chores and family help.', 'Responsibility in family.', now, 'help', 'help', '/hɛlp/', 'What do you do to help?', json.dumps(['help', 'play', 'sleep']), 'help', 'I ___ mom clean.', json.dumps(['help', 'run', 'eat']), 'help', None, None),
+        # Week 1 Fri: Oct 10, 2025
+        ('Week 1 Fri: Subtraction Basics (Math)', 1, 'math', 'Take away one from two.', 'Intro to subtraction.', now, None, None, None, None, None, None, None, None, None, '3 - 1 = ?', '2'),
+        ('Week 1 Fri: Simple Sentences (Language)', 1, 'language', 'Build "I see a dog."', 'Sentence structure.', now, 'dog', 'dog', '/dɒɡ/', 'What is a pet?', json.dumps(['dog', 'car', 'tree']), 'dog', 'I see a ___.', json.dumps(['dog', 'house', 'cloud']), 'dog', None, None),
+        ('Week 1 Fri: Recycling in Fall (Science)', 1, 'science', 'Why recycle leaves?', 'Environmental care.', now, None, None, None, 'What can we recycle?', json.dumps(['paper', 'food', 'toys']), 'paper', None, None, None, None, None),
+        ('Week 1 Fri: Seasons Change (Social Studies)', 1, 'social_studies', 'From summer to fall.', 'Understanding seasons.', now, 'fall', 'fall', '/fɔːl/', 'What season has pumpkins?', json.dumps(['fall', 'winter', 'spring']), 'fall', 'In ___ the leaves change.', json.dumps(['fall', 'summer', 'rain']), 'fall', None, None),
+        # Week 2 Mon: Oct 13, 2025
+        ('Week 2 Mon: Subtraction with Fruit (Math)', 1, 'math', 'Take away apples from a group.', 'Practice subtraction with visuals.', now, None, None, None, None, None, None, None, None, None, '5 - 2 = ?', '3'),
+        ('Week 2 Mon: Sight Word - And (Language)', 1, 'language', 'Practice reading "and".', 'High-frequency word practice.', now, 'and', 'and', '/ænd/', 'Spell the word for /ænd/.', json.dumps(['and', 'end', 'add']), 'and', 'Cats ___ dogs play.', json.dumps(['and', 'or', 'but']), 'and', None, None),
+        ('Week 2 Mon: What is an Ecosystem? (Science)', 2, 'science', 'Explore plants and animals living together.', 'Intro to ecosystems.', now, None, None, None, 'What lives in an ecosystem?', json.dumps(['plants', 'toys', 'books']), 'plants', None, None, None, None, None),
+        ('Week 2 Mon: My Community (Social Studies)', 2, 'social_studies', 'Learn about places in your town.', 'Community awareness.', now, 'town', 'town', '/taʊn/', 'Where is the school?', json.dumps(['town', 'sky', 'sea']), 'town', 'I live in a ___.', json.dumps(['town', 'cloud', 'river']), 'town', None, None),
+        # Week 2 Tue: Oct 14, 2025
+        ('Week 2 Tue: Subtracting Tens (Math)', 2, 'math', 'Subtract multiples of 10.', 'Build number sense with tens.', now, None, None, None, None, None, None, None, None, None, '20 - 10 = ?', '10'),
+        ('Week 2 Tue: Phonics - Short E (Language)', 1, 'language', 'Identify words with short E sound.', 'Phonics for reading.', now, 'egg', 'egg', '/ɛɡ/', 'Which word has short E?', json.dumps(['egg', 'apple', 'ice']), 'egg', 'I eat an ___.', json.dumps(['egg', 'car', 'tree']), 'egg', None, None),
+        ('Week 2 Tue: Animal Habitats (Science)', 2, 'science', 'Where do lions and penguins live?', 'Explore animal homes.', now, 'home', 'home', '/hoʊm/', 'Where do animals live?', json.dumps(['home', 'school', 'shop']), 'home', 'A lion’s ___ is a savanna.', json.dumps(['home', 'park', 'zoo']), 'home', None, None),
+        ('Week 2 Tue: Community Helpers - Doctor (Social Studies)', 2, 'social_studies', 'Role of doctors in health.', 'Community jobs.', now, 'doctor', 'doctor', '/ˈdɒktər/', 'Who helps when sick?', json.dumps(['doctor', 'teacher', 'chef']), 'doctor', 'The ___ checks my health.', json.dumps(['doctor', 'pilot', 'friend']), 'doctor', None, None),
+        # Week 2 Wed: Oct 15, 2025
+        ('Week 2 Wed: Word Problems - Subtraction (Math)', 2, 'math', 'Solve simple subtraction stories.', 'Apply subtraction in context.', now, None, None, None, None, None, None, None, None, None, 'I had 4 apples, ate 1. How many left?', '3'),
+        ('Week 2 Wed: Writing Sentences (Language)', 2, 'language', 'Build simple sentences.', 'Sentence structure practice.', now, 'run', 'run', '/rʌn/', 'What can you do fast?', json.dumps(['run', 'sleep', 'eat']), 'run', 'I can ___ fast.', json.dumps(['run', 'sit', 'read']), 'run', None, None),
+        ('Week 2 Wed: Weather Patterns (Science)', 1, 'science', 'Learn about rain and wind.', 'Understand weather changes.', now, None, None, None, 'What is rainy weather?', json.dumps(['rain', 'snow', 'sun']), 'rain', None, None, None, None, None),
+        ('Week 2 Wed: Our Town Map (Social Studies)', 2, 'social_studies', 'Map your community landmarks.', 'Community geography.', now, 'map', 'map', '/mæp/', 'What shows our town?', json.dumps(['map', 'book', 'toy']), 'map', 'A ___ shows the school.', json.dumps(['map', 'pen', 'chair']), 'map', None, None),
+        # Week 2 Thu: Oct 16, 2025
+        ('Week 2 Thu: Counting Backwards (Math)', 1, 'math', 'Count down from 10.', 'Practice reverse counting.', now, None, None, None, None, None, None, None, None, None, 'Count: 5,4,3,?,1', '2'),
+        ('Week 2 Thu: Sight Word - You (Language)', 1, 'language', 'Practice reading "you".', 'High-frequency word recognition.', now, 'you', 'you', '/juː/', 'Spell the word for /juː/.', json.dumps(['you', 'yoo', 'u']), 'you', '___ are my friend.', json.dumps(['You', 'I', 'He']), 'You', None, None),
+        ('Week 2 Thu: Plant Life Cycles (Science)', 2, 'science', 'How do plants grow?', 'Explore plant growth stages.', now, 'seed', 'seed', '/siːd/', 'What starts a plant?', json.dumps(['seed', 'leaf', 'flower']), 'seed', 'A plant grows from a ___.', json.dumps(['seed', 'rock', 'stick']), 'seed', None, None),
+    ]
+
+def seed_hash(rows):
+    # created_at is stamped at seed time, so leave it out of the content hash
+    content = [row[:5] + row[6:] for row in rows]
+    return hashlib.sha256(json.dumps(content, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+def seed_lessons(conn=None, force=False):
+    """Upsert the built-in lessons by title, but only when the seed content changed
+    since the last run (tracked in app_meta). Existing lesson ids are kept so posts,
+    completions and assignments that reference them stay valid."""
+    own_conn = conn is None
     try:
-        conn = sqlite3.connect('database.db')
+        if own_conn:
+            conn = connect()
         c = conn.cursor()
-        c.execute('DELETE FROM lessons')
         now = datetime.now().isoformat()
-        lessons = [
-            # Week 1 Mon: Oct 6, 2025
-            ('Week 1 Mon: Counting Apples (Math)', 1, 'math', 'Count fall apples and add small groups.', 'Practice number sense with seasonal fruits.', now, None, None, None, None, None, None, None, None, None, 'How many apples? 3 + 2 = ?', '5'),
-            ('Week 1 Mon: Phonics - Short A (Language)', 1, 'language', 'Identify words with short A sound.', 'Build phonics skills for reading readiness.', now, 'apple', 'apple', '/æpəl/', 'Which word has short A?', json.dumps(['apple', 'igloo', 'umbrella']), 'apple', 'I see a red ___.', json.dumps(['apple', 'banana', 'car']), 'apple', None, None),
-            ('Week 1 Mon: Fall Leaves Change (Science)', 1, 'science', 'Observe why leaves change in fall.', 'Explore seasons and plant life cycles.', now, None, None, None, 'What color do leaves turn in fall?', json.dumps(['red', 'blue', 'yellow']), 'red', None, None, None, None, None),
-            ('Week 1 Mon: My Family Roles (Social Studies)', 1, 'social_studies', 'Learn about family members and their jobs.', 'Understand family structures.', now, 'mom', 'mom', '/mɒm/', 'Who cooks dinner?', json.dumps(['mom', 'teacher', 'doctor']), 'mom', 'My ___ helps at home.', json.dumps(['mom', 'dad', 'friend']), 'mom', None, None),
-            # Week 1 Tue: Oct 7, 2025
-            ('Week 1 Tue: Shapes in Nature (Math)', 1, 'math', 'Identify circles and squares in leaves.', 'Connect shapes to the environment.', now, None, None, None, None, None, None, None, None, None, 'How many sides on a square?', '4'),
-            ('Week 1 Tue: Sight Word - The (Language)', 1, 'language', 'Practice reading "the".', 'Build high-frequency word recognition.', now, 'the', 'the', '/ðə/', 'Spell the word for /ðə/.', json.dumps(['the', 'tha', 'thee']), 'the', '___ cat is happy.', json.dumps(['The', 'A', 'An']), 'The', None, None),
-            ('Week 1 Tue: Animals Prepare for Winter (Science)', 1, 'science', 'Discuss how squirrels gather nuts.', 'Learn animal adaptations.', now, 'nut', 'nut', '/nʌt/', 'What do squirrels collect?', json.dumps(['nuts', 'leaves', 'rocks']), 'nuts', None, None, None, None, None),
-            ('Week 1 Tue: Community Helpers - Teacher (Social Studies)', 1, 'social_studies', 'Role of teachers in school.', 'Explore jobs in the community.', now, 'teach', 'teach', '/tiːtʃ/', 'Who helps you learn?', json.dumps(['teacher', 'firefighter', 'chef']), 'teacher', 'The ___ reads stories.', json.dumps(['teacher', 'doctor', 'pilot']), 'teacher', None, None),
-            # Week 1 Wed: Oct 8, 2025
-            ('Week 1 Wed: Addition - 1+1=2 (Math)', 1, 'math', 'Add two groups of one.', 'Basic addition facts.', now, None, None, None, None, None, None, None, None, None, '1 + 1 = ?', '2'),
-            ('Week 1 Wed: CVC Word - Cat (Language)', 1, 'language', 'Blend C-V-C sounds for "cat".', 'Phonics blending practice.', now, 'cat', 'cat', '/kæt/', 'Spell /k/ /æ/ /t/.', json.dumps(['cat', 'cot', 'cut']), 'cat', 'The ___ sat on the mat.', json.dumps(['cat', 'dog', 'bat']), 'cat', None, None),
-            ('Week 1 Wed: Weather in Fall (Science)', 1, 'science', 'What is cooler weather?', 'Seasonal weather patterns.', now, None, None, None, 'What do we wear in fall?', json.dumps(['coat', 'swimsuit', 'sunglasses']), 'coat', None, None, None, None, None),
-            ('Week 1 Wed: My School Rules (Social Studies)', 1, 'social_studies', 'Importance of following rules.', 'School community basics.', now, 'rule', 'rule', '/ruːl/', 'What is a rule?', json.dumps(['rule', 'toy', 'book']), 'rule', 'We follow the ___ at school.', json.dumps(['rule', 'game', 'song']), 'rule', None, None),
-            # Week 1 Thu: Oct 9, 2025
-            ('Week 1 Thu: Counting to 5 (Math)', 1, 'math', 'Count objects up to 5.', 'Number sequencing.', now, None, None, None, None, None, None, None, None, None, 'Count: 1,2,3,?,5', '4'),
-            ('Week 1 Thu: Rhyming Words (Language)', 1, 'language', 'Find words that rhyme with "hat".', 'Rhyming awareness.', now, 'hat', 'hat', '/hæt/', 'What rhymes with hat?', json.dumps(['cat', 'house', 'sun']), 'cat', 'The ___ is on my head.', json.dumps(['hat', 'shoe', 'book']), 'hat', None, None),
-            ('Week 1 Thu: Plants in Fall (Science)', 1, 'science', 'How do trees lose leaves?', 'Plant life cycles.', now, 'leaf', 'leaf', '/liːf/', 'What falls from trees?', json.dumps(['leaves', 'apples', 'birds']), 'leaves', None, None, None, None, None),
-            ('Week 1 Thu: Helping at Home (Social Studies)', 1, 'social_studies', 'Chores and family help.', 'Responsibility in family.', now, 'help', 'help', '/hɛlp/', 'What do you do to help?', json.dumps(['help', 'play', 'sleep']), 'help', 'I ___ mom clean.', json.dumps(['help', 'run', 'eat']), 'help', None, None),
-            # Week 1 Fri: Oct 10, 2025
-            ('Week 1 Fri: Subtraction Basics (Math)', 1, 'math', 'Take away one from two.', 'Intro to subtraction.', now, None, None, None, None, None, None, None, None, None, '3 - 1 = ?', '2'),
-            ('Week 1 Fri: Simple Sentences (Language)', 1, 'language', 'Build "I see a dog."', 'Sentence structure.', now, 'dog', 'dog', '/dɒɡ/', 'What is a pet?', json.dumps(['dog', 'car', 'tree']), 'dog', 'I see a ___.', json.dumps(['dog', 'house', 'cloud']), 'dog', None, None),
-            ('Week 1 Fri: Recycling in Fall (Science)', 1, 'science', 'Why recycle leaves?', 'Environmental care.', now, None, None, None, 'What can we recycle?', json.dumps(['paper', 'food', 'toys']), 'paper', None, None, None, None, None),
-            ('Week 1 Fri: Seasons Change (Social Studies)', 1, 'social_studies', 'From summer to fall.', 'Understanding seasons.', now, 'fall', 'fall', '/fɔːl/', 'What season has pumpkins?', json.dumps(['fall', 'winter', 'spring']), 'fall', 'In ___ the leaves change.', json.dumps(['fall', 'summer', 'rain']), 'fall', None, None),
-            # Week 2 Mon: Oct 13, 2025
-            ('Week 2 Mon: Subtraction with Fruit (Math)', 1, 'math', 'Take away apples from a group.', 'Practice subtraction with visuals.', now, None, None, None, None, None, None, None, None, None, '5 - 2 = ?', '3'),
-            ('Week 2 Mon: Sight Word - And (Language)', 1, 'language', 'Practice reading "and".', 'High-frequency word practice.', now, 'and', 'and', '/ænd/', 'Spell the word for /ænd/.', json.dumps(['and', 'end', 'add']), 'and', 'Cats ___ dogs play.', json.dumps(['and', 'or', 'but']), 'and', None, None),
-            ('Week 2 Mon: What is an Ecosystem? (Science)', 2, 'science', 'Explore plants and animals living together.', 'Intro to ecosystems.', now, None, None, None, 'What lives in an ecosystem?', json.dumps(['plants', 'toys', 'books']), 'plants', None, None, None, None, None),
-            ('Week 2 Mon: My Community (Social Studies)', 2, 'social_studies', 'Learn about places in your town.', 'Community awareness.', now, 'town', 'town', '/taʊn/', 'Where is the school?', json.dumps(['town', 'sky', 'sea']), 'town', 'I live in a ___.', json.dumps(['town', 'cloud', 'river']), 'town', None, None),
-            # Week 2 Tue: Oct 14, 2025
-            ('Week 2 Tue: Subtracting Tens (Math)', 2, 'math', 'Subtract multiples of 10.', 'Build number sense with tens.', now, None, None, None, None, None, None, None, None, None, '20 - 10 = ?', '10'),
-            ('Week 2 Tue: Phonics - Short E (Language)', 1, 'language', 'Identify words with short E sound.', 'Phonics for reading.', now, 'egg', 'egg', '/ɛɡ/', 'Which word has short E?', json.dumps(['egg', 'apple', 'ice']), 'egg', 'I eat an ___.', json.dumps(['egg', 'car', 'tree']), 'egg', None, None),
-            ('Week 2 Tue: Animal Habitats (Science)', 2, 'science', 'Where do lions and penguins live?', 'Explore animal homes.', now, 'home', 'home', '/hoʊm/', 'Where do animals live?', json.dumps(['home', 'school', 'shop']), 'home', 'A lion’s ___ is a savanna.', json.dumps(['home', 'park', 'zoo']), 'home', None, None),
-            ('Week 2 Tue: Community Helpers - Doctor (Social Studies)', 2, 'social_studies', 'Role of doctors in health.', 'Community jobs.', now, 'doctor', 'doctor', '/ˈdɒktər/', 'Who helps when sick?', json.dumps(['doctor', 'teacher', 'chef']), 'doctor', 'The ___ checks my health.', json.dumps(['doctor', 'pilot', 'friend']), 'doctor', None, None),
-            # Week 2 Wed: Oct 15, 2025
-            ('Week 2 Wed: Word Problems - Subtraction (Math)', 2, 'math', 'Solve simple subtraction stories.', 'Apply subtraction in context.', now, None, None, None, None, None, None, None, None, None, 'I had 4 apples, ate 1. How many left?', '3'),
-            ('Week 2 Wed: Writing Sentences (Language)', 2, 'language', 'Build simple sentences.', 'Sentence structure practice.', now, 'run', 'run', '/rʌn/', 'What can you do fast?', json.dumps(['run', 'sleep', 'eat']), 'run', 'I can ___ fast.', json.dumps(['run', 'sit', 'read']), 'run', None, None),
-            ('Week 2 Wed: Weather Patterns (Science)', 1, 'science', 'Learn about rain and wind.', 'Understand weather changes.', now, None, None, None, 'What is rainy weather?', json.dumps(['rain', 'snow', 'sun']), 'rain', None, None, None, None, None),
-            ('Week 2 Wed: Our Town Map (Social Studies)', 2, 'social_studies', 'Map your community landmarks.', 'Community geography.', now, 'map', 'map', '/mæp/', 'What shows our town?', json.dumps(['map', 'book', 'toy']), 'map', 'A ___ shows the school.', json.dumps(['map', 'pen', 'chair']), 'map', None, None),
-            # Week 2 Thu: Oct 16, 2025
-            ('Week 2 Thu: Counting Backwards (Math)', 1, 'math', 'Count down from 10.', 'Practice reverse counting.', now, None, None, None, None, None, None, None, None, None, 'Count: 5,4,3,?,1', '2'),
-            ('Week 2 Thu: Sight Word - You (Language)', 1, 'language', 'Practice reading "you".', 'High-frequency word recognition.', now, 'you', 'you', '/juː/', 'Spell the word for /juː/.', json.dumps(['you', 'yoo', 'u']), 'you', '___ are my friend.', json.dumps(['You', 'I', 'He']), 'You', None, None),
-            ('Week 2 Thu: Plant Life Cycles (Science)', 2, 'science', 'How do plants grow?', 'Explore plant growth stages.', now, 'seed', 'seed', '/siːd/', 'What starts a plant?', json.dumps(['seed', 'leaf', 'flower']), 'seed', 'A plant grows from a ___.', json.dumps(['seed', 'rock', 'stick']), 'seed', None, None),
-        ]
+        lessons = lesson_seed_rows(now)
         for i, lesson in enumerate(lessons):
             if len(lesson) != 17:
                 raise ValueError(f"Lesson {i+1} has {len(lesson)} items, expected 17: {lesson}")
-        c.executemany('''INSERT INTO lessons 
+        digest = seed_hash(lessons)
+        if not force and get_meta(c, 'lesson_seed_hash') == digest:
+            logger.debug("Lesson seed unchanged; skipping")
+            return False
+        inserted = updated = 0
+        for lesson in lessons:
+            c.execute('''UPDATE lessons SET grade = ?, subject = ?, content = ?, description = ?, trace_word = ?, spell_word = ?, sound = ?, 
+                         mc_question = ?, mc_options = ?, mc_answer = ?, sentence_question = ?, sentence_options = ?, sentence_answer = ?, 
+                         math_question = ?, math_answer = ? 
+                         WHERE title = ?''', lesson[1:5] + lesson[6:] + (lesson[0],))
+            if c.rowcount:
+                updated += 1
+                continue
+            c.execute('''INSERT INTO lessons 
                          (title, grade, subject, content, description, created_at, trace_word, spell_word, sound, mc_question, mc_options, mc_answer, 
                           sentence_question, sentence_options, sentence_answer, math_question, math_answer) 
-                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', lessons)
+                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', lesson)
+            inserted += 1
+        set_meta(c, 'lesson_seed_hash', digest)
+        bump_version(c)
         conn.commit()
-        logger.info("Grade 1-2 lessons seeded successfully (35 lessons for Oct 6-16, 2025)")
+        logger.info(f"Grade 1-2 lessons seeded: {inserted} inserted, {updated} updated")
+        return True
     except sqlite3.Error as e:
         logger.error(f"Error seeding lessons: {str(e)}")
         raise
     finally:
-        conn.close()
+        if own_conn and conn:
+            conn.close()
 
-def check_db_schema():
+def upgrade_legacy_schema(conn):
+    """Bring a database created before schema versioning up to the baseline layout.
+    Runs once, as migration 1; nothing here commits so the runner controls the transaction."""
     try:
-        conn = sqlite3.connect('database.db')
         c = conn.cursor()
         # Check for activity_responses
         c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='activity_responses'")
@@ -290,7 +444,6 @@ def check_db_schema():
         if lesson_exists and not activity_exists:
             # Rename lesson_responses to activity_responses
             c.execute("ALTER TABLE lesson_responses RENAME TO activity_responses")
-            conn.commit()
             logger.info("Renamed lesson_responses to activity_responses")
             logger.info("Ensured activity_responses.response can handle base64 drawings (TEXT field)")
         elif lesson_exists and activity_exists:
@@ -300,7 +453,6 @@ def check_db_schema():
                          SELECT lesson_id, user_id, activity_type, response, is_correct, points, responded_at 
                          FROM lesson_responses''')
             c.execute("DROP TABLE lesson_responses")
-            conn.commit()
             logger.info("Migrated data from lesson_responses to activity_responses and dropped lesson_responses")
             logger.info("Ensured activity_responses.response can handle base64 drawings (TEXT field)")
         elif not activity_exists:
@@ -316,7 +468,6 @@ def check_db_schema():
                           responded_at TEXT,
                           FOREIGN KEY (lesson_id) REFERENCES lessons(id),
                           FOREIGN KEY (user_id) REFERENCES users(id))''')
-            conn.commit()
             logger.info("Created activity_responses table")
             logger.info("Ensured activity_responses.response can handle base64 drawings (TEXT field)")
         # Remove duplicates before adding unique index
@@ -331,7 +482,6 @@ def check_db_schema():
                 WHERE rn = 1
             )
         """)
-        conn.commit()
         logger.info("Removed duplicate activity_responses, keeping latest per user/lesson/activity_type")
         # Add unique index to prevent duplicate submissions
         try:
@@ -339,7 +489,6 @@ def check_db_schema():
         except sqlite3.OperationalError:
             pass
         c.execute("CREATE UNIQUE INDEX IF NOT EXISTS unique_activity_response ON activity_responses (user_id, lesson_id, activity_type)")
-        conn.commit()
         logger.info("Created unique index for activity_responses per user/lesson/activity_type")
         # Check lessons table for required columns
         c.execute("PRAGMA table_info(lessons)")
@@ -350,7 +499,6 @@ def check_db_schema():
         for col in required_columns:
             if col not in columns:
                 c.execute(f"ALTER TABLE lessons ADD COLUMN {col} TEXT")
-                conn.commit()
                 logger.info(f"Added {col} column to lessons table")
         # Check users table for required columns
         c.execute("PRAGMA table_info(users)")
@@ -361,40 +509,33 @@ def check_db_schema():
                 default = "NULL" if col == 'parent_id' else "'kid'" if col == 'role' else "NULL" if col == 'last_feed_view' else 0 if col in ['subscribed', 'star_coins', 'points'] else "'en'" if col == 'language' else "'astronaut'" if col == 'theme' else "''"
                 col_type = 'TEXT' if col in ['last_feed_view', 'profile_picture'] else 'INTEGER' if col == 'parent_id' else 'TEXT'
                 c.execute(f"ALTER TABLE users ADD COLUMN {col} {col_type} DEFAULT {default}")
-                conn.commit()
                 logger.info(f"Added {col} column to users table")
                 if col == 'profile_picture':
                     c.execute("UPDATE users SET profile_picture = '' WHERE profile_picture IS NULL")
-                    conn.commit()
                     logger.info("Updated existing rows with default profile_picture")
         # Check posts table for views, type, lesson_id columns
         c.execute("PRAGMA table_info(posts)")
         columns = {col[1]: col[2] for col in c.fetchall()}
         if 'views' not in columns:
             c.execute("ALTER TABLE posts ADD COLUMN views INTEGER DEFAULT 0")
-            conn.commit()
             logger.info("Added views column to posts table")
         if 'type' not in columns:
             c.execute("ALTER TABLE posts ADD COLUMN type TEXT DEFAULT 'post'")
-            conn.commit()
             logger.info("Added type column to posts table")
         if 'lesson_id' not in columns:
             c.execute("ALTER TABLE posts ADD COLUMN lesson_id INTEGER")
-            conn.commit()
             logger.info("Added lesson_id column to posts table")
         # Check lessons_users for completed column
         c.execute("PRAGMA table_info(lessons_users)")
         columns = {col[1]: col[2] for col in c.fetchall()}
         if 'completed' not in columns:
             c.execute("ALTER TABLE lessons_users ADD COLUMN completed INTEGER DEFAULT 0")
-            conn.commit()
             logger.info("Added completed column to lessons_users table")
         # Check completed_lessons for parent_confirmed column
         c.execute("PRAGMA table_info(completed_lessons)")
         columns = {col[1]: col[2] for col in c.fetchall()}
         if 'parent_confirmed' not in columns:
             c.execute("ALTER TABLE completed_lessons ADD COLUMN parent_confirmed INTEGER DEFAULT 0")
-            conn.commit()
             logger.info("Added parent_confirmed column to completed_lessons table")
         # Add unique partial index for lesson posts
         try:
@@ -402,7 +543,6 @@ def check_db_schema():
         except sqlite3.OperationalError:
             pass
         c.execute("CREATE UNIQUE INDEX IF NOT EXISTS unique_lesson_post ON posts (user_id, lesson_id) WHERE type = 'lesson'")
-        conn.commit()
         logger.info("Created unique index for lesson posts per user")
         # Check friendships table
         c.execute("PRAGMA table_info(friendships)")
@@ -413,19 +553,24 @@ def check_db_schema():
                 default = "datetime('now')" if col == 'requested_at' else "NULL" if col == 'approved_at' else "'requested'" if col == 'status' else "NULL"
                 col_type = "TEXT" if col in ['status', 'requested_at', 'approved_at'] else "INTEGER"
                 c.execute(f"ALTER TABLE friendships ADD COLUMN {col} {col_type} DEFAULT {default}")
-                conn.commit()
                 logger.info(f"Added {col} column to friendships table")
         # Check and add retry_count to activity_responses
         c.execute("PRAGMA table_info(activity_responses)")
         columns = {col[1]: col[2] for col in c.fetchall()}
         if 'retry_count' not in columns:
             c.execute("ALTER TABLE activity_responses ADD COLUMN retry_count INTEGER DEFAULT 0")
-            conn.commit()
             logger.info("Added retry_count column to activity_responses table")
         from achievements_db import check_achievements_schema
         check_achievements_schema(conn)
     except sqlite3.Error as e:
         logger.error(f"DB schema check failed: {str(e)}")
         raise
+
+def check_db_schema():
+    """Run the migrations outside of init_db (kept for scripts that call it directly)."""
+    conn = connect()
+    try:
+        from migrations import run_migrations
+        run_migrations(conn)
     finally:
         conn.close()
@@ -0,0 +1,245 @@
+# drawings.py
+# Out-of-row storage for trace drawings. The trace activity submits canvas.toDataURL() PNGs;
+# instead of keeping the base64 text in activity_responses.response, the PNG is decoded and
+# written once under DRAWINGS_DIR, named by its SHA-256 (identical drawings share a file),
+# and the row keeps only a "drawing:<sha256>" reference. Files are written to a temp name
+# and renamed, so a reader never sees half a file.
+#
+# Rows written before this existed are converted in batches by migrate_inline(), which the
+# maintenance job runs hourly until it has walked the whole table.
+# Convert everything at once with: python drawings.py migrate
+#
+# Current clients submit the strokes instead of a PNG (a few hundred bytes rather than tens
+# of kilobytes):
+#     strokes:v1:<width>x<height>:x0,y0,dx1,dy1,dx2,dy2,...;x0,y0,...
+# one ';'-separated group per stroke, the first point absolute and the rest as integer
+# deltas from the previous point. The normalized text is stored as <sha256>.strokes and the
+# row keeps "strokes:<sha256>". Nothing is rendered at submit time: thumbnail() rasterizes
+# a small grayscale PNG the first time someone (the parent dashboard) asks for it.
+import base64
+import binascii
+import hashlib
+import logging
+import os
+import re
+import struct
+import sys
+import tempfile
+import zlib
+
+logger = logging.getLogger(__name__)
+
+REF_PREFIX = 'drawing:'
+STROKES_REF_PREFIX = 'strokes:'
+STROKES_FORMAT = 'strokes:v1:'
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+MIGRATED_KEY = 'drawings:migrated_id'
+
+MAX_CANVAS_SIZE = 2000
+MAX_STROKES = 500
+MAX_POINTS = 20000
+THUMB_WIDTH = 200
+
+def drawings_dir():
+    return os.environ.get('DRAWINGS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'drawings'))
+
+def path_for(digest, ext='png'):
+    return os.path.join(drawings_dir(), digest[:2], f"{digest}.{ext}")
+
+def thumb_path_for(digest):
+    return path_for(digest, 'thumb.png')
+
+def decode_data_url(value):
+    """PNG bytes of a data:image/png;base64 URL. Raises ValueError for anything else."""
+    header, _, payload = value.partition(',')
+    if header != 'data:image/png;base64':
+        raise ValueError(f"Unsupported drawing format: {header[:40]}")
+    try:
+        png = base64.b64decode(payload, validate=True)
+    except binascii.Error as e:
+        raise ValueError(f"Invalid base64 drawing: {e}")
+    if not png.startswith(PNG_SIGNATURE):
+        raise ValueError("Drawing is not a PNG")
+    return png
+
+def write_file(path, data):
+    """Write data to path atomically unless it is already there."""
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def save(png):
+    """Store PNG bytes and return their reference."""
+    digest = hashlib.sha256(png).hexdigest()
+    write_file(path_for(digest), png)
+    return REF_PREFIX + digest
+
+def parse_strokes(value):
+    """(width, height, strokes) from a strokes:v1 submission, each stroke a list of absolute
+    (x, y) points clamped to the canvas. Raises ValueError if it is malformed or too big."""
+    if not value.startswith(STROKES_FORMAT):
+        raise ValueError(f"Unsupported stroke format: {value[:20]}")
+    size, _, body = value[len(STROKES_FORMAT):].partition(':')
+    try:
+        width, height = (int(n) for n in size.split('x'))
+    except ValueError:
+        raise ValueError(f"Invalid canvas size: {size[:20]}")
+    if not (0 < width <= MAX_CANVAS_SIZE and 0 < height <= MAX_CANVAS_SIZE):
+        raise ValueError(f"Canvas size out of range: {width}x{height}")
+    groups = [g for g in body.split(';') if g]
+    if len(groups) > MAX_STROKES:
+        raise ValueError(f"More than {MAX_STROKES} strokes")
+    strokes, total = [], 0
+    for group in groups:
+        try:
+            numbers = [int(n) for n in group.split(',')]
+        except ValueError:
+            raise ValueError("Stroke coordinates must be integers")
+        if len(numbers) % 2:
+            raise ValueError("Stroke has an odd number of coordinates")
+        total += len(numbers) // 2
+        if total > MAX_POINTS:
+            raise ValueError(f"More than {MAX_POINTS} points")
+        x = y = 0
+        points = []
+        for i in range(0, len(numbers), 2):
+            x = min(max(x + numbers[i], 0), width - 1)
+            y = min(max(y + numbers[i + 1], 0), height - 1)
+            points.append((x, y))
+        strokes.append(points)
+    return width, height, strokes
+
+def encode_strokes(width, height, strokes):
+    """The canonical strokes:v1 text for parsed strokes (what is stored and hashed)."""
+    groups = []
+    for points in strokes:
+        numbers, px, py = [], 0, 0
+        for x, y in points:
+            numbers += (x - px, y - py)
+            px, py = x, y
+        groups.append(','.join(map(str, numbers)))
+    return f"{STROKES_FORMAT}{width}x{height}:{';'.join(groups)}"
+
+def save_strokes(value):
+    """Validate and store a strokes:v1 submission and return its reference."""
+    text = encode_strokes(*parse_strokes(value)).encode()
+    digest = hashlib.sha256(text).hexdigest()
+    write_file(path_for(digest, 'strokes'), text)
+    return STROKES_REF_PREFIX + digest
+
+def store_response(value):
+    """What activity_responses.response should hold for a trace submission: a reference if
+    the value is a stroke list or a PNG data URL, otherwise the value unchanged."""
+    if not value:
+        return value
+    try:
+        if value.startswith(STROKES_FORMAT):
+            return save_strokes(value)
+        if value.startswith('data:'):
+            return save(decode_data_url(value))
+    except ValueError as e:
+        logger.warning(f"Keeping trace response inline: {e}")
+    return value
+
+def parse_ref(value, prefix=REF_PREFIX):
+    """The digest in a "drawing:<sha256>" (or, with prefix=STROKES_REF_PREFIX,
+    "strokes:<sha256>") reference, or None."""
+    if not value or not value.startswith(prefix):
+        return None
+    digest = value[len(prefix):]
+    return digest if DIGEST_RE.match(digest) else None
+
+def png_bytes(width, height, pixels):
+    """8-bit grayscale PNG of a width*height bytearray."""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    raw = b''.join(b'\x00' + pixels[y * width:(y + 1) * width] for y in range(height))
+    return (PNG_SIGNATURE + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw, 9)) + chunk(b'IEND', b''))
+
+def rasterize(width, height, strokes, thumb_width=THUMB_WIDTH):
+    """Black-on-white PNG of the strokes scaled to thumb_width pixels wide."""
+    scale = min(thumb_width / width, 1.0)
+    tw, th = max(int(width * scale), 1), max(int(height * scale), 1)
+    pixels = bytearray(b'\xff') * (tw * th)
+
+    def dot(x, y):
+        # 2x2 pen, which reads as a line at thumbnail size
+        for py in (y, y + 1):
+            if 0 <= py < th:
+                row = py * tw
+                for px in (x, x + 1):
+                    if 0 <= px < tw:
+                        pixels[row + px] = 0
+
+    for points in strokes:
+        scaled = [(int(x * scale), int(y * scale)) for x, y in points]
+        x0, y0 = scaled[0]
+        dot(x0, y0)
+        for x1, y1 in scaled[1:]:
+            steps = max(abs(x1 - x0), abs(y1 - y0))
+            for i in range(1, steps + 1):
+                dot(x0 + (x1 - x0) * i // steps, y0 + (y1 - y0) * i // steps)
+            x0, y0 = x1, y1
+    return png_bytes(tw, th, pixels)
+
+def thumbnail(digest):
+    """Path of the thumbnail for stored strokes, rendering it on first request; None if
+    there are no strokes under that digest."""
+    path = thumb_path_for(digest)
+    if os.path.exists(path):
+        return path
+    try:
+        with open(path_for(digest, 'strokes'), 'rb') as f:
+            text = f.read().decode()
+    except FileNotFoundError:
+        return None
+    write_file(path, rasterize(*parse_strokes(text)))
+    logger.info(f"Rendered stroke thumbnail {digest[:12]}")
+    return path
+
+def migrate_inline(conn, batch_size=200, max_batches=None):
+    """Move inline trace drawings out of activity_responses, committing every batch_size
+    rows. Progress is kept in app_meta, so each call resumes where the last one stopped."""
+    from db import get_meta, set_meta
+    c = conn.cursor()
+    last_id = int(get_meta(c, MIGRATED_KEY) or 0)
+    converted = batches = 0
+    while max_batches is None or batches < max_batches:
+        c.execute("""SELECT id, response FROM activity_responses
+                     WHERE id > ? AND activity_type = 'trace' ORDER BY id LIMIT ?""", (last_id, batch_size))
+        rows = c.fetchall()
+        if not rows:
+            conn.commit()
+            return {'converted': converted, 'done': True, 'last_id': last_id}
+        for row_id, response in rows:
+            ref = store_response(response)
+            if ref != response:
+                # Only if the row wasn't resubmitted since it was read
+                c.execute("UPDATE activity_responses SET response = ? WHERE id = ? AND response = ?", (ref, row_id, response))
+                converted += c.rowcount
+        last_id = rows[-1][0]
+        set_meta(c, MIGRATED_KEY, str(last_id))
+        conn.commit()
+        batches += 1
+    return {'converted': converted, 'done': False, 'last_id': last_id}
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    if sys.argv[1:2] != ['migrate']:
+        print("Usage: python drawings.py migrate")
+        sys.exit(2)
+    from db import connect
+    conn = connect()
+    result = migrate_inline(conn)
+    conn.close()
+    print(f"Moved {result['converted']} drawings to {drawings_dir()}")
@@ -0,0 +1,100 @@
+# feed_cache.py
+# Per-worker cache of the first /home feed page, keyed by (user_id, sort). Entries expire
+# after FEED_CACHE_TTL_SECONDS (0 disables the cache) and the least recently used entry is
+# evicted once there are more than FEED_CACHE_MAX_ENTRIES.
+#
+# Invalidation has to reach every gunicorn worker, so write routes don't touch this
+# process's memory. They publish an event by bumping a row in feed_versions inside their own
+# transaction: publish_user() for changes only that user sees (their likes, their lesson
+# posts), publish_all() for changes that alter everyone's feed (new posts, comments). A page is
+# served from cache only while both versions still match the ones it was built against.
+# View and like counts on a cached page can lag by up to the TTL.
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_SCOPE = 0  # feed_versions row shared by every user
+
+class FeedCache:
+    def __init__(self, ttl_seconds=None, max_entries=None):
+        self.ttl_seconds = float(ttl_seconds if ttl_seconds is not None else os.environ.get('FEED_CACHE_TTL_SECONDS', 30))
+        self.max_entries = int(max_entries or os.environ.get('FEED_CACHE_MAX_ENTRIES', 1000))
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.counts = {'hits': 0, 'misses': 0, 'expired': 0, 'invalidated': 0, 'evicted': 0}
+
+    def versions(self, c, user_id):
+        """Current (global, user) versions. Read these before building a page, never after."""
+        c.execute("SELECT user_id, version FROM feed_versions WHERE user_id IN (?, ?)", (GLOBAL_SCOPE, user_id))
+        found = {row[0]: row[1] for row in c.fetchall()}
+        return (found.get(GLOBAL_SCOPE, 0), found.get(user_id, 0))
+
+    def get(self, user_id, sort, versions):
+        """Return (posts, comments, next_cursor) copies, or None on a miss."""
+        if self.ttl_seconds <= 0:
+            return None
+        key = (user_id, sort)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.counts['misses'] += 1
+                return None
+            if entry['versions'] != versions:
+                del self.entries[key]
+                self.counts['invalidated'] += 1
+                self.counts['misses'] += 1
+                return None
+            if entry['expires_at'] < time.monotonic():
+                del self.entries[key]
+                self.counts['expired'] += 1
+                self.counts['misses'] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.counts['hits'] += 1
+        # Callers adjust view counts per render, so hand out copies
+        posts = [dict(post) for post in entry['posts']]
+        comments = {post_id: list(rows) for post_id, rows in entry['comments'].items()}
+        return posts, comments, entry['next_cursor']
+
+    def put(self, user_id, sort, versions, posts, comments, next_cursor):
+        if self.ttl_seconds <= 0:
+            return
+        entry = {
+            'versions': versions,
+            'expires_at': time.monotonic() + self.ttl_seconds,
+            'posts': [dict(post) for post in posts],
+            'comments': {post_id: list(rows) for post_id, rows in comments.items()},
+            'next_cursor': next_cursor,
+        }
+        with self.lock:
+            self.entries[(user_id, sort)] = entry
+            self.entries.move_to_end((user_id, sort))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.counts['evicted'] += 1
+
+    def publish_user(self, c, user_id):
+        """Invalidate every cached feed page of one user. Call inside the write's transaction.
+        Returns the new version."""
+        c.execute("INSERT INTO feed_versions (user_id, version) VALUES (?, 1) ON CONFLICT(user_id) DO UPDATE SET version = version + 1 RETURNING version", (user_id,))
+        return c.fetchone()[0]
+
+    def publish_all(self, c):
+        """Invalidate every user's cached feed pages. Call inside the write's transaction."""
+        self.publish_user(c, GLOBAL_SCOPE)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.counts['hits'] + self.counts['misses']
+            return dict(self.counts,
+                        size=len(self.entries),
+                        max_entries=self.max_entries,
+                        ttl_seconds=self.ttl_seconds,
+                        hit_rate=round(self.counts['hits'] / lookups, 3) if lookups else None,
+                        pid=os.getpid())
+
+feed_cache = FeedCache()
@@ -0,0 +1,30 @@
+# gunicorn.conf.py
+# Picked up automatically when gunicorn is started from this directory (gunicorn app:app).
+#
+# /api/notifications/stream holds a request open for up to SSE_MAX_STREAM_SECONDS, so the
+# default sync worker (one request at a time) would be tied up by a single open tab.
+# gthread workers serve each request on its own thread; post_fork caps the streams a
+# worker will hold at half its threads, leaving the rest for ordinary requests.
+import os
+
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 16))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+
+def stream_slots(cfg):
+    """How many notification streams one worker can hold without starving other requests."""
+    if cfg.worker_class_str in ('gevent', 'eventlet'):
+        return cfg.worker_connections // 2
+    if cfg.threads > 1:
+        return cfg.threads // 2
+    # Sync workers: refuse streams; pages fall back to a one-off count fetch
+    return 0
+
+def post_fork(server, worker):
+    # Runs in the worker before the app is loaded, with command-line overrides applied;
+    # an SSE_MAX_CONNECTIONS set by the operator can only lower the cap
+    slots = stream_slots(server.cfg)
+    configured = os.environ.get('SSE_MAX_CONNECTIONS')
+    os.environ['SSE_MAX_CONNECTIONS'] = str(min(int(configured), slots) if configured else slots)
+    server.log.info(f"Worker {worker.pid}: {os.environ['SSE_MAX_CONNECTIONS']} notification stream slots")
@@ -1,9 +1,17 @@
 # [home_routes.py]
-from flask import render_template, session, redirect, url_for, request, flash
+from flask import render_template, session, redirect, url_for, request, flash, jsonify
 from db import get_db
+from view_counter import view_counter
+from feed_cache import feed_cache
+from interactions import interaction_cache
+from lesson_catalog import lesson_catalog
+import timeline
+import unread_counts
 import logging
 import traceback
 import json
+import base64
+import binascii
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
@@ -13,6 +21,225 @@ def index():
         return redirect(url_for('home'))
     return redirect(url_for('landing'))
 
+FEED_PAGE_SIZE = 20
+
+# sort value -> posts column the feed is ordered by. id breaks ties, so every sort is a
+# total order and (sort_key, id) of the last row is enough to resume from.
+FEED_SORTS = {'latest': 'created_at', 'hot': 'hot_score', 'most_views': 'views', 'most_likes': 'likes'}
+
+def encode_cursor(sort_key, post_id):
+    return base64.urlsafe_b64encode(json.dumps([sort_key, post_id]).encode()).decode()
+
+def decode_cursor(cursor):
+    """Return (sort_key, post_id) from an /api/feed cursor. Raises ValueError if it is malformed."""
+    try:
+        sort_key, post_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (TypeError, binascii.Error, json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    # Both values are bound straight into SQL, so only types sqlite can compare are let through
+    if not is_sql_int(post_id):
+        raise ValueError("Invalid cursor: bad post id")
+    if not (isinstance(sort_key, (str, float)) or is_sql_int(sort_key)):
+        raise ValueError("Invalid cursor: bad sort key")
+    return sort_key, post_id
+
+def is_sql_int(value):
+    return isinstance(value, int) and not isinstance(value, bool) and -2**63 <= value < 2**63
+
+def fetch_feed_rows(c, user_id, sort, cursor=None, limit=FEED_PAGE_SIZE):
+    """One page of feed rows and the cursor for the next one (None on the last page).
+    'latest' reads the user's materialised timeline while it lasts, then continues from
+    posts at the same cursor; the other sorts always read posts."""
+    if sort != 'latest':
+        return fetch_merged_rows(c, user_id, sort, cursor, limit)
+    rows, exhausted = timeline.fetch_rows(c, user_id, cursor, limit)
+    visible = [row for row in rows if row['id'] is not None and not row['lesson_done']]
+    if not exhausted:
+        return visible, encode_cursor(rows[-1]['sort_key'], rows[-1]['timeline_post_id'])
+    if rows:
+        cursor = (rows[-1]['sort_key'], rows[-1]['timeline_post_id'])
+    more, next_cursor = fetch_merged_rows(c, user_id, sort, cursor, limit - len(rows))
+    return visible + more, next_cursor
+
+def fetch_merged_rows(c, user_id, sort, cursor=None, limit=FEED_PAGE_SIZE):
+    """One page of the merged feed: global posts plus this user's unfinished lesson posts,
+    newest/most viewed/most liked first. Each branch walks its own index from the cursor
+    and stops after `limit` rows, so page 50 costs the same as page 1."""
+    key = FEED_SORTS[sort]
+    after = f"AND ({key}, id) < (?, ?)" if cursor else ""
+    after_params = list(cursor) if cursor else []
+    query = f'''SELECT p.*, page.sort_key, COALESCE(u.handle, p.handle) as handle, orig_u.handle as original_handle, COALESCE(u.profile_picture, '') as profile_picture
+                FROM (
+                    SELECT * FROM (SELECT id, {key} as sort_key FROM posts
+                                   WHERE type = 'post' {after}
+                                   ORDER BY {key} DESC, id DESC LIMIT ?)
+                    UNION ALL
+                    SELECT * FROM (SELECT id, {key} as sort_key FROM posts lp
+                                   WHERE type = 'lesson' AND user_id = ? {after}
+                                   AND NOT EXISTS (SELECT 1 FROM completed_lessons cl WHERE cl.user_id = lp.user_id AND cl.lesson_id = lp.lesson_id)
+                                   ORDER BY {key} DESC, id DESC LIMIT ?)
+                ) page
+                JOIN posts p ON p.id = page.id
+                LEFT JOIN users u ON p.user_id = u.id
+                LEFT JOIN posts orig ON p.original_post_id = orig.id
+                LEFT JOIN users orig_u ON orig.user_id = orig_u.id
+                ORDER BY page.sort_key DESC, page.id DESC
+                LIMIT ?'''
+    params = after_params + [limit, user_id] + after_params + [limit, limit]
+    c.execute(query, params)
+    rows = [dict(row) for row in c.fetchall()]
+    next_cursor = encode_cursor(rows[-1]['sort_key'], rows[-1]['id']) if len(rows) == limit else None
+    return rows, next_cursor
+
+def load_feed_page(c, user_id, sort, cursor, completed_ids):
+    """Fetch a feed page and attach lessons, comments, like/repost state and buffered view
+    counts. The first page comes from feed_cache when nothing it depends on has changed.
+    Returns (posts, comments_by_post_id, next_cursor)."""
+    cached = None
+    versions = feed_cache.versions(c, user_id)
+    if cursor is None:
+        cached = feed_cache.get(user_id, sort, versions)
+    if cached:
+        posts, comments, next_cursor = cached
+    else:
+        posts, comments, next_cursor = build_feed_page(c, user_id, sort, cursor, completed_ids)
+        if cursor is None:
+            feed_cache.put(user_id, sort, versions, posts, comments, next_cursor)
+
+    interaction_cache.get(c, user_id, versions[1]).annotate(posts)
+    # Views are buffered per worker and written in batches (see view_counter.py)
+    view_counter.record([post['id'] for post in posts])
+    for post in posts:
+        post['views'] = (post.get('views') or 0) + view_counter.pending_for(post['id'])
+    return posts, comments, next_cursor
+
+def build_feed_page(c, user_id, sort, cursor, completed_ids):
+    posts, next_cursor = fetch_feed_rows(c, user_id, sort, cursor)
+
+    # Attach lessons to the visible lesson posts from the in-memory catalog
+    lessons_by_id = lesson_catalog.get_many(c, {post['lesson_id'] for post in posts if post.get('type') == 'lesson' and post.get('lesson_id')})
+    for post in posts:
+        if post.get('type') != 'lesson':
+            continue
+        lesson = lessons_by_id.get(post.get('lesson_id'))
+        if lesson:
+            # Each post gets its own copy; the template and JS treat it as per-card state
+            post['lesson'] = lesson.as_dict()
+            post['completed'] = post['lesson_id'] in completed_ids
+        else:
+            logger.warning(f"Lesson not found for post {post.get('id')}, lesson_id {post.get('lesson_id')}")
+            post['lesson'] = None
+
+    # Filter out invalid lesson posts (the cursor already points past them)
+    original_count = len(posts)
+    posts = [p for p in posts if not (p.get('type') == 'lesson' and not p.get('lesson'))]
+    removed_count = original_count - len(posts)
+    if removed_count > 0:
+        logger.warning(f"Removed {removed_count} invalid lesson posts from feed for user {user_id}")
+    logger.info(f"Feed page for user {user_id}: {len(posts)} posts, sort {sort}, more: {bool(next_cursor)}")
+
+    comments = {post['id']: [] for post in posts}
+    try:
+        comments.update(fetch_comment_previews(c, posts))
+    except Exception as e:
+        logger.error(f"Error fetching comments for posts {list(comments)}: {e}\n{traceback.format_exc()}")
+    return posts, comments, next_cursor
+
+COMMENT_PREVIEW_SIZE = 5
+COMMENT_PAGE_SIZE = 20
+
+COMMENT_COLUMNS = "c.id, c.post_id, c.user_id, c.content, c.created_at, COALESCE(u.handle, c.handle) as handle"
+
+def fetch_comment_previews(c, posts):
+    """The newest COMMENT_PREVIEW_SIZE comments of each post, in one UNION ALL query with a
+    LIMIT per post, so a popular post costs no more than a quiet one. Posts with more
+    comments get a `comments_cursor` for /api/posts/<id>/comments to continue from."""
+    post_ids = [post['id'] for post in posts if post.get('comment_count')]
+    previews = {post_id: [] for post_id in post_ids}
+    if not post_ids:
+        return previews
+    branch = f"""SELECT * FROM (SELECT {COMMENT_COLUMNS} FROM comments c LEFT JOIN users u ON c.user_id = u.id
+                 WHERE c.post_id = ? ORDER BY c.created_at DESC, c.id DESC LIMIT ?)"""
+    params = []
+    for post_id in post_ids:
+        params += [post_id, COMMENT_PREVIEW_SIZE]
+    c.execute(' UNION ALL '.join([branch] * len(post_ids)), params)
+    for row in c.fetchall():
+        previews[row['post_id']].append(dict(row))
+    for post in posts:
+        shown = previews.get(post['id'])
+        if shown and (post.get('comment_count') or 0) > len(shown):
+            post['comments_cursor'] = encode_cursor(shown[-1]['created_at'], shown[-1]['id'])
+    return previews
+
+def fetch_comments(c, post_id, cursor=None, limit=COMMENT_PAGE_SIZE):
+    """One page of a post's comments, newest first, and the cursor for the next page."""
+    after_comment = "AND (c.created_at, c.id) < (?, ?)" if cursor else ""
+    c.execute(f"""SELECT {COMMENT_COLUMNS} FROM comments c LEFT JOIN users u ON c.user_id = u.id
+                  WHERE c.post_id = ? {after_comment}
+                  ORDER BY c.created_at DESC, c.id DESC LIMIT ?""",
+              [post_id] + (list(cursor) if cursor else []) + [limit])
+    rows = [dict(row) for row in c.fetchall()]
+    next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['id']) if len(rows) == limit else None
+    return rows, next_cursor
+
+def post_comments(post_id):
+    """GET /api/posts/<id>/comments?cursor=...: the rest of a post's comments, on demand."""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    cursor = None
+    if request.args.get('cursor'):
+        try:
+            cursor = decode_cursor(request.args['cursor'])
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+    conn = None
+    try:
+        conn = get_db()
+        c = conn.cursor()
+        c.execute("SELECT comment_count FROM posts WHERE id = ?", (post_id,))
+        post = c.fetchone()
+        if not post:
+            return jsonify({'success': False, 'error': 'Post not found'}), 404
+        comments, next_cursor = fetch_comments(c, post_id, cursor)
+        return jsonify({'success': True, 'comments': comments, 'next_cursor': next_cursor, 'comment_count': post['comment_count']})
+    except Exception as e:
+        logger.error(f"Comments API error for post {post_id}: {str(e)}")
+        return jsonify({'success': False, 'error': 'Server error'}), 500
+    finally:
+        if conn:
+            conn.close()
+
+def api_feed():
+    """Next page of the home feed as rendered cards, for infinite scroll."""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    user_id = session['user_id']
+    sort = request.args.get('sort', 'latest')
+    if sort not in FEED_SORTS:
+        return jsonify({'success': False, 'error': f'Unknown sort: {sort}'}), 400
+    cursor = None
+    if request.args.get('cursor'):
+        try:
+            cursor = decode_cursor(request.args['cursor'])
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+    conn = None
+    try:
+        conn = get_db()
+        c = conn.cursor()
+        c.execute("SELECT lesson_id FROM completed_lessons WHERE user_id = ?", (user_id,))
+        completed_ids = {row['lesson_id'] for row in c.fetchall()}
+        posts, comments, next_cursor = load_feed_page(c, user_id, sort, cursor, completed_ids)
+        html = render_template('posts.html.j2', posts=posts, comments=comments, feed_page=True)
+        return jsonify({'success': True, 'html': html, 'post_ids': [post['id'] for post in posts], 'next_cursor': next_cursor})
+    except Exception as e:
+        logger.error(f"Feed API error for user {user_id}: {str(e)}\n{traceback.format_exc()}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
+
 def home():
     if 'user_id' not in session:
         return redirect(url_for('login'))
@@ -26,35 +253,12 @@ def home():
         c.execute("SELECT role FROM users WHERE id=?", (user_id,))
         user_row = c.fetchone()
         is_kid = user_row and user_row['role'] == 'kid' if user_row else False
-        # Cleanup invalid lesson posts before fetching
-        try:
-            c.execute("""
-                DELETE FROM posts 
-                WHERE type = 'lesson' 
-                AND lesson_id IS NOT NULL 
-                AND lesson_id NOT IN (SELECT id FROM lessons)
-            """)
-            deleted = c.rowcount
-            c.execute("""
-                DELETE FROM completed_lessons 
-                WHERE lesson_id NOT IN (SELECT id FROM lessons)
-            """)
-            deleted_cl = c.rowcount
-            c.execute("""
-                DELETE FROM lessons_users 
-                WHERE lesson_id NOT IN (SELECT id FROM lessons)
-            """)
-            deleted_lu = c.rowcount
-            if deleted + deleted_cl + deleted_lu > 0:
-                logger.info(f"Cleaned up {deleted} invalid lesson posts, {deleted_cl} orphaned completed_lessons, and {deleted_lu} lessons_users")
-                conn.commit()
-        except Exception as e:
-            logger.warning(f"Error during cleanup: {e}")
         c.execute("SELECT last_feed_view FROM users WHERE id=?", (user_id,))
         row = c.fetchone()
         last_view = row['last_feed_view'] if row else None
         now = datetime.now().isoformat()
         c.execute("UPDATE users SET last_feed_view = ? WHERE id = ?", (now, user_id))
+        unread_counts.reset(c, user_id)
         try:
             c.execute('''SELECT u.id FROM users u WHERE u.id IN (SELECT target_id FROM friendships WHERE requester_id = ? AND status = 'approved' UNION SELECT requester_id FROM friendships WHERE target_id = ? AND status = 'approved')''', (user_id, user_id))
             friend_ids = [row['id'] for row in c.fetchall()]
@@ -63,114 +267,16 @@ def home():
             logger.warning(f"Error fetching friends: {e}")
             friend_ids = []
         sort = request.args.get('sort', 'latest')
-        if sort == 'latest':
-            order_by = 'p.created_at DESC'
-        elif sort == 'most_views':
-            order_by = 'p.views DESC'
-        elif sort == 'most_likes':
-            order_by = 'p.likes DESC'
-        else:
-            order_by = 'p.created_at DESC'
+        if sort not in FEED_SORTS:
             sort = 'latest'
 
-        # FIXED: Separate queries for global posts (type='post') and user-specific lessons (type='lesson')
-        # Global posts: from all users
-        global_query = f'''SELECT DISTINCT p.*, COALESCE(u.handle, p.handle) as handle, orig_u.handle as original_handle, COALESCE(u.profile_picture, '') as profile_picture,
-                          (SELECT COUNT(*) FROM likes l WHERE l.post_id = p.id AND l.user_id = ?) as liked_by_user,
-                          (SELECT COUNT(*) FROM reposts r WHERE r.post_id = p.id AND r.user_id = ?) as reposted_by_user
-                          FROM posts p 
-                          LEFT JOIN users u ON p.user_id = u.id
-                          LEFT JOIN posts orig ON p.original_post_id = orig.id
-                          LEFT JOIN users orig_u ON orig.user_id = orig_u.id
-                          WHERE p.type = 'post'
-                          ORDER BY {order_by} LIMIT 20'''
-        c.execute(global_query, [user_id, user_id])
-        global_posts_raw = c.fetchall()
-        global_posts = [dict(post) for post in global_posts_raw]
-
-        # FIXED: Reverted to original lesson_query (no JOIN to lessons to avoid key collisions); fetch lesson separately in loop for safety
-        lesson_query = f'''SELECT DISTINCT p.*, COALESCE(u.handle, p.handle) as handle, orig_u.handle as original_handle, COALESCE(u.profile_picture, '') as profile_picture,
-                          (SELECT COUNT(*) FROM likes l WHERE l.post_id = p.id AND l.user_id = ?) as liked_by_user,
-                          (SELECT COUNT(*) FROM reposts r WHERE r.post_id = p.id AND r.user_id = ?) as reposted_by_user
-                          FROM posts p 
-                          LEFT JOIN users u ON p.user_id = u.id
-                          LEFT JOIN posts orig ON p.original_post_id = orig.id
-                          LEFT JOIN users orig_u ON orig.user_id = orig_u.id
-                          LEFT JOIN completed_lessons cl ON cl.lesson_id = p.lesson_id AND cl.user_id = p.user_id
-                          WHERE p.type = 'lesson' AND p.user_id = ? AND cl.id IS NULL
-                          ORDER BY {order_by}'''
-        c.execute(lesson_query, [user_id, user_id, user_id])
-        lesson_posts_raw = c.fetchall()
-        lesson_posts = [dict(post) for post in lesson_posts_raw]
-
-        # FIXED: In loop, fetch lesson separately (safe, no collisions), attach to post['lesson'], parse JSON, set completed, add debug log
-        for post in lesson_posts:
-            try:
-                if post.get('type') == 'lesson' and post.get('lesson_id'):
-                    c.execute("SELECT * FROM lessons WHERE id = ?", (post['lesson_id'],))
-                    lesson = c.fetchone()
-                    if lesson:
-                        lesson_dict = dict(lesson)
-                        # Parse JSON fields to lists
-                        if lesson_dict.get('mc_options'):
-                            try:
-                                lesson_dict['mc_options'] = json.loads(lesson_dict['mc_options']) if lesson_dict['mc_options'] else []
-                            except (json.JSONDecodeError, TypeError) as e:
-                                logger.warning(f"Invalid JSON in mc_options for lesson {post['lesson_id']}: {e}")
-                                lesson_dict['mc_options'] = []
-                        if lesson_dict.get('sentence_options'):
-                            try:
-                                lesson_dict['sentence_options'] = json.loads(lesson_dict['sentence_options']) if lesson_dict['sentence_options'] else []
-                            except (json.JSONDecodeError, TypeError) as e:
-                                logger.warning(f"Invalid JSON in sentence_options for lesson {post['lesson_id']}: {e}")
-                                lesson_dict['sentence_options'] = []
-                        post['lesson'] = lesson_dict
-                        # Set completed status for lesson posts
-                        c.execute("SELECT 1 FROM completed_lessons WHERE user_id = ? AND lesson_id = ?", (user_id, post['lesson_id']))
-                        completed_row = c.fetchone()
-                        post['completed'] = bool(completed_row)
-                        logger.info(f"Attached lesson {lesson_dict['id']} to post {post['id']}: math_question={lesson_dict.get('math_question', 'None')}")  # Debug log for math
-                    else:
-                        logger.warning(f"Lesson not found for post {post.get('id')}, lesson_id {post.get('lesson_id')}")
-                        post['lesson'] = None  # Explicitly set to None if missing
-                else:
-                    logger.warning(f"Post {post.get('id')} is type 'lesson' but missing lesson_id")
-                    post['lesson'] = None
-            except Exception as e:
-                logger.error(f"Error processing lesson for post {post.get('id', 'unknown')}: {e}\n{traceback.format_exc()}")
-                post['lesson'] = None
-
-        # Combine and sort all posts
-        posts = global_posts + lesson_posts
-        posts.sort(key=lambda x: x['created_at'] or '', reverse=True)
-        posts = posts[:20]  # Limit total
-
-        logger.info(f"Raw posts fetched: {len(global_posts)} global, {len(lesson_posts)} lessons; Total: {len(posts)}")
-
-        # Filter out invalid lesson posts
-        original_count = len(posts)
-        posts = [p for p in posts if not (p.get('type') == 'lesson' and not p.get('lesson'))]
-        removed_count = original_count - len(posts)
-        if removed_count > 0:
-            logger.warning(f"Removed {removed_count} invalid lesson posts from feed for user {user_id}")
-        lesson_posts = [p for p in posts if p.get('type') == 'lesson']
-        logger.info(f"Total posts after filter: {len(posts)} ({len(lesson_posts)} lessons) for user {user_id}")
-
-        comments = {}
-        for post in posts:
-            try:
-                c.execute("SELECT c.*, u.handle FROM comments c LEFT JOIN users u ON c.user_id = u.id WHERE post_id = ? ORDER BY c.created_at ASC", (post['id'],))
-                comments[post['id']] = [dict(row) for row in c.fetchall()]
-            except Exception as e:
-                logger.error(f"Error fetching comments for post {post['id']}: {e}\n{traceback.format_exc()}")
-                comments[post['id']] = []
-
-        for post in posts:
-            try:
-                c.execute("UPDATE posts SET views = views + 1 WHERE id = ?", (post['id'],))
-            except Exception as e:
-                logger.error(f"Error updating views for post {post['id']}: {e}\n{traceback.format_exc()}")
+        # Completed lesson ids for this user, shared by lesson posts, recommendations and the template
+        c.execute("SELECT lesson_id FROM completed_lessons WHERE user_id = ?", (user_id,))
+        completed_lessons = [row['lesson_id'] for row in c.fetchall()]
+        completed_ids = set(completed_lessons)
 
+        # First page of the feed; the template fetches the rest from /api/feed as the user scrolls
+        posts, comments, next_cursor = load_feed_page(c, user_id, sort, None, completed_ids)
         conn.commit()
 
         # User fetch
@@ -193,13 +299,8 @@ def home():
             logger.warning(f"Error fetching recent test: {e}")
             recent_test = None
 
-        # Lessons completed
-        try:
-            c.execute("SELECT COUNT(*) as count FROM completed_lessons WHERE user_id = ?", (user_id,))
-            lessons_completed = c.fetchone()['count']
-        except Exception as e:
-            logger.warning(f"Error fetching lessons completed: {e}")
-            lessons_completed = 0
+        # Lessons completed (already loaded above)
+        lessons_completed = len(completed_ids)
 
         # Games played
         try:
@@ -237,49 +338,32 @@ def home():
         # Feed lessons (recommended)
         try:
             logger.info("Fetching feed_lessons")
-            c.execute("""SELECT l.*, lu.assigned_at FROM lessons l 
-                         JOIN lessons_users lu ON l.id = lu.lesson_id 
+            c.execute("""SELECT lu.lesson_id, lu.assigned_at FROM lessons_users lu
                          WHERE lu.user_id = ? 
-                         AND l.id NOT IN (SELECT lesson_id FROM posts WHERE type = 'lesson' AND lesson_id IS NOT NULL AND user_id = ?)
+                         AND lu.lesson_id NOT IN (SELECT lesson_id FROM posts WHERE type = 'lesson' AND lesson_id IS NOT NULL AND user_id = ?)
                          ORDER BY lu.assigned_at DESC LIMIT 10""", (user_id, user_id))
-            feed_rows = c.fetchall()
+            assigned = c.fetchall()
+            lessons_by_id = lesson_catalog.get_many(c, [row['lesson_id'] for row in assigned])
             feed_lessons = []
-            for l in feed_rows:
-                lesson_dict = dict(l)
-                # Parse JSON fields to lists for recommended lessons
-                if lesson_dict.get('mc_options'):
-                    try:
-                        lesson_dict['mc_options'] = json.loads(lesson_dict['mc_options']) if lesson_dict['mc_options'] else []
-                    except (json.JSONDecodeError, TypeError) as e:
-                        logger.warning(f"Invalid JSON in mc_options for recommended lesson {lesson_dict['id']}: {e}")
-                        lesson_dict['mc_options'] = []
-                if lesson_dict.get('sentence_options'):
-                    try:
-                        lesson_dict['sentence_options'] = json.loads(lesson_dict['sentence_options']) if lesson_dict['sentence_options'] else []
-                    except (json.JSONDecodeError, TypeError) as e:
-                        logger.warning(f"Invalid JSON in sentence_options for recommended lesson {lesson_dict['id']}: {e}")
-                        lesson_dict['sentence_options'] = []
+            for row in assigned:
+                if row['lesson_id'] not in lessons_by_id:
+                    continue
+                lesson_dict = lessons_by_id[row['lesson_id']].as_dict()
+                lesson_dict['assigned_at'] = row['assigned_at']
+                lesson_dict['completed'] = lesson_dict['id'] in completed_ids
                 feed_lessons.append(lesson_dict)
-            # Set completed for each recommended lesson
-            for lesson in feed_lessons:
-                c.execute("SELECT 1 FROM completed_lessons WHERE user_id = ? AND lesson_id = ?", (user_id, lesson['id']))
-                completed_row = c.fetchone()
-                lesson['completed'] = bool(completed_row)
-            c.execute("SELECT lesson_id FROM completed_lessons WHERE user_id = ?", (user_id,))
-            completed_lessons = [row['lesson_id'] for row in c.fetchall()]
             logger.info(f"Feed lessons fetched: {len(feed_lessons)}")
         except Exception as e:
             logger.error(f"Error fetching feed_lessons: {e}\n{traceback.format_exc()}")
             feed_lessons = []
-            completed_lessons = []
 
-        return render_template('home.html.j2', posts=posts, comments=comments, user=user, recent_test=recent_test, lessons_completed=lessons_completed, games_played=games_played, avg_score=avg_score, badges=badges, feedbacks=feedbacks, friend_count=len(friend_ids), sort=sort, feed_lessons=feed_lessons, completed_lessons=completed_lessons, is_kid=is_kid, theme=session.get('theme', 'astronaut'), language=session.get('language', 'en'))
+        return render_template('home.html.j2', posts=posts, comments=comments, user=user, recent_test=recent_test, lessons_completed=lessons_completed, games_played=games_played, avg_score=avg_score, badges=badges, feedbacks=feedbacks, friend_count=len(friend_ids), sort=sort, next_cursor=next_cursor, feed_lessons=feed_lessons, completed_lessons=completed_lessons, is_kid=is_kid, theme=session.get('theme', 'astronaut'), language=session.get('language', 'en'))
     except Exception as e:
         logger.error(f"Home error for user {user_id}: {str(e)}\n{traceback.format_exc()}")
         if conn:
             conn.rollback()
         flash('Error loading feed! Check server logs for details.', 'error')
-        return render_template('home.html.j2', posts=[], comments={}, user=None, recent_test=None, lessons_completed=0, games_played=0, avg_score='N/A', badges=[], feedbacks=[], friend_count=0, sort='latest', feed_lessons=[], completed_lessons=[], is_kid=False, theme=session.get('theme', 'astronaut'), language=session.get('language', 'en'))
+        return render_template('home.html.j2', posts=[], comments={}, user=None, recent_test=None, lessons_completed=0, games_played=0, avg_score='N/A', badges=[], feedbacks=[], friend_count=0, sort='latest', next_cursor=None, feed_lessons=[], completed_lessons=[], is_kid=False, theme=session.get('theme', 'astronaut'), language=session.get('language', 'en'))
     finally:
         if conn:
             conn.close()
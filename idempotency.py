@@ -0,0 +1,53 @@
+# idempotency.py
+# Replay protection for write endpoints that clients retry (tablets on flaky Wi-Fi).
+# A client sends the same Idempotency-Key header (or idempotency_key field) on every retry
+# of one logical request. The endpoint looks the key up inside its write transaction and,
+# if it was already handled, returns the stored response instead of doing the work again;
+# otherwise it stores its response in that same transaction. Keys are per user and are
+# dropped after IDEMPOTENCY_KEY_TTL_HOURS by the maintenance job. Each key also records its
+# scope (e.g. 'lesson:12'); using it again with a different scope raises KeyReused rather
+# than replaying a response that belongs to another request.
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+MAX_KEY_LENGTH = 100
+
+def request_key(request, data=None):
+    """The client's key, or None. Raises ValueError if it is unusable."""
+    key = request.headers.get('Idempotency-Key') or (data or {}).get('idempotency_key')
+    if key is None or key == '':
+        return None
+    key = str(key)
+    if len(key) > MAX_KEY_LENGTH:
+        raise ValueError(f"Idempotency key longer than {MAX_KEY_LENGTH} characters")
+    return key
+
+class KeyReused(ValueError):
+    pass
+
+def lookup(c, user_id, key, scope):
+    """The stored response for this key, or None if it hasn't been used. Raises KeyReused if
+    it was used for a different scope."""
+    c.execute("SELECT response, scope FROM idempotency_keys WHERE user_id = ? AND key = ?", (user_id, key))
+    row = c.fetchone()
+    if row is None:
+        return None
+    if row[1] != scope:
+        raise KeyReused("Idempotency key was already used for a different request")
+    return json.loads(row[0])
+
+def store(c, user_id, key, scope, response):
+    c.execute("INSERT INTO idempotency_keys (user_id, key, scope, response, created_at) VALUES (?, ?, ?, ?, ?)",
+              (user_id, key, scope, json.dumps(response), datetime.now().isoformat()))
+
+def expire(conn):
+    cutoff = (datetime.now() - timedelta(hours=int(os.environ.get('IDEMPOTENCY_KEY_TTL_HOURS', 24)))).isoformat()
+    c = conn.cursor()
+    c.execute("DELETE FROM idempotency_keys WHERE created_at < ?", (cutoff,))
+    deleted = c.rowcount
+    conn.commit()
+    return {'deleted': deleted}
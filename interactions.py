@@ -0,0 +1,92 @@
+# interactions.py
+# Per-worker cache of which posts each user has liked and reposted, used to set
+# liked_by_user / reposted_by_user on feed rows in memory instead of two EXISTS
+# subqueries per row. Each user's ids are kept as sorted array('q') (8 bytes a post,
+# binary-searched), in an LRU of INTERACTION_CACHE_MAX_USERS users.
+#
+# An entry is tagged with the user's feed_versions version it was loaded at (see
+# feed_cache.py). like_post/repost_post bump that version in their transaction, so other
+# workers reload on the next request; the worker that handled the write applies the change
+# in place with record() instead.
+import logging
+import os
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+KINDS = {'liked': 'likes', 'reposted': 'reposts'}
+
+class UserInteractions:
+    __slots__ = ('version', 'liked', 'reposted')
+
+    def __init__(self, version, liked, reposted):
+        self.version = version
+        self.liked = liked
+        self.reposted = reposted
+
+    @staticmethod
+    def contains(ids, post_id):
+        i = bisect_left(ids, post_id)
+        return i < len(ids) and ids[i] == post_id
+
+    def annotate(self, posts):
+        for post in posts:
+            post['liked_by_user'] = self.contains(self.liked, post['id'])
+            post['reposted_by_user'] = self.contains(self.reposted, post['id'])
+
+class InteractionCache:
+    def __init__(self, max_users=None):
+        self.max_users = int(max_users or os.environ.get('INTERACTION_CACHE_MAX_USERS', 2000))
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.counts = {'hits': 0, 'loads': 0}
+
+    def get(self, c, user_id, version):
+        """The user's interactions as of `version` (their feed_versions user version)."""
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is not None and entry.version == version:
+                self.entries.move_to_end(user_id)
+                self.counts['hits'] += 1
+                return entry
+        ids = {}
+        for kind, table in KINDS.items():
+            c.execute(f"SELECT post_id FROM {table} WHERE user_id = ? ORDER BY post_id", (user_id,))
+            ids[kind] = array('q', (row[0] for row in c.fetchall()))
+        entry = UserInteractions(version, ids['liked'], ids['reposted'])
+        with self.lock:
+            self.counts['loads'] += 1
+            self.entries[user_id] = entry
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.max_users:
+                self.entries.popitem(last=False)
+        return entry
+
+    def record(self, user_id, version, kind, post_id, added):
+        """Apply a committed like/repost (kind 'liked'/'reposted') to this worker's entry.
+        `version` is the user version the write bumped to; an entry that wasn't current just
+        before the write is dropped instead of patched."""
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return
+            if entry.version != version - 1:
+                del self.entries[user_id]
+                return
+            ids = getattr(entry, kind)
+            i = bisect_left(ids, post_id)
+            present = i < len(ids) and ids[i] == post_id
+            if added and not present:
+                ids.insert(i, post_id)
+            elif not added and present:
+                del ids[i]
+            entry.version = version
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counts, users=len(self.entries), max_users=self.max_users, pid=os.getpid())
+
+interaction_cache = InteractionCache()
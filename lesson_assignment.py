@@ -0,0 +1,125 @@
+# lesson_assignment.py
+# Assigning many lessons to many users in one transaction: a parent scheduling a week of
+# lessons for three kids is one request, not one per (kid, lesson). Targets, lessons and
+# existing assignments are each looked up with one set-based query (lessons come from the
+# catalog), then the new lessons_users rows and lesson posts are written with executemany.
+#
+# add_to_feed and schedule_lessons are the one-user cases of assign().
+import logging
+from datetime import datetime
+
+from feed_cache import feed_cache
+from lesson_catalog import lesson_catalog
+from ranking import hot_score
+import timeline
+
+logger = logging.getLogger(__name__)
+
+MAX_ITEMS = 500
+
+# Per-item outcomes
+ASSIGNED = 'assigned'
+ALREADY_ASSIGNED = 'already_assigned'
+INVALID_TARGET = 'invalid_target'
+LESSON_NOT_FOUND = 'lesson_not_found'
+GRADE_MISMATCH = 'grade_mismatch'
+
+def parse_ids(values):
+    """Distinct ids in request order. Raises ValueError for anything that isn't an int."""
+    if not isinstance(values, list):
+        raise ValueError("Expected a list of ids")
+    ids = []
+    for value in values:
+        if isinstance(value, bool):
+            raise ValueError(f"Invalid id: {value}")
+        value = int(value)
+        if value not in ids:
+            ids.append(value)
+    return ids
+
+def load_targets(c, actor_id, user_ids):
+    """{user_id: row} for the users the actor may assign to: their own kids, and themselves
+    unless they are a kid."""
+    placeholders = ', '.join('?' * len(user_ids))
+    c.execute(f"SELECT id, role, parent_id, grade, handle FROM users WHERE id IN ({placeholders})", user_ids)
+    return {row['id']: row for row in c.fetchall()
+            if (row['role'] == 'kid' and row['parent_id'] == actor_id) or (row['id'] == actor_id and row['role'] != 'kid')}
+
+def scheduled_pairs(c, user_ids, lesson_ids):
+    """The (user_id, lesson_id) pairs already in lessons_users."""
+    user_placeholders = ', '.join('?' * len(user_ids))
+    lesson_placeholders = ', '.join('?' * len(lesson_ids))
+    c.execute(f"SELECT user_id, lesson_id FROM lessons_users WHERE user_id IN ({user_placeholders}) AND lesson_id IN ({lesson_placeholders})",
+              user_ids + lesson_ids)
+    return {(row[0], row[1]) for row in c.fetchall()}
+
+def lesson_posts(c, user_ids, lesson_ids):
+    """{(user_id, lesson_id): post_id} for the lesson posts these users already have."""
+    user_placeholders = ', '.join('?' * len(user_ids))
+    lesson_placeholders = ', '.join('?' * len(lesson_ids))
+    c.execute(f"""SELECT id, user_id, lesson_id FROM posts
+                  WHERE user_id IN ({user_placeholders}) AND type = 'lesson' AND lesson_id IN ({lesson_placeholders})""",
+              user_ids + lesson_ids)
+    return {(row[1], row[2]): row[0] for row in c.fetchall()}
+
+def assign(c, actor_id, lesson_ids, user_ids, feed=True, schedule=True, check_grade=True):
+    """Assign every lesson to every user: schedule=True adds lessons_users rows, feed=True adds
+    a lesson post to the user's feed. Call inside a transaction; the caller commits.
+    Returns one {'user_id', 'lesson_id', 'status'} dict per pair, users outermost."""
+    targets = load_targets(c, actor_id, user_ids)
+    lessons = lesson_catalog.get_many(c, lesson_ids)
+    results = []
+    pending = []
+    for user_id in user_ids:
+        target = targets.get(user_id)
+        for lesson_id in lesson_ids:
+            lesson = lessons.get(lesson_id)
+            if target is None:
+                status = INVALID_TARGET
+            elif lesson is None:
+                status = LESSON_NOT_FOUND
+            elif check_grade and lesson.grade != target['grade']:
+                status = GRADE_MISMATCH
+            else:
+                status = None
+                pending.append((target, lesson))
+            results.append({'user_id': user_id, 'lesson_id': lesson_id, 'status': status})
+    if not pending:
+        return results
+
+    valid_users = sorted({target['id'] for target, _ in pending})
+    valid_lessons = sorted({lesson.id for _, lesson in pending})
+    now = datetime.now().isoformat()
+    added = set()
+    if schedule:
+        scheduled = scheduled_pairs(c, valid_users, valid_lessons)
+        rows = [(target['id'], lesson.id, now) for target, lesson in pending if (target['id'], lesson.id) not in scheduled]
+        c.executemany("INSERT OR IGNORE INTO lessons_users (user_id, lesson_id, assigned_at) VALUES (?, ?, ?)", rows)
+        added.update((user_id, lesson_id) for user_id, lesson_id, _ in rows)
+    if feed:
+        posted = lesson_posts(c, valid_users, valid_lessons)
+        score = hot_score(0, 0, 0, 0, now)
+        rows = [(target['id'], lesson.title, lesson.subject, lesson.grade, target['handle'], lesson.id, now, score)
+                for target, lesson in pending if (target['id'], lesson.id) not in posted]
+        c.executemany("""INSERT OR IGNORE INTO posts (user_id, content, subject, grade, handle, type, lesson_id, created_at, views, likes, reposts, hot_score)
+                         VALUES (?, ?, ?, ?, ?, 'lesson', ?, ?, 0, 0, 0, ?)""", rows)
+        if rows:
+            new_posts = {pair: post_id for pair, post_id in lesson_posts(c, valid_users, valid_lessons).items()
+                         if pair not in posted}
+            timeline.fan_out_posts(c, sorted(new_posts.values()))
+            for user_id in sorted({user_id for user_id, _ in new_posts}):
+                feed_cache.publish_user(c, user_id)
+            added.update(new_posts)
+    for result in results:
+        if result['status'] is None:
+            result['status'] = ASSIGNED if (result['user_id'], result['lesson_id']) in added else ALREADY_ASSIGNED
+    logger.info(f"User {actor_id} assigned {len(added)} of {len(pending)} lesson/user pairs (feed: {feed}, schedule: {schedule})")
+    return results
+
+def assigned_counts(results):
+    """{user_id: number of lessons newly assigned}, for notifications."""
+    counts = {}
+    for result in results:
+        if result['status'] == ASSIGNED:
+            counts[result['user_id']] = counts.get(result['user_id'], 0) + 1
+    return counts
@@ -0,0 +1,116 @@
+# lesson_catalog.py
+# Process-wide, read-only copy of the lessons table. The catalog is small and only changes
+# when lessons are seeded or generated, so each worker loads it once, decodes the JSON
+# option lists once, and indexes it by id, grade and subject.
+#
+# Writers call bump_version(c) in the transaction that changes lessons; it bumps the
+# 'lesson_catalog_version' stamp in app_meta. Readers compare that stamp (one primary-key
+# lookup) with the one the catalog was loaded at and reload when it moved.
+#
+# Lesson records are shared between requests: routes that add per-user fields
+# ('completed', 'in_feed', ...) work on as_dict() copies. Each record also carries its
+# compiled answer checkers (answer_checkers.py), built with the record, and the progress
+# mask of the activities they grade.
+import json
+import logging
+import threading
+
+import answer_checkers
+import lesson_progress
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'lesson_catalog_version'
+
+LESSON_FIELDS = ('id', 'title', 'grade', 'subject', 'content', 'description', 'created_at',
+                 'trace_word', 'spell_word', 'sound', 'mc_question', 'mc_options', 'mc_answer',
+                 'sentence_question', 'sentence_options', 'sentence_answer', 'math_question', 'math_answer')
+OPTION_FIELDS = ('mc_options', 'sentence_options')
+
+class Lesson:
+    __slots__ = LESSON_FIELDS + ('checkers', 'expected_mask')
+
+    def __init__(self, row):
+        for field in LESSON_FIELDS:
+            setattr(self, field, row[field])
+        for field in OPTION_FIELDS:
+            setattr(self, field, decode_options(self.id, field, row[field]))
+        self.checkers = answer_checkers.compile_lesson(self)
+        self.expected_mask = lesson_progress.expected_mask(self.checkers)
+
+    def as_dict(self):
+        lesson = {field: getattr(self, field) for field in LESSON_FIELDS}
+        for field in OPTION_FIELDS:
+            lesson[field] = list(lesson[field])
+        return lesson
+
+def decode_options(lesson_id, field, value):
+    """JSON option list -> tuple; missing or bad JSON becomes ()."""
+    if not value:
+        return ()
+    try:
+        options = json.loads(value)
+    except (json.JSONDecodeError, TypeError) as e:
+        logger.warning(f"Invalid JSON in {field} for lesson {lesson_id}: {e}")
+        return ()
+    return tuple(options) if isinstance(options, list) else ()
+
+def bump_version(c):
+    """Mark the catalog stale in every worker. Call inside the transaction that changed lessons."""
+    c.execute("INSERT INTO app_meta (key, value) VALUES (?, '1') ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1", (VERSION_KEY,))
+
+class LessonCatalog:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.by_id = {}
+        self.by_grade = {}
+        self.by_subject = {}
+
+    def _current(self, c):
+        """Reload if the stamp moved; returns (by_id, by_grade, by_subject) for this request."""
+        c.execute("SELECT value FROM app_meta WHERE key = ?", (VERSION_KEY,))
+        row = c.fetchone()
+        version = row[0] if row else '0'
+        with self.lock:
+            if version == self.version:
+                return self.by_id, self.by_grade, self.by_subject
+        c.execute("SELECT * FROM lessons ORDER BY created_at DESC, id DESC")
+        lessons = [Lesson(row) for row in c.fetchall()]
+        by_id, by_grade, by_subject = {}, {}, {}
+        for lesson in lessons:
+            by_id[lesson.id] = lesson
+            by_grade.setdefault(lesson.grade, []).append(lesson)
+            by_subject.setdefault(lesson.subject, []).append(lesson)
+        with self.lock:
+            self.version, self.by_id, self.by_grade, self.by_subject = version, by_id, by_grade, by_subject
+        logger.info(f"Loaded lesson catalog version {version}: {len(by_id)} lessons")
+        return by_id, by_grade, by_subject
+
+    def get(self, c, lesson_id):
+        """The lesson with this id (request values like '3' are accepted), or None."""
+        try:
+            lesson_id = int(lesson_id)
+        except (TypeError, ValueError):
+            return None
+        return self._current(c)[0].get(lesson_id)
+
+    def get_many(self, c, lesson_ids):
+        by_id = self._current(c)[0]
+        return {lesson_id: by_id[lesson_id] for lesson_id in lesson_ids if lesson_id in by_id}
+
+    def for_grade(self, c, grade):
+        """Lessons of one grade, newest first. Like the old `grade = ?` query, '2' matches 2."""
+        by_grade = self._current(c)[1]
+        if grade not in by_grade and isinstance(grade, str) and grade.isdigit():
+            grade = int(grade)
+        return list(by_grade.get(grade, ()))
+
+    def for_subject(self, c, subject):
+        return list(self._current(c)[2].get(subject, ()))
+
+    def stats(self):
+        with self.lock:
+            return {'version': self.version, 'lessons': len(self.by_id), 'grades': sorted(self.by_grade, key=str)}
+
+lesson_catalog = LessonCatalog()
@@ -0,0 +1,228 @@
+# lesson_io.py
+# Bulk lesson content in and out of the lessons table as JSONL or CSV, so a term's lessons
+# can be loaded from a file instead of editing the seed tuples in db.py.
+#
+# Both directions stream: the importer reads one row at a time and writes batches of
+# batch_size rows, each in its own transaction, and the exporter walks a cursor. Neither
+# holds more than one batch in memory, so files with tens of thousands of lessons are fine.
+#
+# A row is the 17 lessons columns (everything but id). Option lists are JSON arrays in
+# JSONL and JSON text in CSV cells; empty CSV cells are NULL. Lessons are matched by title,
+# as db.seed_lessons does, so re-importing a file updates lessons in place and keeps their
+# ids (and the posts, assignments and completions that point at them). A title that appears
+# more than once in a file is taken from its first row (only the titles seen are kept, not
+# the rows), and rows that match the stored lesson are left alone.
+#
+#     python lesson_io.py import lessons.jsonl [--batch-size 500]
+#     python lesson_io.py export lessons.csv
+import csv
+import json
+import logging
+import sys
+from datetime import datetime
+
+from lesson_catalog import bump_version
+
+logger = logging.getLogger(__name__)
+
+LESSON_COLUMNS = ('title', 'grade', 'subject', 'content', 'description', 'created_at',
+                  'trace_word', 'spell_word', 'sound', 'mc_question', 'mc_options', 'mc_answer',
+                  'sentence_question', 'sentence_options', 'sentence_answer', 'math_question', 'math_answer')
+OPTION_COLUMNS = ('mc_options', 'sentence_options')
+REQUIRED_COLUMNS = ('title', 'grade', 'subject')
+# What counts as a change; created_at is kept from the first import, as in seed_lessons
+CONTENT_COLUMNS = tuple(column for column in LESSON_COLUMNS if column != 'created_at')
+
+MAX_GRADE = 12
+MAX_ERRORS_KEPT = 100
+DEFAULT_BATCH_SIZE = 500
+
+def file_format(path, fmt=None):
+    fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+    if fmt not in ('csv', 'jsonl'):
+        raise ValueError(f"Unsupported format: {fmt}")
+    return fmt
+
+def read_records(f, fmt):
+    """(line_number, dict) per row of an open file; unreadable rows come through as a
+    ValueError in place of the dict."""
+    if fmt == 'csv':
+        reader = csv.DictReader(f)
+        for record in reader:
+            if None in record:
+                yield reader.line_num, ValueError("More cells than header columns")
+                continue
+            yield reader.line_num, {key: (value if value != '' else None) for key, value in record.items()}
+        return
+    for line_number, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_number, ValueError(f"Invalid JSON: {e}")
+            continue
+        yield line_number, record
+
+def validate(record, now):
+    """The 17 column values of one input row, in LESSON_COLUMNS order. Raises ValueError."""
+    if isinstance(record, ValueError):
+        raise record
+    if not isinstance(record, dict):
+        raise ValueError("Row is not an object")
+    unknown = set(record) - set(LESSON_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(sorted(unknown))}")
+    row = {}
+    for column in LESSON_COLUMNS:
+        value = record.get(column)
+        if column in REQUIRED_COLUMNS and value in (None, ''):
+            raise ValueError(f"Missing {column}")
+        if column == 'grade':
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"grade must be an integer, got {value!r}")
+            if not 0 <= value <= MAX_GRADE:
+                raise ValueError(f"grade out of range: {value}")
+        elif column in OPTION_COLUMNS:
+            if isinstance(value, str):
+                try:
+                    value = json.loads(value)
+                except json.JSONDecodeError:
+                    raise ValueError(f"{column} is not a JSON list")
+            if value is not None:
+                if not isinstance(value, list) or not all(isinstance(option, str) and option for option in value):
+                    raise ValueError(f"{column} must be a list of non-empty strings")
+                value = json.dumps(value)
+        elif value is not None and not isinstance(value, str):
+            raise ValueError(f"{column} must be text")
+        row[column] = value
+    for prefix in ('mc', 'sentence'):
+        answer, options = row[f'{prefix}_answer'], row[f'{prefix}_options']
+        if answer is not None and (options is None or answer not in json.loads(options)):
+            raise ValueError(f"{prefix}_answer {answer!r} is not one of {prefix}_options")
+    if row['created_at'] is None:
+        row['created_at'] = now
+    else:
+        try:
+            datetime.fromisoformat(row['created_at'])
+        except ValueError:
+            raise ValueError(f"created_at is not an ISO timestamp: {row['created_at']!r}")
+    return tuple(row[column] for column in LESSON_COLUMNS)
+
+def write_batch(conn, batch, stats):
+    """Upsert one batch ({title: row}) in its own transaction."""
+    c = conn.cursor()
+    placeholders = ', '.join('?' * len(batch))
+    c.execute(f"SELECT {', '.join(CONTENT_COLUMNS)} FROM lessons WHERE title IN ({placeholders})", list(batch))
+    stored = {row[0]: tuple(row) for row in c.fetchall()}
+    content_index = [LESSON_COLUMNS.index(column) for column in CONTENT_COLUMNS]
+    inserts, updates = [], []
+    for title, row in batch.items():
+        content = tuple(row[i] for i in content_index)
+        if title not in stored:
+            inserts.append(row)
+        elif stored[title] != content:
+            updates.append(content[1:] + (title,))
+        else:
+            stats['unchanged'] += 1
+    if inserts:
+        c.executemany(f"INSERT INTO lessons ({', '.join(LESSON_COLUMNS)}) VALUES ({', '.join('?' * len(LESSON_COLUMNS))})", inserts)
+    if updates:
+        c.executemany(f"UPDATE lessons SET {', '.join(f'{column} = ?' for column in CONTENT_COLUMNS[1:])} WHERE title = ?", updates)
+    if inserts or updates:
+        bump_version(c)
+    conn.commit()
+    stats['inserted'] += len(inserts)
+    stats['updated'] += len(updates)
+    stats['batches'] += 1
+
+def import_lessons(conn, f, fmt='jsonl', batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """Load lessons from an open file. Invalid rows are skipped and reported in the returned
+    stats; progress(stats) is called after every batch."""
+    stats = {'rows': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0, 'duplicates': 0,
+             'invalid': 0, 'batches': 0, 'errors': []}
+    now = datetime.now().isoformat()
+    batch = {}
+    seen = set()
+    try:
+        for line_number, record in read_records(f, fmt):
+            stats['rows'] += 1
+            try:
+                row = validate(record, now)
+            except ValueError as e:
+                stats['invalid'] += 1
+                if len(stats['errors']) < MAX_ERRORS_KEPT:
+                    stats['errors'].append(f"Line {line_number}: {e}")
+                continue
+            if row[0] in seen:
+                stats['duplicates'] += 1
+                continue
+            seen.add(row[0])
+            batch[row[0]] = row
+            if len(batch) >= batch_size:
+                write_batch(conn, batch, stats)
+                batch = {}
+                if progress:
+                    progress(stats)
+        if batch:
+            write_batch(conn, batch, stats)
+            if progress:
+                progress(stats)
+    except Exception:
+        conn.rollback()
+        raise
+    logger.info(f"Imported lessons: {stats['inserted']} inserted, {stats['updated']} updated, {stats['unchanged']} unchanged, "
+                f"{stats['duplicates']} duplicates, {stats['invalid']} invalid")
+    return stats
+
+def export_lessons(conn, f, fmt='jsonl'):
+    """Write every lesson to an open file, oldest first. Returns the number written."""
+    c = conn.cursor()
+    c.execute(f"SELECT {', '.join(LESSON_COLUMNS)} FROM lessons ORDER BY id")
+    writer = None
+    if fmt == 'csv':
+        writer = csv.writer(f)
+        writer.writerow(LESSON_COLUMNS)
+    count = 0
+    for row in c:
+        if writer:
+            writer.writerow(['' if value is None else value for value in row])
+        else:
+            record = dict(zip(LESSON_COLUMNS, row))
+            for column in OPTION_COLUMNS:
+                if record[column]:
+                    try:
+                        record[column] = json.loads(record[column])
+                    except json.JSONDecodeError:
+                        logger.warning(f"Exporting invalid {column} of lesson {record['title']!r} as text")
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        count += 1
+    return count
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    args = sys.argv[1:]
+    if len(args) < 2 or args[0] not in ('import', 'export'):
+        print("Usage: python lesson_io.py import|export FILE [--format jsonl|csv] [--batch-size N]")
+        sys.exit(2)
+    command, path = args[0], args[1]
+    fmt = file_format(path, args[args.index('--format') + 1] if '--format' in args else None)
+    batch_size = int(args[args.index('--batch-size') + 1]) if '--batch-size' in args else DEFAULT_BATCH_SIZE
+    from db import connect
+    conn = connect()
+    try:
+        if command == 'import':
+            with open(path, newline='', encoding='utf-8') as f:
+                stats = import_lessons(conn, f, fmt, batch_size,
+                                       progress=lambda s: print(f"{s['rows']} rows read, {s['inserted']} inserted, {s['updated']} updated", flush=True))
+            for error in stats['errors']:
+                print(error)
+            print(f"Done: {stats['inserted']} inserted, {stats['updated']} updated, {stats['unchanged']} unchanged, "
+                  f"{stats['duplicates']} duplicates, {stats['invalid']} invalid")
+        else:
+            with open(path, 'w', newline='', encoding='utf-8') as f:
+                print(f"Exported {export_lessons(conn, f, fmt)} lessons to {path}")
+    finally:
+        conn.close()
@@ -0,0 +1,57 @@
+# lesson_progress.py
+# One lesson_progress row per (user, lesson) tracks which activities the user currently has
+# right: correct_mask holds one bit per activity type (ACTIVITY_BITS) and expected_mask the
+# bits of the activities the lesson has. record() updates it with a single upsert in the
+# transaction that saves the answer, so deciding whether the lesson is complete is a mask
+# comparison instead of recounting activity_responses on every answer.
+#
+# A wrong answer clears the bit again, matching activity_responses, where the latest answer
+# per activity replaces the earlier one.
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+ACTIVITY_BITS = {'mc': 1, 'sentence': 2, 'spell': 4, 'sound': 8, 'trace': 16, 'math': 32}
+
+# The lesson column whose presence means the lesson has that activity
+ACTIVITY_FIELDS = {'mc': 'mc_answer', 'sentence': 'sentence_answer', 'spell': 'spell_word',
+                   'sound': 'sound', 'trace': 'trace_word', 'math': 'math_answer'}
+
+def expected_mask(activity_types):
+    """Bits of the activities a lesson is graded on: the ones it has a compiled checker for
+    (lesson_catalog.Lesson.checkers), so an activity whose checker failed to compile can't
+    hold the lesson back from completing."""
+    return sum(ACTIVITY_BITS[kind] for kind in activity_types)
+
+def record(c, user_id, lesson, activity_type, is_correct):
+    """Set or clear the activity's bit for a catalog Lesson; returns (correct_mask,
+    expected_mask) after the update."""
+    bit = ACTIVITY_BITS[activity_type]
+    c.execute("""INSERT INTO lesson_progress (user_id, lesson_id, correct_mask, expected_mask, updated_at)
+                 VALUES (?, ?, ?, ?, ?)
+                 ON CONFLICT(user_id, lesson_id) DO UPDATE SET
+                     correct_mask = CASE WHEN ? THEN correct_mask | ? ELSE correct_mask & ~? END,
+                     expected_mask = excluded.expected_mask,
+                     updated_at = excluded.updated_at
+                 RETURNING correct_mask, expected_mask""",
+              (user_id, lesson.id, bit if is_correct else 0, lesson.expected_mask, datetime.now().isoformat(),
+               int(is_correct), bit, bit))
+    return tuple(c.fetchone())
+
+def is_complete(progress):
+    correct_mask, expected = progress
+    return correct_mask & expected == expected
+
+def reset(c, user_id, lesson_id):
+    c.execute("DELETE FROM lesson_progress WHERE user_id = ? AND lesson_id = ?", (user_id, lesson_id))
+
+# Backfill: the masks implied by existing activity_responses (see migration 010)
+MASK_SQL = ' | '.join(f"(CASE WHEN l.{field} IS NOT NULL THEN {ACTIVITY_BITS[kind]} ELSE 0 END)"
+                      for kind, field in ACTIVITY_FIELDS.items())
+CORRECT_SQL = ' | '.join(f"MAX(CASE WHEN ar.activity_type = '{kind}' AND ar.is_correct = 1 THEN {bit} ELSE 0 END)"
+                         for kind, bit in ACTIVITY_BITS.items())
+BACKFILL_SQL = f"""INSERT OR IGNORE INTO lesson_progress (user_id, lesson_id, correct_mask, expected_mask, updated_at)
+    SELECT ar.user_id, ar.lesson_id, {CORRECT_SQL}, {MASK_SQL}, MAX(ar.responded_at)
+    FROM activity_responses ar JOIN lessons l ON l.id = ar.lesson_id
+    GROUP BY ar.user_id, ar.lesson_id"""
@@ -1,13 +1,66 @@
 # [lesson_routes.py]
 import logging
-import sqlite3
-import json
-from flask import session, request, jsonify, render_template, redirect, url_for, flash
+import os
+from flask import session, request, jsonify, render_template, redirect, url_for, flash, send_file, abort
 from datetime import datetime
 from db import get_db
+import idempotency
+import answer_checkers
+import drawings
+import lesson_assignment
+import lesson_progress
+import lesson_search
+from feed_cache import feed_cache
+import timeline
+from lesson_catalog import lesson_catalog, bump_version
+from notifications import notification_writer
+from ranking import refresh_hot_score
 
 logger = logging.getLogger(__name__)
 
+LESSONS_PAGE_SIZE = 24
+LESSON_STATUSES = ('all', 'completed', 'pending')
+# ?sort= -> ORDER BY; each ends in l.id so pages don't overlap
+LESSON_SORTS = {'latest': 'l.created_at DESC, l.id DESC', 'title': 'l.title COLLATE NOCASE, l.id'}
+
+def fetch_lessons_page(c, user_id, grade, subject=None, status='all', page=1, lesson_ids=None, sort='latest'):
+    """One page of the lessons list for a user, in LESSON_SORTS order: the columns the cards
+    show plus completed and in_feed, from a single query. Also returns the total and completed
+    counts for the whole filtered list (window functions, so no second query). With lesson_ids
+    (search results) the page is those lessons, in that order, without paging."""
+    filters, params = '', [user_id, user_id, grade]
+    if subject:
+        filters += " AND l.subject = ?"
+        params.append(subject)
+    if status == 'completed':
+        filters += " AND cl.lesson_id IS NOT NULL"
+    elif status == 'pending':
+        filters += " AND cl.lesson_id IS NULL"
+    if lesson_ids is not None:
+        if not lesson_ids:
+            return [], {'total': 0, 'completed': 0}
+        filters += f" AND l.id IN ({', '.join('?' * len(lesson_ids))})"
+        params += lesson_ids
+        limit, offset = len(lesson_ids), 0
+    else:
+        limit, offset = LESSONS_PAGE_SIZE, (page - 1) * LESSONS_PAGE_SIZE
+    order_by = LESSON_SORTS[sort]
+    c.execute(f"""SELECT l.id, l.title, l.grade, l.subject, l.description, l.created_at,
+                         cl.lesson_id IS NOT NULL as completed, p.id IS NOT NULL as in_feed,
+                         COUNT(*) OVER () as total_count, SUM(cl.lesson_id IS NOT NULL) OVER () as completed_count
+                  FROM lessons l
+                  LEFT JOIN completed_lessons cl ON cl.user_id = ? AND cl.lesson_id = l.id
+                  LEFT JOIN posts p ON p.user_id = ? AND p.type = 'lesson' AND p.lesson_id = l.id
+                  WHERE l.grade = ? {filters}
+                  ORDER BY {order_by}
+                  LIMIT ? OFFSET ?""", params + [limit, offset])
+    rows = [dict(row) for row in c.fetchall()]
+    counts = {'total': rows[0]['total_count'] if rows else 0, 'completed': rows[0]['completed_count'] if rows else 0}
+    if lesson_ids is not None:
+        order = {lesson_id: i for i, lesson_id in enumerate(lesson_ids)}
+        rows.sort(key=lambda row: order[row['id']])
+    return rows, counts
+
 def lessons():
     if 'user_id' not in session:
         return redirect(url_for('login'))
@@ -61,57 +114,90 @@ def lessons():
                 selected_user_id = session['user_id']
                 selected_grade = user_grade
 
-        # Fetch lessons for selected grade
-        c.execute("SELECT * FROM lessons WHERE grade = ? ORDER BY created_at DESC", (selected_grade,))
-        lessons_raw = c.fetchall()
-        lessons_list = []
-        for row in lessons_raw:
-            lesson_dict = dict(row)
-            # Parse JSON fields to lists
-            if lesson_dict.get('mc_options'):
-                try:
-                    lesson_dict['mc_options'] = json.loads(lesson_dict['mc_options'])
-                except json.JSONDecodeError as e:
-                    logger.warning(f"Invalid JSON in mc_options for lesson {lesson_dict['id']}: {e}")
-                    lesson_dict['mc_options'] = []
-            if lesson_dict.get('sentence_options'):
-                try:
-                    lesson_dict['sentence_options'] = json.loads(lesson_dict['sentence_options'])
-                except json.JSONDecodeError as e:
-                    logger.warning(f"Invalid JSON in sentence_options for lesson {lesson_dict['id']}: {e}")
-                    lesson_dict['sentence_options'] = []
-            lessons_list.append(lesson_dict)
-
-        # Get completed lessons for selected user
-        c.execute("SELECT lesson_id FROM completed_lessons WHERE user_id = ?", (selected_user_id,))
-        completed_ids = {row['lesson_id'] for row in c.fetchall()}
-        for lesson in lessons_list:
-            lesson['completed'] = lesson['id'] in completed_ids
-
-        # Get lessons in feed for selected user
-        c.execute("SELECT lesson_id FROM posts WHERE user_id = ? AND type = 'lesson'", (selected_user_id,))
-        in_feed_ids = {row['lesson_id'] for row in c.fetchall()}
-        for lesson in lessons_list:
-            lesson['in_feed'] = lesson['id'] in in_feed_ids
-
-        logger.info(f"Lessons loaded for user {session['user_id']}, selected_user {selected_user_id}, grade {selected_grade}, kids={len(kids) if user_role == 'parent' else 0}")
+        # One page of the selected grade's lessons, newest first or by title, or the best
+        # matches for a search
+        q = request.args.get('q', '').strip()
+        subject = request.args.get('subject', '').strip().lower() or None
+        status = request.args.get('status', 'all')
+        if status not in LESSON_STATUSES:
+            status = 'all'
+        sort = request.args.get('sort', 'latest')
+        if sort not in LESSON_SORTS:
+            sort = 'latest'
+        page = max(request.args.get('page', 1, type=int), 1)
+        lesson_ids = None
+        if q and lesson_search.available(c):
+            found, _ = lesson_search.search(c, q, grade=selected_grade, subject=subject, limit=lesson_search.MAX_RESULTS)
+            lesson_ids = [lesson.id for lesson in found]
+        lessons_list, counts = fetch_lessons_page(c, selected_user_id, selected_grade, subject, status, page, lesson_ids, sort)
+        if not lessons_list and page > 1:
+            return redirect(url_for('lessons', **dict(request.args.to_dict(), page=1)))
+        subjects = sorted({lesson.subject for lesson in lesson_catalog.for_grade(c, selected_grade) if lesson.subject})
+        pages = 1 if lesson_ids is not None else max((counts['total'] + LESSONS_PAGE_SIZE - 1) // LESSONS_PAGE_SIZE, 1)
+
+        logger.info(f"Lessons loaded for user {session['user_id']}, selected_user {selected_user_id}, grade {selected_grade}, page {page}/{pages} ({counts['total']} lessons), kids={len(kids) if user_role == 'parent' else 0}")
         return render_template(
             'lessons.html.j2', 
             lessons=lessons_list, 
             kids=kids,
             selected_kid_id=selected_kid_id,
             selected_user_id=selected_user_id,
+            selected_grade=selected_grade,
+            q=q,
+            subject=subject or '',
+            subjects=subjects,
+            status=status,
+            sort=sort,
+            counts=counts,
+            page=page,
+            pages=pages,
             theme=session.get('theme', 'astronaut'), 
             language=session.get('language', 'en')
         )
     finally:
         conn.close()
 
+def search_lessons():
+    """GET /api/lessons/search?q=...&grade=&subject=&limit=: ranked lesson matches plus
+    subject and grade counts for the query."""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    q = request.args.get('q', '').strip()
+    grade = request.args.get('grade', type=int)
+    subject = request.args.get('subject') or None
+    limit = request.args.get('limit', 20, type=int)
+    if not q:
+        return jsonify({'success': False, 'error': 'Missing q'}), 400
+    conn = get_db()
+    c = conn.cursor()
+    try:
+        if not lesson_search.available(c):
+            return jsonify({'success': False, 'error': 'Search unavailable'}), 503
+        found, facets = lesson_search.search(c, q, grade=grade, subject=subject, limit=max(limit, 1))
+        results = [{'id': lesson.id, 'title': lesson.title, 'grade': lesson.grade, 'subject': lesson.subject,
+                    'description': lesson.description} for lesson in found]
+        return jsonify({'success': True, 'results': results, 'facets': facets})
+    except Exception as e:
+        logger.error(f"Lesson search failed for {q!r}: {e}")
+        return jsonify({'success': False, 'error': 'Server error'}), 500
+    finally:
+        conn.close()
+
+ASSIGN_ERRORS = {
+    lesson_assignment.INVALID_TARGET: ('Invalid target user', 403),
+    lesson_assignment.LESSON_NOT_FOUND: ('Lesson not found', 404),
+    lesson_assignment.GRADE_MISMATCH: ('Grade mismatch', 400),
+}
+
+def notify_assigned(results, session_user_id):
+    for user_id, count in lesson_assignment.assigned_counts(results).items():
+        notification_writer.notify(user_id, 'lesson_assigned', 0, session_user_id, session.get('handle'), count)
+
 def add_to_feed():
     if 'user_id' not in session:
         logger.warning("Add to feed unauthorized")
         return jsonify({'success': False, 'error': 'Unauthorized'}), 401
-    data = request.get_json()
+    data = request.get_json(silent=True) or {}
     lesson_id = data.get('lesson_id')
     target_user_id = data.get('target_user_id')
     session_user_id = session['user_id']
@@ -119,62 +205,29 @@ def add_to_feed():
     if not lesson_id:
         logger.warning(f"Missing lesson_id for user {session_user_id}")
         return jsonify({'success': False, 'error': 'Missing lesson_id'}), 400
+    # Default to the session user's own feed if no target
+    post_user_id = target_user_id if target_user_id else session_user_id
+    try:
+        lesson_ids = lesson_assignment.parse_ids([lesson_id])
+        user_ids = lesson_assignment.parse_ids([post_user_id])
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'Invalid lesson_id or target_user_id'}), 400
     conn = get_db()
     c = conn.cursor()
     try:
-        # Determine the user_id for the post - default to session user if no target
-        post_user_id = target_user_id if target_user_id else session_user_id
-        # If target_user_id provided and not self, validate (parent assigning to kid)
-        if target_user_id and target_user_id != session_user_id:
-            c.execute("SELECT role, parent_id, grade, handle FROM users WHERE id = ?", (target_user_id,))
-            target_user = dict(c.fetchone())
-            if not target_user:
-                return jsonify({'success': False, 'error': 'Target user not found'}), 404
-            if target_user['role'] != 'kid' or target_user['parent_id'] != session_user_id:
-                return jsonify({'success': False, 'error': 'Invalid target user'}), 403
-            target_grade = target_user['grade']
-            target_handle = target_user['handle']
-        else:
-            # Use session user - FIXED: No error if no child, just add to own feed
-            c.execute("SELECT role, grade, handle FROM users WHERE id = ?", (session_user_id,))
-            user_row = dict(c.fetchone())
-            if not user_row:
-                return jsonify({'success': False, 'error': 'User not found'}), 404
-            if user_row['role'] == 'kid':
-                return jsonify({'success': False, 'error': 'Kids cannot add lessons'}), 403
-            target_grade = user_row['grade']
-            target_handle = session.get('handle', session.get('email', 'User'))
-
-        # Check if already added by this post_user_id
-        c.execute("SELECT id FROM posts WHERE user_id = ? AND lesson_id = ? AND type = 'lesson'", (post_user_id, lesson_id))
-        if c.fetchone():
+        results = lesson_assignment.assign(c, session_user_id, lesson_ids, user_ids, feed=True, schedule=False)
+        status = results[0]['status']
+        if status in ASSIGN_ERRORS:
+            error, code = ASSIGN_ERRORS[status]
+            logger.warning(f"Add to feed of lesson {lesson_id} for user {post_user_id} refused: {status}")
+            return jsonify({'success': False, 'error': error}), code
+        if status == lesson_assignment.ALREADY_ASSIGNED:
             logger.info(f"Lesson {lesson_id} already in feed for user {post_user_id}")
             return jsonify({'success': False, 'message': 'Already in feed'})
-        # Get lesson
-        c.execute("SELECT * FROM lessons WHERE id = ?", (lesson_id,))
-        lesson_row = c.fetchone()
-        if not lesson_row:
-            logger.warning(f"Lesson {lesson_id} not found")
-            return jsonify({'success': False, 'error': 'Lesson not found'}), 404
-        lesson = dict(lesson_row)
-        # Validate grade
-        if lesson['grade'] != target_grade:
-            logger.warning(f"Grade mismatch: lesson {lesson['grade']} != target {target_grade} for lesson {lesson_id}")
-            return jsonify({'success': False, 'error': 'Grade mismatch'}), 400
-        logger.info(f"Grade check passed: {target_grade} for lesson {lesson_id}")
-        # Insert post - FIXED: Single-line to avoid multi-line issues
-        now = datetime.now().isoformat()
-        c.execute("INSERT INTO posts (user_id, content, subject, grade, handle, type, lesson_id, created_at, views, likes, reposts) VALUES (?, ?, ?, ?, ?, 'lesson', ?, ?, 0, 0, 0)", 
-                  (post_user_id, lesson['title'], lesson['subject'], lesson['grade'], 
-                   target_handle, lesson_id, now))
-        post_id = c.lastrowid
         conn.commit()
-        logger.info(f"Lesson {lesson_id} added to feed as post {post_id} for user {post_user_id}")
+        notify_assigned(results, session_user_id)
+        logger.info(f"Lesson {lesson_id} added to feed for user {post_user_id}")
         return jsonify({'success': True, 'message': 'Added to feed!'})
-    except sqlite3.IntegrityError as e:
-        logger.warning(f"Add to feed integrity error for user {post_user_id}, lesson {lesson_id}: {e}")
-        conn.rollback()
-        return jsonify({'success': False, 'error': 'Already exists'}), 409
     except Exception as e:
         logger.error(f"Add to feed error for user {post_user_id}, lesson {lesson_id}: {e}")
         conn.rollback()
@@ -182,6 +235,94 @@ def add_to_feed():
     finally:
         conn.close()
 
+def assign_lessons():
+    """POST /api/lessons/assign: assign many lessons to many users (the parent's kids or the
+    parent) in one transaction. Body: {"lesson_ids": [...], "user_ids": [...], "feed": true,
+    "schedule": true}; user_ids defaults to the session user. feed adds lesson posts,
+    schedule adds lessons_users rows. Returns a status per (user, lesson) pair."""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    session_user_id = session['user_id']
+    data = request.get_json(silent=True) or {}
+    try:
+        lesson_ids = lesson_assignment.parse_ids(data.get('lesson_ids'))
+        user_ids = lesson_assignment.parse_ids(data.get('user_ids', [session_user_id]))
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': f'Invalid ids: {e}'}), 400
+    feed = bool(data.get('feed', True))
+    schedule = bool(data.get('schedule', True))
+    if not lesson_ids or not user_ids:
+        return jsonify({'success': False, 'error': 'No lessons or users specified'}), 400
+    if not feed and not schedule:
+        return jsonify({'success': False, 'error': 'Nothing to do: feed and schedule are both false'}), 400
+    if len(lesson_ids) * len(user_ids) > lesson_assignment.MAX_ITEMS:
+        return jsonify({'success': False, 'error': f'At most {lesson_assignment.MAX_ITEMS} lesson/user pairs per request'}), 400
+    conn = get_db()
+    c = conn.cursor()
+    try:
+        results = lesson_assignment.assign(c, session_user_id, lesson_ids, user_ids, feed=feed, schedule=schedule)
+        conn.commit()
+        notify_assigned(results, session_user_id)
+        assigned = sum(1 for result in results if result['status'] == lesson_assignment.ASSIGNED)
+        return jsonify({'success': True, 'assigned': assigned, 'results': results})
+    except Exception as e:
+        logger.error(f"Bulk lesson assignment failed for user {session_user_id}: {e}")
+        conn.rollback()
+        return jsonify({'success': False, 'error': 'Server error'}), 500
+    finally:
+        conn.close()
+
+ACTIVITY_POINTS = 10
+COMPLETION_POINTS = 50
+ACTIVITY_TYPES = tuple(answer_checkers.CHECKERS)
+
+def grade_activity(lesson, activity_type, response):
+    """Grade one activity response with the catalog Lesson's compiled checker. Returns
+    (is_correct, question, correct_answer); raises ValueError for an unknown activity_type."""
+    if activity_type not in answer_checkers.CHECKERS:
+        raise ValueError(f"Invalid activity_type: {activity_type}")
+    checker = lesson.checkers.get(activity_type)
+    if checker is None:
+        # The lesson doesn't have this activity
+        return False, None, None
+    return checker.accepts(response), checker.question, checker.correct_answer
+
+def save_activity_response(c, user_id, lesson, activity_type, response, is_correct):
+    """Upsert the answer and update the catalog Lesson's progress mask in the same
+    transaction. Returns the progress as (correct_mask, expected_mask)."""
+    lesson_id = lesson.id
+    if activity_type == 'trace':
+        # Strokes (or a PNG) go to the drawing store; the row keeps a short reference
+        response = drawings.store_response(response)
+    # retry_count resets on a correct answer and counts up on wrong ones
+    c.execute("SELECT retry_count FROM activity_responses WHERE lesson_id = ? AND user_id = ? AND activity_type = ?", (lesson_id, user_id, activity_type))
+    row = c.fetchone()
+    retry_count = (row['retry_count'] or 0) + 1 if row and not is_correct else 1
+    # FIXED: Ensure response (base64 for trace) is saved fully
+    c.execute('''INSERT OR REPLACE INTO activity_responses 
+                 (lesson_id, user_id, activity_type, response, is_correct, points, responded_at, retry_count) 
+                 VALUES (?, ?, ?, ?, ?, ?, datetime('now'), ?)''',
+              (lesson_id, user_id, activity_type, response, int(is_correct), ACTIVITY_POINTS if is_correct else 0, retry_count))
+    return lesson_progress.record(c, user_id, lesson, activity_type, is_correct)
+
+def complete_if_done(c, user_id, lesson, progress):
+    """Mark the lesson completed once every activity it has was answered correctly, as
+    recorded in `progress` (from save_activity_response). The completion points are awarded
+    only by the call that records the completion, so repeating a submission never awards
+    them twice. Returns (lesson_complete, points_awarded)."""
+    if not lesson_progress.is_complete(progress):
+        return False, 0
+    now = datetime.now().isoformat()
+    c.execute("INSERT OR IGNORE INTO completed_lessons (user_id, lesson_id, completed_at, parent_confirmed) VALUES (?, ?, ?, 0)", 
+              (user_id, lesson['id'], now))
+    if not c.rowcount:
+        return True, 0
+    c.execute("UPDATE lessons_users SET completed = 1 WHERE user_id = ? AND lesson_id = ?", 
+              (user_id, lesson['id']))
+    feed_cache.publish_user(c, user_id)
+    c.execute("UPDATE users SET points = points + ? WHERE id = ?", (COMPLETION_POINTS, user_id))
+    return True, COMPLETION_POINTS
+
 def check_lesson():
     if 'user_id' not in session:
         return jsonify({'success': False, 'error': 'Unauthorized'}), 401
@@ -198,121 +339,26 @@ def check_lesson():
         return jsonify({'success': False, 'error': 'Missing lesson_id or activity_type'}), 400
 
     # FIXED: Early check for empty response (after strip) to return specific error
-    stripped_response = response.strip()
-    if not stripped_response:
+    if not response.strip():
         return jsonify({'success': False, 'error': 'Please provide a response'}), 400
 
     try:
         lesson_id = int(lesson_id)
         conn = get_db()
         c = conn.cursor()
-        # Fetch lesson details
-        c.execute("SELECT * FROM lessons WHERE id = ?", (lesson_id,))
-        lesson_row = c.fetchone()
-        if not lesson_row:
+        # Fetch lesson details (option lists are already decoded)
+        lesson_record = lesson_catalog.get(c, lesson_id)
+        if not lesson_record:
             return jsonify({'success': False, 'error': 'Lesson not found'}), 404
-        lesson = dict(lesson_row)
-
-        # Safely parse JSON fields to lists
-        for field in ['mc_options', 'sentence_options']:
-            value = lesson.get(field)
-            if value is not None:
-                try:
-                    lesson[field] = json.loads(value)
-                except (json.JSONDecodeError, TypeError, ValueError) as e:
-                    logger.warning(f"Invalid JSON in {field} for lesson {lesson_id}: {value} - {e}")
-                    lesson[field] = []
-            else:
-                lesson[field] = []
-
-        # Determine correct answer based on type
-        correct_answer = ''
-        question = ''
-        is_correct = False
-        if activity_type == 'mc':
-            correct_answer = lesson['mc_answer']
-            question = lesson['mc_question']
-            if not response:
-                is_correct = False
-            elif response not in lesson['mc_options']:
-                logger.info(f"Invalid MC option '{response}' for lesson {lesson_id}, options: {lesson['mc_options']}")
-                is_correct = False
-            else:
-                is_correct = response.lower() == correct_answer.lower()
-        elif activity_type == 'sentence':
-            correct_answer = lesson['sentence_answer']
-            question = lesson['sentence_question']
-            if not response:
-                is_correct = False
-            elif response not in lesson['sentence_options']:
-                logger.info(f"Invalid sentence option '{response}' for lesson {lesson_id}, options: {lesson['sentence_options']}")
-                is_correct = False
-            else:
-                is_correct = response.lower() == correct_answer.lower()
-        elif activity_type == 'spell':
-            correct_answer = lesson['spell_word']
-            question = f'Spell the word: {lesson["spell_word"]}'
-            is_correct = stripped_response.lower() == correct_answer.lower() if stripped_response and correct_answer else False
-        elif activity_type == 'sound':
-            correct_answer = lesson['spell_word']  # FIXED: Use spell_word for sound matching (full word)
-            question = f'Repeat the sound: /{lesson["sound"]}/'
-            is_correct = stripped_response.lower() == correct_answer.lower() if stripped_response and correct_answer else False
-        elif activity_type == 'trace':
-            correct_answer = lesson['trace_word']  # Or 'drawn' placeholder
-            question = f'Trace the word: {lesson["trace_word"]}'
-            is_correct = True  # FIXED: For trace activities, always mark as correct regardless of response (drawing saved as base64)
-        elif activity_type == 'math':
-            correct_answer = lesson['math_answer']
-            question = lesson['math_question']
-            logger.info(f"Math response: '{stripped_response}' vs correct: '{correct_answer}'")
-            is_correct = stripped_response.lower() == correct_answer.lower() if stripped_response and correct_answer else False
-        else:
+        lesson = lesson_record.as_dict()
+        if activity_type not in ACTIVITY_TYPES:
             return jsonify({'success': False, 'error': 'Invalid activity_type'}), 400
 
-        # FIXED: Safe handling of retry_count - use SELECT * and check keys
-        existing_retry = 1  # Default to 1 for new submissions
-        c.execute("SELECT * FROM activity_responses WHERE lesson_id = ? AND user_id = ? AND activity_type = ?", (lesson_id, session['user_id'], activity_type))
-        row = dict(c.fetchone()) if c.fetchone() else {}
-        if row:
-            retry_val = row.get('retry_count', 0)
-            existing_retry = retry_val + 1 if not is_correct else 1  # Reset on correct, increment on wrong
-
-        # Save to DB (INSERT OR REPLACE; retry_count will be handled by schema)
-        # FIXED: Ensure response (base64 for trace) is saved fully
-        c.execute('''INSERT OR REPLACE INTO activity_responses 
-                     (lesson_id, user_id, activity_type, response, is_correct, points, responded_at, retry_count) 
-                     VALUES (?, ?, ?, ?, ?, ?, datetime('now'), ?)''',
-                  (lesson_id, session['user_id'], activity_type, response, int(is_correct), 10 if is_correct else 0, existing_retry))
+        is_correct, question, correct_answer = grade_activity(lesson_record, activity_type, response)
+        progress = save_activity_response(c, session['user_id'], lesson_record, activity_type, response, is_correct)
+        lesson_complete, _ = complete_if_done(c, session['user_id'], lesson, progress)
         conn.commit()
 
-        # FIXED: Check if lesson complete (all activities submitted correctly, including math)
-        # Dynamic expected_activities based on non-None fields
-        activity_fields = {
-            'mc': lesson['mc_answer'] is not None,
-            'sentence': lesson['sentence_answer'] is not None,
-            'spell': lesson['spell_word'] is not None,
-            'sound': lesson['sound'] is not None,
-            'trace': lesson['trace_word'] is not None,
-            'math': lesson.get('math_answer') is not None
-        }
-        expected_activities = sum(1 for v in activity_fields.values() if v)
-        c.execute("SELECT COUNT(DISTINCT activity_type) FROM activity_responses WHERE lesson_id = ? AND user_id = ? AND is_correct = 1", (lesson_id, session['user_id']))
-        submitted_count_result = c.fetchone()
-        submitted_count = submitted_count_result[0] if submitted_count_result else 0
-        lesson_complete = submitted_count >= expected_activities
-
-        # Mark lesson as completed in DB if all activities done
-        if lesson_complete:
-            now = datetime.now().isoformat()
-            c.execute("INSERT OR IGNORE INTO completed_lessons (user_id, lesson_id, completed_at, parent_confirmed) VALUES (?, ?, ?, 0)", 
-                      (session['user_id'], lesson_id, now))
-            c.execute("UPDATE lessons_users SET completed = 1 WHERE user_id = ? AND lesson_id = ?", 
-                      (session['user_id'], lesson_id))
-            conn.commit()
-            # Award points if complete
-            c.execute("UPDATE users SET points = points + 50 WHERE id = ?", (session['user_id'],))
-            conn.commit()
-
         logger.info(f"User {session['user_id']} submitted {activity_type} for lesson {lesson_id}: {response[:50]}... (correct: {is_correct})")
 
         # FIXED: Return flag to hide card in frontend if complete
@@ -330,11 +376,113 @@ def check_lesson():
         return jsonify({'success': False, 'error': 'Invalid lesson ID'}), 400
     except Exception as e:
         logger.error(f"Check lesson failed: {str(e)}")
+        if 'conn' in locals():
+            conn.rollback()
         return jsonify({'success': False, 'error': 'Server error'}), 500
     finally:
         if 'conn' in locals():
             conn.close()
 
+def submit_lesson(lesson_id):
+    """POST /api/lessons/<id>/submit: grade several activities of one lesson in a single
+    transaction. Body: {"activities": {"mc": "...", "spell": "...", ...}, "idempotency_key": "..."}
+    (the key may also come in an Idempotency-Key header). A retry with a used key gets the
+    original response back, marked "replayed", without grading or awarding anything again."""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    user_id = session['user_id']
+    data = request.get_json(silent=True) or {}
+    activities = data.get('activities')
+    if not isinstance(activities, dict) or not activities:
+        return jsonify({'success': False, 'error': 'No activities submitted'}), 400
+    for activity_type, response in activities.items():
+        if activity_type not in ACTIVITY_TYPES:
+            return jsonify({'success': False, 'error': f'Invalid activity_type: {activity_type}'}), 400
+        if not isinstance(response, str) or not response.strip():
+            return jsonify({'success': False, 'error': f'Please provide a response for {activity_type}'}), 400
+    try:
+        key = idempotency.request_key(request, data)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    conn = get_db()
+    c = conn.cursor()
+    try:
+        lesson_record = lesson_catalog.get(c, lesson_id)
+        if not lesson_record:
+            return jsonify({'success': False, 'error': 'Lesson not found'}), 404
+        lesson = lesson_record.as_dict()
+        # Serialise with other writers before looking the key up, so two concurrent retries
+        # can't both miss it
+        c.execute("BEGIN IMMEDIATE")
+        scope = f'lesson:{lesson_record.id}'
+        if key:
+            try:
+                previous = idempotency.lookup(c, user_id, key, scope)
+            except idempotency.KeyReused as e:
+                conn.rollback()
+                logger.warning(f"User {user_id} reused idempotency key {key} on lesson {lesson_id}")
+                return jsonify({'success': False, 'error': str(e)}), 422
+            if previous is not None:
+                conn.rollback()
+                logger.info(f"Replayed lesson submission {key} for user {user_id}, lesson {lesson_id}")
+                return jsonify(dict(previous, replayed=True))
+        results = {}
+        for activity_type, response in activities.items():
+            is_correct, question, correct_answer = grade_activity(lesson_record, activity_type, response)
+            progress = save_activity_response(c, user_id, lesson_record, activity_type, response, is_correct)
+            results[activity_type] = {'is_correct': is_correct, 'question': question, 'correct_answer': correct_answer}
+        lesson_complete, points_awarded = complete_if_done(c, user_id, lesson, progress)
+        result = {
+            'success': True,
+            'results': results,
+            'lesson_complete': lesson_complete,
+            'hide_card': lesson_complete,
+            'points_awarded': points_awarded,
+        }
+        if key:
+            idempotency.store(c, user_id, key, scope, result)
+        conn.commit()
+        logger.info(f"User {user_id} submitted {len(results)} activities for lesson {lesson_id} (complete: {lesson_complete})")
+        return jsonify(dict(result, replayed=False))
+    except Exception as e:
+        logger.error(f"Lesson submission failed for user {user_id}, lesson {lesson_id}: {str(e)}")
+        conn.rollback()
+        return jsonify({'success': False, 'error': 'Server error'}), 500
+    finally:
+        conn.close()
+
+def drawing_file(digest):
+    """GET /drawings/<sha256>.png for the kid who drew it or their parent. Stroke drawings
+    are served as a thumbnail, rendered the first time it is asked for."""
+    if 'user_id' not in session:
+        abort(401)
+    if not drawings.parse_ref(drawings.REF_PREFIX + digest):
+        abort(404)
+    conn = get_db()
+    c = conn.cursor()
+    try:
+        c.execute("""SELECT ar.response FROM activity_responses ar JOIN users u ON u.id = ar.user_id
+                     WHERE ar.activity_type = 'trace' AND ar.response IN (?, ?) AND (u.id = ? OR u.parent_id = ?) LIMIT 1""",
+                  (drawings.REF_PREFIX + digest, drawings.STROKES_REF_PREFIX + digest, session['user_id'], session['user_id']))
+        row = c.fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        abort(404)
+    if row[0].startswith(drawings.STROKES_REF_PREFIX):
+        path = drawings.thumbnail(digest)
+    else:
+        path = drawings.path_for(digest)
+    if not path or not os.path.exists(path):
+        abort(404)
+    # Content-addressed, so the file behind a URL never changes; private because access is
+    # checked per user, so shared caches must not keep a copy
+    response = send_file(path, mimetype='image/png', max_age=31536000)
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
+
 def complete_lesson(lesson_id):
     if 'user_id' not in session:
         return redirect(url_for('login'))
@@ -352,6 +500,7 @@ def complete_lesson(lesson_id):
                   (session['user_id'], lesson_id, now))
         c.execute("UPDATE lessons_users SET completed = 1 WHERE user_id = ? AND lesson_id = ?", 
                   (session['user_id'], lesson_id))
+        feed_cache.publish_user(c, session['user_id'])
         conn.commit()
         flash('Lesson completed successfully! Waiting for parent confirmation.', 'success')
         # FIXED: Enhanced redirect to home/feed for kids, with flash message
@@ -377,6 +526,8 @@ def reset_lesson(lesson_id):
                   (session['user_id'], lesson_id))
         c.execute("DELETE FROM activity_responses WHERE user_id = ? AND lesson_id = ?", 
                   (session['user_id'], lesson_id))
+        lesson_progress.reset(c, session['user_id'], lesson_id)
+        feed_cache.publish_user(c, session['user_id'])
         conn.commit()
         flash('Lesson reset successfully!', 'success')
     except Exception as e:
@@ -414,9 +565,14 @@ def generate_lesson():
             c.execute("INSERT INTO lessons (title, grade, subject, content, description, created_at) VALUES (?, ?, 'math', ?, ?, ?)", 
                       (sample_title, user_grade, sample_content, sample_content, now))
             new_lesson_id = c.lastrowid
+            bump_version(c)
             # FIXED: Single-line SQL
             c.execute("INSERT INTO posts (user_id, content, subject, grade, handle, type, lesson_id, created_at, views, likes, reposts) VALUES (?, ?, 'math', ?, ?, 'lesson', ?, ?, 0, 0, 0)", 
                       (session['user_id'], sample_title, user_grade, user_handle, new_lesson_id, now))
+            new_post_id = c.lastrowid
+            refresh_hot_score(c, new_post_id)
+            timeline.fan_out_post(c, new_post_id)
+            feed_cache.publish_user(c, session['user_id'])
             conn.commit()
             flash(f"Generated and added '{sample_title}' to your feed! Register a child to assign lessons to them.", "success")
             return redirect(url_for('profile'))  # Or home to see feed
@@ -435,40 +591,33 @@ def generate_lesson():
             conn.close()
 
 def schedule_lessons():
-    # Stub: POST to assign lessons to user
     if 'user_id' not in session:
         return jsonify({'success': False, 'error': 'Unauthorized'}), 401
-    data = request.get_json()
-    lesson_ids = data.get('lesson_ids', [])
+    data = request.get_json(silent=True) or {}
     target_user_id = data.get('target_user_id')
     session_user_id = session['user_id']
+    # Default to the session user if no target (parents scheduling for themselves)
+    assign_user_id = target_user_id if target_user_id else session_user_id
+    try:
+        lesson_ids = lesson_assignment.parse_ids(data.get('lesson_ids', []))
+        user_ids = lesson_assignment.parse_ids([assign_user_id])
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'Invalid lesson_ids or target_user_id'}), 400
     if not lesson_ids:
         return jsonify({'success': False, 'error': 'No lessons specified'}), 400
+    if len(lesson_ids) > lesson_assignment.MAX_ITEMS:
+        return jsonify({'success': False, 'error': f'At most {lesson_assignment.MAX_ITEMS} lessons per request'}), 400
     conn = get_db()
     c = conn.cursor()
     try:
-        # Determine the user_id for assignment - default to session user if no target
-        assign_user_id = target_user_id if target_user_id else session_user_id
-        # If target_user_id provided, validate (parent assigning to kid)
-        if target_user_id:
-            c.execute("SELECT role, parent_id FROM users WHERE id = ?", (target_user_id,))
-            target_user = dict(c.fetchone())
-            if not target_user:
-                return jsonify({'success': False, 'error': 'Target user not found'}), 404
-            if target_user['role'] != 'kid' or target_user['parent_id'] != session_user_id:
-                return jsonify({'success': False, 'error': 'Invalid target user'}), 403
-        else:
-            # FIXED: Use session user if no child specified - no error
-            c.execute("SELECT role FROM users WHERE id = ?", (session_user_id,))
-            user_row = dict(c.fetchone())
-            if not user_row or user_row['role'] == 'kid':
-                return jsonify({'success': False, 'error': 'Kids cannot schedule lessons'}), 403
-        now = datetime.now().isoformat()
-        for lid in lesson_ids:
-            c.execute("INSERT OR IGNORE INTO lessons_users (user_id, lesson_id, assigned_at) VALUES (?, ?, ?)", 
-                      (assign_user_id, lid, now))
+        results = lesson_assignment.assign(c, session_user_id, lesson_ids, user_ids, feed=False, schedule=True, check_grade=False)
+        if results[0]['status'] == lesson_assignment.INVALID_TARGET:
+            return jsonify({'success': False, 'error': 'Invalid target user'}), 403
         conn.commit()
-        return jsonify({'success': True, 'message': f'Added {len(lesson_ids)} lessons to schedule'})
+        notify_assigned(results, session_user_id)
+        # Lessons already scheduled, missing or otherwise skipped aren't counted
+        assigned = sum(1 for result in results if result['status'] == lesson_assignment.ASSIGNED)
+        return jsonify({'success': True, 'message': f'Added {assigned} lessons to schedule', 'assigned': assigned, 'results': results})
     except Exception as e:
         logger.error(f"Schedule lessons error: {e}")
         conn.rollback()
@@ -0,0 +1,69 @@
+# lesson_search.py
+# Ranked full-text search over the lesson catalog. lessons_fts (migration 012) is an FTS5
+# index over the lesson text with lessons as its external content table; triggers on
+# lessons keep it in sync, so seeding, generating and importing lessons need no extra step.
+#
+# Every word of the query must match, and the last word also matches as a prefix (from two
+# letters on), so "short a" finds "Short A" and "subtr" finds "Subtraction" while the
+# parent is typing. Results are ordered by bm25 with title matches weighted highest, and
+# come back with subject and grade counts for the whole match set, so the page can offer
+# those filters.
+import logging
+import re
+
+from lesson_catalog import lesson_catalog
+
+logger = logging.getLogger(__name__)
+
+FTS_COLUMNS = ('title', 'content', 'description', 'trace_word', 'spell_word',
+               'mc_question', 'sentence_question', 'math_question')
+# bm25() weights, in FTS_COLUMNS order
+FTS_WEIGHTS = (10.0, 2.0, 2.0, 5.0, 5.0, 1.0, 1.0, 1.0)
+
+MAX_TERMS = 8
+MAX_RESULTS = 50
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+RANK_SQL = f"bm25(lessons_fts, {', '.join(str(weight) for weight in FTS_WEIGHTS)})"
+
+def available(c):
+    c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'lessons_fts'")
+    return c.fetchone() is not None
+
+def match_expression(text):
+    """FTS5 query for free text: each word quoted (so punctuation and operators in the input
+    are literal), the last one as a prefix. None if there are no words."""
+    terms = TERM_RE.findall(text or '')[:MAX_TERMS]
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    if len(terms[-1]) >= 2:
+        # One-letter prefixes match most of the vocabulary; take those literally
+        quoted[-1] += '*'
+    return ' '.join(quoted)
+
+def search(c, text, grade=None, subject=None, limit=20):
+    """(lessons, facets) for a query: up to `limit` Lesson records, best first, filtered by
+    grade and subject; facets counts matches per subject and per grade before filtering."""
+    expression = match_expression(text)
+    if expression is None:
+        return [], {'subject': {}, 'grade': {}}
+    filters, params = '', [expression]
+    if grade is not None:
+        filters += " AND l.grade = ?"
+        params.append(grade)
+    if subject:
+        filters += " AND l.subject = ?"
+        params.append(subject)
+    c.execute(f"""SELECT l.id FROM lessons_fts JOIN lessons l ON l.id = lessons_fts.rowid
+                  WHERE lessons_fts MATCH ? {filters}
+                  ORDER BY {RANK_SQL} LIMIT ?""", params + [min(limit, MAX_RESULTS)])
+    ids = [row[0] for row in c.fetchall()]
+    c.execute("""SELECT l.subject, l.grade, COUNT(*) FROM lessons_fts JOIN lessons l ON l.id = lessons_fts.rowid
+                 WHERE lessons_fts MATCH ? GROUP BY l.subject, l.grade""", (expression,))
+    facets = {'subject': {}, 'grade': {}}
+    for row_subject, row_grade, count in c.fetchall():
+        facets['subject'][row_subject] = facets['subject'].get(row_subject, 0) + count
+        facets['grade'][row_grade] = facets['grade'].get(row_grade, 0) + count
+    lessons = lesson_catalog.get_many(c, ids)
+    return [lessons[lesson_id] for lesson_id in ids if lesson_id in lessons], facets
@@ -3,6 +3,7 @@ import logging
 import sqlite3
 from datetime import datetime
 import json
+from lesson_catalog import bump_version
 
 logger = logging.getLogger(__name__)
 
@@ -115,5 +116,6 @@ def seed_lessons(conn):
                      (grade, subject, content, created_at, trace_word, spell_word, sound, mc_question, mc_options, mc_answer, 
                       sentence_question, sentence_options, sentence_answer, math_question, math_answer) 
                      VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", values)
+    bump_version(c)
     conn.commit()
     logger.info("Seeded lessons with updated fields")
\ No newline at end of file
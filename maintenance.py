@@ -0,0 +1,225 @@
+# maintenance.py
+# Background database upkeep, kept out of the request path: orphan cleanup,
+# PRAGMA optimize, incremental vacuum and an integrity check, each on its own
+# cadence. Every worker runs a scheduler thread, but a task is claimed in
+# app_meta inside a BEGIN IMMEDIATE transaction, so only one worker runs it
+# per interval. Results are stored in app_meta and served by /admin/maintenance
+# (to the users listed in ADMIN_EMAILS).
+#
+# Run all tasks once from the command line with: python maintenance.py [--vacuum]
+# (--vacuum does a full VACUUM first, which also switches an existing database
+# to incremental auto_vacuum; it blocks writers while it runs).
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+def task_interval(name, default):
+    return int(os.environ.get(f'MAINTENANCE_{name.upper()}_SECONDS', default))
+
+def sweep_orphans(conn):
+    """Remove lesson posts, completions and assignments whose lesson no longer exists."""
+    c = conn.cursor()
+    c.execute("""
+        DELETE FROM posts
+        WHERE type = 'lesson'
+        AND lesson_id IS NOT NULL
+        AND lesson_id NOT IN (SELECT id FROM lessons)
+    """)
+    deleted_posts = c.rowcount
+    c.execute("""
+        DELETE FROM completed_lessons
+        WHERE lesson_id NOT IN (SELECT id FROM lessons)
+    """)
+    deleted_cl = c.rowcount
+    c.execute("""
+        DELETE FROM lessons_users
+        WHERE lesson_id NOT IN (SELECT id FROM lessons)
+    """)
+    deleted_lu = c.rowcount
+    conn.commit()
+    if deleted_posts + deleted_cl + deleted_lu > 0:
+        logger.info(f"Cleaned up {deleted_posts} invalid lesson posts, {deleted_cl} orphaned completed_lessons, and {deleted_lu} lessons_users")
+    return {'posts': deleted_posts, 'completed_lessons': deleted_cl, 'lessons_users': deleted_lu}
+
+def optimize(conn):
+    """Refresh planner statistics where SQLite thinks they are stale."""
+    conn.execute("PRAGMA optimize")
+    return {'ok': True}
+
+def incremental_vacuum(conn):
+    mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    if mode != 2:
+        return {'skipped': 'auto_vacuum is not INCREMENTAL; run python maintenance.py --vacuum once', 'free_pages': free_before}
+    pages = int(os.environ.get('MAINTENANCE_VACUUM_PAGES', 1000))
+    conn.execute(f"PRAGMA incremental_vacuum({pages})").fetchall()
+    free_after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return {'freed_pages': free_before - free_after, 'free_pages': free_after}
+
+def integrity_check(conn):
+    rows = [row[0] for row in conn.execute("PRAGMA quick_check").fetchall()]
+    ok = rows == ['ok']
+    if not ok:
+        logger.error(f"Database quick_check reported problems: {rows[:10]}")
+    return {'ok': ok, 'problems': [] if ok else rows[:10]}
+
+def trim_timelines(conn):
+    import timeline
+    return timeline.trim(conn)
+
+def compact_notifications(conn):
+    import notifications
+    return notifications.compact(conn)
+
+def expire_idempotency_keys(conn):
+    import idempotency
+    return idempotency.expire(conn)
+
+def migrate_drawings(conn):
+    import drawings
+    return drawings.migrate_inline(conn, max_batches=int(os.environ.get('MAINTENANCE_DRAWING_BATCHES', 50)))
+
+def repair_unread_counts(conn):
+    import unread_counts
+    return unread_counts.repair(conn)
+
+# name -> (function, default cadence in seconds)
+TASKS = {
+    'orphan_sweep': (sweep_orphans, 3600),
+    'timeline_trim': (trim_timelines, 3600),
+    'optimize': (optimize, 3600),
+    'idempotency_expiry': (expire_idempotency_keys, 3600),
+    'drawing_migration': (migrate_drawings, 3600),
+    'incremental_vacuum': (incremental_vacuum, 6 * 3600),
+    'unread_repair': (repair_unread_counts, 24 * 3600),
+    'notification_compact': (compact_notifications, 24 * 3600),
+    'integrity_check': (integrity_check, 24 * 3600),
+}
+
+def claim(conn, name, interval, now):
+    """Mark task as started if it is due. Returns False if another worker ran it recently."""
+    from db import get_meta, set_meta
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        state = json.loads(get_meta(c, f'maintenance:{name}') or '{}')
+        if state.get('started_at', 0) + interval > now:
+            conn.rollback()
+            return False
+        state.update({'started_at': now, 'pid': os.getpid()})
+        set_meta(c, f'maintenance:{name}', json.dumps(state))
+        conn.commit()
+        return True
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+def record(conn, name, started, result=None, error=None):
+    from db import get_meta, set_meta
+    c = conn.cursor()
+    state = json.loads(get_meta(c, f'maintenance:{name}') or '{}')
+    state.update({
+        'finished_at': datetime.now().isoformat(),
+        'duration_ms': round((time.time() - started) * 1000, 1),
+        'result': result,
+        'error': error,
+    })
+    set_meta(c, f'maintenance:{name}', json.dumps(state))
+    conn.commit()
+
+def run_due_tasks(force=False):
+    """Run every task whose cadence has elapsed (or all of them with force=True)."""
+    from db import connect
+    ran = []
+    conn = connect()
+    try:
+        for name, (task, default_interval) in TASKS.items():
+            interval = 0 if force else task_interval(name, default_interval)
+            now = time.time()
+            try:
+                if not claim(conn, name, interval, now):
+                    continue
+            except sqlite3.OperationalError as e:
+                logger.warning(f"Maintenance task {name} not claimed: {str(e)}")
+                continue
+            # Any failure is recorded against its task; the remaining tasks still run
+            try:
+                result = task(conn)
+                record(conn, name, now, result=result)
+                ran.append(name)
+            except Exception as e:
+                logger.exception(f"Maintenance task {name} failed: {str(e)}")
+                conn.rollback()
+                try:
+                    record(conn, name, now, error=f"{type(e).__name__}: {e}")
+                except sqlite3.Error as record_error:
+                    logger.error(f"Could not record failure of maintenance task {name}: {str(record_error)}")
+    finally:
+        conn.close()
+    return ran
+
+def status():
+    from db import connect
+    conn = connect()
+    try:
+        report = {}
+        for name, (task, default_interval) in TASKS.items():
+            row = conn.execute("SELECT value FROM app_meta WHERE key = ?", (f'maintenance:{name}',)).fetchone()
+            state = json.loads(row[0]) if row else {}
+            if 'started_at' in state:
+                state['started_at'] = datetime.fromtimestamp(state['started_at']).isoformat()
+            state['interval_seconds'] = task_interval(name, default_interval)
+            report[name] = state
+        return report
+    finally:
+        conn.close()
+
+class MaintenanceScheduler:
+    def __init__(self):
+        self.pid = None
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def ensure_started(self):
+        if self.pid == os.getpid() and self.thread and self.thread.is_alive():
+            return
+        if os.environ.get('MAINTENANCE_DISABLED') == '1':
+            return
+        with self.lock:
+            if self.pid == os.getpid() and self.thread and self.thread.is_alive():
+                return
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self._run, name='db-maintenance', daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        tick = int(os.environ.get('MAINTENANCE_TICK_SECONDS', 300))
+        while True:
+            try:
+                ran = run_due_tasks()
+                if ran:
+                    logger.info(f"Maintenance ran: {', '.join(ran)}")
+            except Exception as e:
+                logger.error(f"Maintenance scheduler error: {str(e)}")
+            time.sleep(tick)
+
+scheduler = MaintenanceScheduler()
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    if '--vacuum' in sys.argv:
+        from db import connect
+        conn = connect()
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        conn.close()
+        print("VACUUM complete; auto_vacuum is now INCREMENTAL")
+    print(f"Ran: {', '.join(run_due_tasks(force=True))}")
+    print(json.dumps(status(), indent=2))
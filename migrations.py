@@ -0,0 +1,293 @@
+# migrations.py
+# Numbered schema migrations tracked in PRAGMA user_version. init_db() calls
+# run_migrations() on every boot; once the database is current that is a single
+# PRAGMA read, so gunicorn workers start without touching the schema.
+#
+# To change the schema, append a new function to MIGRATIONS. Never edit or reorder
+# a migration that has shipped - existing databases have already recorded it.
+import logging
+import sqlite3
+
+logger = logging.getLogger(__name__)
+
+def migration_001_baseline(conn):
+    """Tables as of the first versioned release, plus the one-off upgrades that used
+    to run on every start (lesson_responses rename, activity_responses dedup, added columns)."""
+    from db import init_tables, upgrade_legacy_schema
+    from achievements_db import init_achievements_tables
+    c = conn.cursor()
+    init_tables(c)
+    init_achievements_tables(c)
+    upgrade_legacy_schema(conn)
+
+def migration_002_route_indexes(conn):
+    """Secondary indexes for the lookups the routes make on every request. Checked by
+    query_plan_check.py. completed_lessons and lessons_users are deduplicated first so the
+    INSERT OR IGNOREs that write them finally have a unique key to ignore on."""
+    c = conn.cursor()
+    c.execute("""
+        DELETE FROM completed_lessons
+        WHERE id NOT IN (
+            SELECT id FROM (
+                SELECT id,
+                       ROW_NUMBER() OVER (PARTITION BY user_id, lesson_id ORDER BY parent_confirmed DESC, id ASC) as rn
+                FROM completed_lessons
+            ) t
+            WHERE rn = 1
+        )
+    """)
+    logger.info(f"Removed {c.rowcount} duplicate completed_lessons rows")
+    c.execute("""
+        DELETE FROM lessons_users
+        WHERE id NOT IN (
+            SELECT id FROM (
+                SELECT id,
+                       ROW_NUMBER() OVER (PARTITION BY user_id, lesson_id ORDER BY completed DESC, id ASC) as rn
+                FROM lessons_users
+            ) t
+            WHERE rn = 1
+        )
+    """)
+    logger.info(f"Removed {c.rowcount} duplicate lessons_users rows")
+    indexes = [
+        # Feed: global posts by recency/views/likes, per-user lesson posts, notification counts
+        "CREATE INDEX IF NOT EXISTS idx_posts_type_created ON posts (type, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_posts_type_views ON posts (type, views)",
+        "CREATE INDEX IF NOT EXISTS idx_posts_type_likes ON posts (type, likes)",
+        "CREATE INDEX IF NOT EXISTS idx_posts_user_type ON posts (user_id, type, lesson_id)",
+        "CREATE INDEX IF NOT EXISTS idx_posts_created_at ON posts (created_at)",
+        # Per-user interaction lookups
+        "CREATE INDEX IF NOT EXISTS idx_likes_post_user ON likes (post_id, user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_likes_user ON likes (user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_reposts_post_user ON reposts (post_id, user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_reposts_user ON reposts (user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_comments_post_created ON comments (post_id, created_at)",
+        # Lessons
+        "CREATE INDEX IF NOT EXISTS idx_lessons_grade_created ON lessons (grade, created_at)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS unique_completed_lesson ON completed_lessons (user_id, lesson_id)",
+        "CREATE INDEX IF NOT EXISTS idx_completed_lessons_lesson ON completed_lessons (lesson_id)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS unique_lessons_user ON lessons_users (user_id, lesson_id)",
+        "CREATE INDEX IF NOT EXISTS idx_lessons_users_user_assigned ON lessons_users (user_id, assigned_at)",
+        "CREATE INDEX IF NOT EXISTS idx_lessons_users_lesson ON lessons_users (lesson_id)",
+        "CREATE INDEX IF NOT EXISTS idx_activity_responses_user_time ON activity_responses (user_id, responded_at)",
+        # Social graph and family accounts
+        "CREATE INDEX IF NOT EXISTS idx_friendships_requester ON friendships (requester_id, status)",
+        "CREATE INDEX IF NOT EXISTS idx_friendships_target ON friendships (target_id, status)",
+        "CREATE INDEX IF NOT EXISTS idx_users_parent ON users (parent_id, role)",
+        # Profile/dashboard stats
+        "CREATE INDEX IF NOT EXISTS idx_tests_user_date ON tests (user_id, date)",
+        "CREATE INDEX IF NOT EXISTS idx_games_user ON games (user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_badges_user_awarded ON badges (user_id, awarded_date)",
+        "CREATE INDEX IF NOT EXISTS idx_feedback_user_submitted ON feedback (user_id, submitted_date)",
+        "CREATE INDEX IF NOT EXISTS idx_user_points_user ON user_points (user_id)",
+    ]
+    for statement in indexes:
+        c.execute(statement)
+    # game_routes records a score, but db.init_tables created games without the column
+    c.execute("PRAGMA table_info(games)")
+    if 'score' not in {col[1] for col in c.fetchall()}:
+        c.execute("ALTER TABLE games ADD COLUMN score INTEGER")
+        logger.info("Added score column to games table")
+
+def migration_003_feed_versions(conn):
+    """Invalidation versions for feed_cache.py: one row per user, user_id 0 for changes that
+    affect every feed."""
+    c = conn.cursor()
+    c.execute("""CREATE TABLE IF NOT EXISTS feed_versions (
+        user_id INTEGER PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    )""")
+
+def migration_004_home_timeline(conn):
+    """Fan-out table behind timeline.py, keyed so a user's latest-first page is one range
+    scan. Starts empty; reads fall back to posts until 'python timeline.py backfill' runs."""
+    c = conn.cursor()
+    c.execute("""CREATE TABLE IF NOT EXISTS home_timeline (
+        user_id INTEGER NOT NULL,
+        created_at TEXT NOT NULL,
+        post_id INTEGER NOT NULL,
+        lesson_id INTEGER,
+        PRIMARY KEY (user_id, created_at, post_id)
+    ) WITHOUT ROWID""")
+
+def migration_005_hot_score(conn):
+    """Stored, indexed hot ranking (see ranking.py), plus posts.comment_count so the score
+    doesn't need a COUNT over comments."""
+    c = conn.cursor()
+    c.execute("PRAGMA table_info(posts)")
+    columns = {col[1] for col in c.fetchall()}
+    if 'comment_count' not in columns:
+        c.execute("ALTER TABLE posts ADD COLUMN comment_count INTEGER DEFAULT 0")
+    if 'hot_score' not in columns:
+        c.execute("ALTER TABLE posts ADD COLUMN hot_score REAL DEFAULT 0")
+    c.execute("UPDATE posts SET comment_count = (SELECT COUNT(*) FROM comments WHERE comments.post_id = posts.id)")
+    c.execute("UPDATE posts SET hot_score = hot_score(likes, reposts, views, comment_count, created_at)")
+    logger.info(f"Computed hot_score for {c.rowcount} posts")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_posts_type_hot ON posts (type, hot_score)")
+
+def migration_006_unread_counts(conn):
+    """Per-user unread counters (see unread_counts.py), seeded from posts and last_feed_view."""
+    from unread_counts import recompute
+    c = conn.cursor()
+    c.execute("""CREATE TABLE IF NOT EXISTS unread_counts (
+        user_id INTEGER PRIMARY KEY,
+        count INTEGER NOT NULL DEFAULT 0
+    )""")
+    recompute(c)
+
+def migration_007_notifications(conn):
+    """Coalesced activity notifications (see notifications.py). The unique key is what the
+    batching writer upserts on and also serves the per-user, newest-first read."""
+    c = conn.cursor()
+    c.execute("""CREATE TABLE IF NOT EXISTS notifications (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        target_id INTEGER NOT NULL DEFAULT 0,
+        window_start INTEGER NOT NULL,
+        count INTEGER NOT NULL DEFAULT 1,
+        actor_id INTEGER,
+        actor_handle TEXT,
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL
+    )""")
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_notifications_window ON notifications (user_id, kind, target_id, window_start)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_notifications_user ON notifications (user_id, id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_notifications_updated ON notifications (updated_at)")
+
+def migration_008_idempotency_keys(conn):
+    """Stored responses of idempotent write requests (see idempotency.py)."""
+    c = conn.cursor()
+    c.execute("""CREATE TABLE IF NOT EXISTS idempotency_keys (
+        user_id INTEGER NOT NULL,
+        key TEXT NOT NULL,
+        response TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        PRIMARY KEY (user_id, key)
+    ) WITHOUT ROWID""")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created ON idempotency_keys (created_at)")
+
+def migration_009_drawing_refs(conn):
+    """Trace drawings move out of row (see drawings.py); this index finds the responses that
+    reference one, for access checks. Existing rows are converted by the maintenance job."""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_activity_responses_drawing ON activity_responses (response) WHERE activity_type = 'trace'")
+
+def migration_010_lesson_progress(conn):
+    """Per-(user, lesson) bitmasks of correctly answered activities (see lesson_progress.py),
+    backfilled from the answers already stored."""
+    from lesson_progress import BACKFILL_SQL
+    c = conn.cursor()
+    c.execute("""CREATE TABLE IF NOT EXISTS lesson_progress (
+        user_id INTEGER NOT NULL,
+        lesson_id INTEGER NOT NULL,
+        correct_mask INTEGER NOT NULL DEFAULT 0,
+        expected_mask INTEGER NOT NULL DEFAULT 0,
+        updated_at TEXT,
+        PRIMARY KEY (user_id, lesson_id)
+    ) WITHOUT ROWID""")
+    c.execute(BACKFILL_SQL)
+    logger.info(f"Backfilled {c.rowcount} lesson_progress rows")
+
+def migration_011_lesson_titles(conn):
+    """Lessons are matched by title when seeding and importing (see lesson_io.py)."""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_lessons_title ON lessons (title)")
+
+def migration_012_lesson_search(conn):
+    """FTS5 index over the lesson catalog (see lesson_search.py), kept in sync with lessons
+    by triggers. SQLite builds without FTS5 skip it and search reports itself unavailable."""
+    from lesson_search import FTS_COLUMNS
+    c = conn.cursor()
+    columns = ', '.join(FTS_COLUMNS)
+    new_values = ', '.join(f"new.{column}" for column in FTS_COLUMNS)
+    old_values = ', '.join(f"old.{column}" for column in FTS_COLUMNS)
+    try:
+        c.execute(f"""CREATE VIRTUAL TABLE IF NOT EXISTS lessons_fts USING fts5(
+            {columns}, content='lessons', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3')""")
+    except sqlite3.OperationalError as e:
+        logger.warning(f"Lesson search disabled, FTS5 not available: {e}")
+        return
+    c.execute(f"""CREATE TRIGGER IF NOT EXISTS lessons_fts_insert AFTER INSERT ON lessons BEGIN
+        INSERT INTO lessons_fts (rowid, {columns}) VALUES (new.id, {new_values});
+    END""")
+    c.execute(f"""CREATE TRIGGER IF NOT EXISTS lessons_fts_delete AFTER DELETE ON lessons BEGIN
+        INSERT INTO lessons_fts (lessons_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+    END""")
+    c.execute(f"""CREATE TRIGGER IF NOT EXISTS lessons_fts_update AFTER UPDATE ON lessons BEGIN
+        INSERT INTO lessons_fts (lessons_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+        INSERT INTO lessons_fts (rowid, {columns}) VALUES (new.id, {new_values});
+    END""")
+    c.execute("INSERT INTO lessons_fts (lessons_fts) VALUES ('rebuild')")
+
+def migration_013_lessons_page(conn):
+    """The lessons page lists one grade, optionally one subject, newest first or by title.
+    (grade, created_at) from the baseline covers the unfiltered newest-first list; these
+    cover the subject filter and the title order."""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_lessons_grade_subject_created ON lessons (grade, subject, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_lessons_grade_title ON lessons (grade, title COLLATE NOCASE)")
+
+def migration_014_idempotency_scope(conn):
+    """What each idempotency key was used for, so a key reused on another lesson is refused
+    instead of replaying that lesson's result. Keys stored before this have scope ''."""
+    conn.execute("ALTER TABLE idempotency_keys ADD COLUMN scope TEXT NOT NULL DEFAULT ''")
+
+def migration_015_notification_actors(conn):
+    """Who each like/comment/repost notification is from, so its count is distinct people
+    across flushes and compaction (see notifications.py). Rows from before this only
+    know their latest actor."""
+    c = conn.cursor()
+    c.execute("""CREATE TABLE IF NOT EXISTS notification_actors (
+        notification_id INTEGER NOT NULL,
+        actor_id INTEGER NOT NULL,
+        PRIMARY KEY (notification_id, actor_id)
+    ) WITHOUT ROWID""")
+    c.execute("""INSERT OR IGNORE INTO notification_actors (notification_id, actor_id)
+                 SELECT id, actor_id FROM notifications
+                 WHERE kind IN ('like', 'comment', 'repost') AND actor_id IS NOT NULL""")
+
+MIGRATIONS = [
+    migration_001_baseline,
+    migration_002_route_indexes,
+    migration_003_feed_versions,
+    migration_004_home_timeline,
+    migration_005_hot_score,
+    migration_006_unread_counts,
+    migration_007_notifications,
+    migration_008_idempotency_keys,
+    migration_009_drawing_refs,
+    migration_010_lesson_progress,
+    migration_011_lesson_titles,
+    migration_012_lesson_search,
+    migration_013_lessons_page,
+    migration_014_idempotency_scope,
+    migration_015_notification_actors,
+]
+
+LATEST_VERSION = len(MIGRATIONS)
+
+def get_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def run_migrations(conn):
+    """Apply pending migrations in one write transaction. BEGIN IMMEDIATE serialises
+    workers that boot at the same time: the losers wait, re-read the version and find
+    nothing left to do."""
+    if get_version(conn) >= LATEST_VERSION:
+        return 0
+    applied = 0
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        version = get_version(conn)
+        for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            logger.info(f"Applying migration {number}: {migration.__name__}")
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+            applied += 1
+        conn.commit()
+        if applied:
+            logger.info(f"Database schema now at version {LATEST_VERSION} ({applied} migrations applied)")
+        return applied
+    except sqlite3.Error as e:
+        logger.error(f"Migration failed: {str(e)}")
+        conn.rollback()
+        raise
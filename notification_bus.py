@@ -0,0 +1,112 @@
+# notification_bus.py
+# In-process pub/sub behind /api/notifications/stream (Server-Sent Events). Each open
+# stream subscribes a queue here; a watcher thread per worker reads posts committed since
+# the last id it saw and pushes them to every subscriber. Posts written by other
+# gunicorn workers are picked up the same way, so all streams see every post within
+# NOTIFY_POLL_SECONDS. create_post calls wake() so local posts go out immediately.
+#
+# The watcher only runs while this worker has subscribers, and SSE_MAX_CONNECTIONS caps
+# how many streams one worker will hold open (each one occupies a thread). gunicorn.conf.py
+# sets it per worker from the worker's thread count (0 under sync workers); it is read
+# again after a fork, so the cap also applies with preload_app.
+import logging
+import os
+import queue
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+class NotificationBus:
+    def __init__(self, max_connections=None, poll_seconds=None):
+        self.max_connections_setting = max_connections
+        self.max_connections = self._max_connections()
+        self.poll_seconds = float(poll_seconds or os.environ.get('NOTIFY_POLL_SECONDS', 2))
+        self.lock = threading.Lock()
+        self.subscribers = {}  # queue -> user_id
+        self.pid = None
+        self.thread = None
+        self.wakeup = threading.Event()
+        self.last_post_id = None
+
+    def subscribe(self, user_id, conn):
+        """Register a stream. Returns its queue, or None if this worker is at its cap.
+        Subscribe before reading the stream's starting state: every post committed after this
+        call is delivered, so the stream only has to skip ids it already counted."""
+        with self.lock:
+            if self.pid != os.getpid():
+                # Forked worker: nothing inherited from the parent is valid here
+                self.pid = os.getpid()
+                self.max_connections = self._max_connections()
+                self.subscribers = {}
+                self.thread = None
+                self.last_post_id = None
+            if len(self.subscribers) >= self.max_connections:
+                return None
+            if self.last_post_id is None:
+                self.last_post_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM posts").fetchone()[0]
+            q = queue.Queue()
+            self.subscribers[q] = user_id
+            self._ensure_watcher()
+            return q
+
+    def _max_connections(self):
+        if self.max_connections_setting is not None:
+            return int(self.max_connections_setting)
+        return int(os.environ.get('SSE_MAX_CONNECTIONS', 50))
+
+    def unsubscribe(self, q):
+        with self.lock:
+            self.subscribers.pop(q, None)
+
+    def connection_count(self):
+        with self.lock:
+            return len(self.subscribers)
+
+    def wake(self):
+        self.wakeup.set()
+
+    def publish(self, posts, user_ids=None):
+        """Deliver (id, user_id, type) of new posts to every subscriber, or only to streams
+        of user_ids. Each stream decides which of them count for its user."""
+        with self.lock:
+            targets = [q for q, uid in self.subscribers.items() if user_ids is None or uid in user_ids]
+        for q in targets:
+            q.put(posts)
+        return len(targets)
+
+    def _ensure_watcher(self):
+        # Called with self.lock held
+        if self.thread and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self._run, name='notification-watcher', daemon=True)
+        self.thread.start()
+
+    def _poll(self, conn):
+        while True:
+            rows = conn.execute("SELECT id, user_id, type FROM posts WHERE id > ? ORDER BY id LIMIT 500", (self.last_post_id,)).fetchall()
+            if not rows:
+                return
+            posts = [tuple(row) for row in rows]
+            self.last_post_id = posts[-1][0]
+            self.publish(posts)
+
+    def _run(self):
+        from db import connect
+        conn = connect()
+        try:
+            while True:
+                with self.lock:
+                    if not self.subscribers:
+                        self.thread = None
+                        return
+                try:
+                    self._poll(conn)
+                except sqlite3.Error as e:
+                    logger.error(f"Notification watcher poll failed: {str(e)}")
+                self.wakeup.wait(self.poll_seconds)
+                self.wakeup.clear()
+        finally:
+            conn.close()
+
+notification_bus = NotificationBus()
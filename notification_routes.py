@@ -0,0 +1,135 @@
+# [notification_routes.py]
+import json
+import os
+import queue
+import time
+from flask import Response, jsonify, request, session, stream_with_context
+from datetime import datetime
+from db import get_db, connect
+from notification_bus import notification_bus
+import notifications
+import unread_counts
+import logging
+
+logger = logging.getLogger(__name__)
+
+def notifications_count():
+    if 'user_id' not in session:
+        return jsonify({'count': 0})
+    conn = get_db()
+    c = conn.cursor()
+    return jsonify({'count': unread_counts.get_count(c, session['user_id'])})
+
+def mark_notifications_read():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    conn = get_db()
+    c = conn.cursor()
+    now = datetime.now().isoformat()
+    c.execute("UPDATE users SET last_feed_view = ? WHERE id=?", (now, session['user_id']))
+    unread_counts.reset(c, session['user_id'])
+    conn.commit()
+    return jsonify({'success': True})
+
+def notifications_list():
+    """GET /api/notifications?cursor=<id>: one page of activity notifications, newest first."""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    cursor = request.args.get('cursor')
+    try:
+        before_id = int(cursor) if cursor else None
+        limit = min(max(int(request.args.get('limit', 20)), 1), 50)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
+    conn = get_db()
+    c = conn.cursor()
+    try:
+        rows = notifications.fetch_page(c, session['user_id'], before_id, limit + 1)
+        c.execute("SELECT last_feed_view FROM users WHERE id = ?", (session['user_id'],))
+        row = c.fetchone()
+        last_read = (row[0] if row else None) or ''
+        page = rows[:limit]
+        for item in page:
+            item['text'] = notifications.describe(item)
+            item['unread'] = item['updated_at'] > last_read
+        next_cursor = str(page[-1]['id']) if len(rows) > limit else None
+        return jsonify({'success': True, 'notifications': page, 'next_cursor': next_cursor})
+    except Exception as e:
+        logger.error(f"Notifications list failed for user {session['user_id']}: {str(e)}")
+        return jsonify({'success': False, 'error': 'Server error'}), 500
+    finally:
+        conn.close()
+
+def sse_event(event, data, event_id=None):
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines += [f"event: {event}", f"data: {json.dumps(data)}"]
+    return '\n'.join(lines) + '\n\n'
+
+def notifications_stream():
+    """Server-Sent Events stream of the unread count. Sends the full count (or, on reconnect
+    with Last-Event-ID, the posts missed since that id), then a delta per batch of new posts.
+    Event ids are post ids."""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    user_id = session['user_id']
+    heartbeat = float(os.environ.get('SSE_HEARTBEAT_SECONDS', 15))
+    # Streams end after a while and the browser reconnects with Last-Event-ID, so a slot is never held forever
+    max_age = float(os.environ.get('SSE_MAX_STREAM_SECONDS', 300))
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or 0) or None
+    except ValueError:
+        last_event_id = None
+    # A standalone connection: a pooled one would stay checked out for the life of the stream
+    conn = connect()
+    q = None
+    try:
+        q = notification_bus.subscribe(user_id, conn)
+        if q is None:
+            if notification_bus.max_connections:
+                logger.warning(f"Notification stream refused for user {user_id}: worker at {notification_bus.max_connections} connections")
+            response = jsonify({'success': False, 'error': 'Too many open streams'})
+            response.headers['Retry-After'] = '30'
+            return response, 503
+        c = conn.cursor()
+        c.execute("SELECT COALESCE(MAX(id), 0) FROM posts")
+        newest_id = c.fetchone()[0]
+        if last_event_id is not None:
+            c.execute(f"SELECT COUNT(*) FROM posts p JOIN users u ON u.id = ? WHERE p.id > ? AND {unread_counts.UNREAD_FOR_USER_SQL}",
+                      (user_id, last_event_id))
+            first = sse_event('delta', {'delta': c.fetchone()[0]}, newest_id)
+        else:
+            first = sse_event('count', {'count': unread_counts.get_count(c, user_id)}, newest_id)
+    except Exception:
+        # The stream never starts, so nothing else would release the subscription
+        if q is not None:
+            notification_bus.unsubscribe(q)
+        raise
+    finally:
+        conn.close()
+
+    def stream(q, sent_id):
+        started = time.monotonic()
+        try:
+            yield f"retry: 5000\n{first}"
+            while time.monotonic() - started < max_age:
+                try:
+                    posts = q.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ": heartbeat\n\n"
+                    continue
+                new_posts = [post for post in posts if post[0] > sent_id]
+                if not new_posts:
+                    continue
+                # The id still advances past posts that don't count for this user
+                sent_id = new_posts[-1][0]
+                delta = sum(1 for post_id, post_user_id, post_type in new_posts if unread_counts.is_unread_for(user_id, post_user_id, post_type))
+                if delta:
+                    yield sse_event('delta', {'delta': delta}, sent_id)
+        finally:
+            notification_bus.unsubscribe(q)
+
+    response = Response(stream_with_context(stream(q, newest_id)), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Also covers clients that disconnect before the generator starts
+    response.call_on_close(lambda: notification_bus.unsubscribe(q))
+    return response
@@ -0,0 +1,214 @@
+# notifications.py
+# Activity notifications: likes, comments and reposts on your posts, lessons a parent
+# assigns you and lessons they confirm. Routes call notify() after their commit; it only
+# touches memory. A background thread per worker flushes the buffer every
+# NOTIFY_FLUSH_SECONDS as one upsert per (user, kind, target, window), so a burst such as
+# five likes on one post becomes a single "x and 4 others liked your post" row. Rows are
+# keyed by NOTIFY_WINDOW_SECONDS buckets: activity in a later window starts a new row.
+# For likes, comments and reposts the row's actors are kept in notification_actors and its
+# count is the number of them, so someone who comments three times is counted once.
+#
+# Like view_counter, a worker that dies without a clean exit loses at most one flush
+# interval of notifications. compact() runs as a maintenance task and keeps the table
+# bounded: old windows of the same target are merged into one row, rows older than
+# NOTIFY_RETENTION_DAYS are dropped and each user keeps at most NOTIFY_MAX_PER_USER.
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+# Kinds where count means "distinct people"; for the others it is the number of lessons
+ACTOR_KINDS = {'like', 'comment', 'repost'}
+ACTOR_KINDS_SQL = ', '.join(f"'{kind}'" for kind in sorted(ACTOR_KINDS))
+
+def window_seconds():
+    return int(os.environ.get('NOTIFY_WINDOW_SECONDS', 3600))
+
+class NotificationWriter:
+    def __init__(self, flush_seconds=None):
+        self.flush_seconds = float(flush_seconds or os.environ.get('NOTIFY_FLUSH_SECONDS', 5))
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.pid = None
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def _ensure_worker(self):
+        # Called with self.lock held; same fork handling as view_counter
+        if self.pid == os.getpid() and self.thread and self.thread.is_alive():
+            return
+        if self.pid != os.getpid():
+            self.pending = {}
+            self.pid = os.getpid()
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._run, name='notification-flush', daemon=True)
+        self.thread.start()
+
+    def notify(self, user_id, kind, target_id, actor_id, actor_handle, count=1):
+        """Queue a notification for user_id. Nobody is notified about their own actions."""
+        if not user_id or user_id == actor_id:
+            return
+        now = datetime.now()
+        window_start = int(time.time()) // window_seconds() * window_seconds()
+        with self.lock:
+            self._ensure_worker()
+            key = (user_id, kind, target_id or 0, window_start)
+            entry = self.pending.get(key)
+            if entry is None:
+                entry = self.pending[key] = {'count': 0, 'actors': set(), 'created_at': now.isoformat()}
+            if kind not in ACTOR_KINDS or actor_id not in entry['actors']:
+                entry['count'] += count
+            entry['actors'].add(actor_id)
+            entry['actor_id'] = actor_id
+            entry['actor_handle'] = actor_handle
+            entry['updated_at'] = now.isoformat()
+
+    def flush(self):
+        with self.lock:
+            if not self.pending:
+                return 0
+            batch, self.pending = self.pending, {}
+        conn = None
+        try:
+            from db import connect
+            conn = connect()
+            conn.executemany("""
+                INSERT INTO notifications (user_id, kind, target_id, window_start, count, actor_id, actor_handle, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(user_id, kind, target_id, window_start) DO UPDATE SET
+                    count = count + excluded.count, actor_id = excluded.actor_id,
+                    actor_handle = excluded.actor_handle, updated_at = excluded.updated_at
+            """, [key + (e['count'], e['actor_id'], e['actor_handle'], e['created_at'], e['updated_at'])
+                  for key, e in batch.items()])
+            # Actor kinds: add this batch's people to the row, then count them
+            actor_keys = [key for key in batch if key[1] in ACTOR_KINDS]
+            conn.executemany("""
+                INSERT OR IGNORE INTO notification_actors (notification_id, actor_id)
+                SELECT id, ? FROM notifications WHERE user_id = ? AND kind = ? AND target_id = ? AND window_start = ?
+            """, [(actor_id,) + key for key in actor_keys for actor_id in batch[key]['actors']])
+            conn.executemany("""
+                UPDATE notifications SET count = (
+                    SELECT COUNT(*) FROM notification_actors a WHERE a.notification_id = notifications.id)
+                WHERE user_id = ? AND kind = ? AND target_id = ? AND window_start = ?
+            """, actor_keys)
+            conn.commit()
+            logger.debug(f"Flushed {len(batch)} notifications")
+            return len(batch)
+        except sqlite3.Error as e:
+            logger.error(f"Notification flush failed, keeping {len(batch)} for retry: {str(e)}")
+            with self.lock:
+                for key, entry in batch.items():
+                    if key in self.pending:
+                        self.pending[key]['count'] += entry['count']
+                        self.pending[key]['actors'] |= entry['actors']
+                    else:
+                        self.pending[key] = entry
+            return 0
+        finally:
+            if conn:
+                conn.close()
+
+    def _run(self):
+        while not self.stopped.is_set():
+            self.wakeup.wait(self.flush_seconds)
+            self.wakeup.clear()
+            self.flush()
+
+    def shutdown(self):
+        self.stopped.set()
+        self.wakeup.set()
+        if self.pid == os.getpid():
+            self.flush()
+
+notification_writer = NotificationWriter()
+atexit.register(notification_writer.shutdown)
+
+def fetch_page(c, user_id, before_id=None, limit=20):
+    """Newest notifications first, keyset-paginated on id (which is stable, unlike
+    updated_at, while a window row is still collecting)."""
+    after = "AND id < ?" if before_id else ""
+    c.execute(f"""SELECT id, kind, target_id, count, actor_id, actor_handle, created_at, updated_at
+                  FROM notifications WHERE user_id = ? {after}
+                  ORDER BY id DESC LIMIT ?""",
+              [user_id] + ([before_id] if before_id else []) + [limit])
+    return [dict(row) for row in c.fetchall()]
+
+def describe(row):
+    handle = row['actor_handle'] or 'Someone'
+    count = row['count']
+    if row['kind'] in ACTOR_KINDS:
+        who = handle if count <= 1 else f"{handle} and {count - 1} other{'s' if count > 2 else ''}"
+        verb = {'like': 'liked', 'comment': 'commented on', 'repost': 'reposted'}[row['kind']]
+        return f"{who} {verb} your post"
+    lessons = f"{count} lesson{'s' if count != 1 else ''}"
+    if row['kind'] == 'lesson_assigned':
+        return f"{handle} assigned you {lessons}"
+    if row['kind'] == 'lesson_confirmed':
+        return f"{handle} confirmed {lessons} you completed"
+    return handle
+
+def compact(conn):
+    """Merge each target's windows older than NOTIFY_COMPACT_DAYS into its newest row (for
+    actor kinds, the union of their actors), then apply retention. Returns counts of merged,
+    expired and trimmed rows."""
+    compact_before = (datetime.now() - timedelta(days=int(os.environ.get('NOTIFY_COMPACT_DAYS', 1)))).isoformat()
+    expire_before = (datetime.now() - timedelta(days=int(os.environ.get('NOTIFY_RETENTION_DAYS', 30)))).isoformat()
+    keep = int(os.environ.get('NOTIFY_MAX_PER_USER', 200))
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        c.execute(f"""
+            WITH merge AS (
+                SELECT user_id, kind, target_id, MAX(id) as keep_id
+                FROM notifications WHERE updated_at < ? AND kind IN ({ACTOR_KINDS_SQL})
+                GROUP BY user_id, kind, target_id HAVING COUNT(*) > 1
+            )
+            INSERT OR IGNORE INTO notification_actors (notification_id, actor_id)
+            SELECT merge.keep_id, a.actor_id FROM merge
+            JOIN notifications n ON n.user_id = merge.user_id AND n.kind = merge.kind
+                AND n.target_id = merge.target_id AND n.updated_at < ?
+            JOIN notification_actors a ON a.notification_id = n.id
+        """, (compact_before, compact_before))
+        c.execute(f"""
+            WITH merge AS (
+                SELECT MAX(id) as keep_id, SUM(count) as total, MIN(created_at) as first_at
+                FROM notifications WHERE updated_at < ?
+                GROUP BY user_id, kind, target_id HAVING COUNT(*) > 1
+            )
+            UPDATE notifications SET created_at = merge.first_at,
+                count = CASE WHEN kind IN ({ACTOR_KINDS_SQL})
+                    THEN (SELECT COUNT(*) FROM notification_actors a WHERE a.notification_id = merge.keep_id)
+                    ELSE merge.total END
+            FROM merge WHERE notifications.id = merge.keep_id
+        """, (compact_before,))
+        c.execute("""
+            DELETE FROM notifications
+            WHERE updated_at < ? AND id < (
+                SELECT MAX(n.id) FROM notifications n
+                WHERE n.user_id = notifications.user_id AND n.kind = notifications.kind
+                AND n.target_id = notifications.target_id AND n.updated_at < ?)
+        """, (compact_before, compact_before))
+        merged = c.rowcount
+        c.execute("DELETE FROM notifications WHERE updated_at < ?", (expire_before,))
+        expired = c.rowcount
+        c.execute("""
+            DELETE FROM notifications WHERE id IN (
+                SELECT id FROM (
+                    SELECT id, ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY id DESC) as rn
+                    FROM notifications
+                ) WHERE rn > ?
+            )
+        """, (keep,))
+        trimmed = c.rowcount
+        c.execute("DELETE FROM notification_actors WHERE notification_id NOT IN (SELECT id FROM notifications)")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return {'merged': merged, 'expired': expired, 'trimmed': trimmed}
@@ -1,6 +1,12 @@
 import os
 from flask import session, request, jsonify, redirect, url_for, flash, current_app
 from db import get_db
+from feed_cache import feed_cache
+import timeline
+from notification_bus import notification_bus
+from notifications import notification_writer
+from interactions import interaction_cache
+from ranking import refresh_hot_score
 from werkzeug.utils import secure_filename
 from utils import allowed_file
 import logging
@@ -35,7 +41,12 @@ def create_post():
                          (user_id, content, media_url, created_at, subject, grade, handle) 
                          VALUES (?, ?, ?, datetime('now'), ?, ?, ?)""", 
                       (session['user_id'], content, media_url, subject, session['grade'], session['handle']))
+            post_id = c.lastrowid
+            refresh_hot_score(c, post_id)
+            timeline.fan_out_post(c, post_id)
+            feed_cache.publish_all(c)
             conn.commit()
+            notification_bus.wake()
             flash('Post created successfully!', 'success')
             logger.info(f"Post created by user {session['user_id']}: {content[:50]}...")
         except Exception as e:
@@ -56,8 +67,9 @@ def like_post(post_id):
         conn = get_db()
         c = conn.cursor()
         # Check if post exists
-        c.execute("SELECT id FROM posts WHERE id = ?", (post_id,))
-        if not c.fetchone():
+        c.execute("SELECT id, user_id FROM posts WHERE id = ?", (post_id,))
+        post = c.fetchone()
+        if not post:
             return jsonify({'success': False, 'error': 'Post not found'}), 404
         # Check if already liked
         c.execute("SELECT id FROM likes WHERE post_id = ? AND user_id = ?", (post_id, session['user_id']))
@@ -72,7 +84,12 @@ def like_post(post_id):
             c.execute("INSERT INTO likes (post_id, user_id) VALUES (?, ?)", (post_id, session['user_id']))
             c.execute("UPDATE posts SET likes = likes + 1 WHERE id = ?", (post_id,))
             action = 'liked'
+        refresh_hot_score(c, post_id)
+        version = feed_cache.publish_user(c, session['user_id'])
         conn.commit()
+        interaction_cache.record(session['user_id'], version, 'liked', post_id, action == 'liked')
+        if action == 'liked':
+            notification_writer.notify(post['user_id'], 'like', post_id, session['user_id'], session.get('handle'))
         logger.info(f"User {session['user_id']} {action} post {post_id}")
         return jsonify({'success': True})
     except Exception as e:
@@ -92,7 +109,7 @@ def repost_post(post_id):
         conn = get_db()
         c = conn.cursor()
         # Check if post exists and is not a lesson
-        c.execute("SELECT id, type FROM posts WHERE id = ?", (post_id,))
+        c.execute("SELECT id, type, user_id FROM posts WHERE id = ?", (post_id,))
         post = c.fetchone()
         if not post:
             return jsonify({'success': False, 'error': 'Post not found'}), 404
@@ -118,13 +135,23 @@ def repost_post(post_id):
                          VALUES (?, ?, ?, datetime('now'), ?, ?, ?, ?, ?)""", 
                       (session['user_id'], orig['content'], orig['media_url'], orig['subject'], orig['grade'], 
                        post_id, session['handle'], orig['original_handle']))
+            repost_id = c.lastrowid
+            refresh_hot_score(c, repost_id)
+            timeline.fan_out_post(c, repost_id)
             # Add to reposts table
             c.execute("INSERT INTO reposts (post_id, user_id) VALUES (?, ?)", (post_id, session['user_id']))
             c.execute("UPDATE posts SET reposts = reposts + 1 WHERE id = ?", (post_id,))
             # Increment views on original
             c.execute("UPDATE posts SET views = views + 1 WHERE id = ?", (post_id,))
             action = 'reposted'
+        refresh_hot_score(c, post_id)
+        feed_cache.publish_all(c)
+        version = feed_cache.publish_user(c, session['user_id'])
         conn.commit()
+        interaction_cache.record(session['user_id'], version, 'reposted', post_id, action == 'reposted')
+        if action == 'reposted':
+            notification_bus.wake()
+            notification_writer.notify(post['user_id'], 'repost', post_id, session['user_id'], session.get('handle'))
         logger.info(f"User {session['user_id']} {action} post {post_id}")
         return jsonify({'success': True})
     except Exception as e:
@@ -150,13 +177,18 @@ def add_comment(post_id):
             conn = get_db()
             c = conn.cursor()
             # Check if post exists
-            c.execute("SELECT id FROM posts WHERE id = ?", (post_id,))
-            if not c.fetchone():
+            c.execute("SELECT id, user_id FROM posts WHERE id = ?", (post_id,))
+            post = c.fetchone()
+            if not post:
                 flash('Post not found', 'error')
                 return redirect(url_for('home'))
             c.execute("INSERT INTO comments (post_id, user_id, content, created_at, handle) VALUES (?, ?, ?, datetime('now'), ?)", 
                       (post_id, session['user_id'], content, session['handle']))
+            c.execute("UPDATE posts SET comment_count = comment_count + 1 WHERE id = ?", (post_id,))
+            refresh_hot_score(c, post_id)
+            feed_cache.publish_all(c)
             conn.commit()
+            notification_writer.notify(post['user_id'], 'comment', post_id, session['user_id'], session.get('handle'))
             flash('Note added successfully!', 'success')
             logger.info(f"Note added by user {session['user_id']} to post {post_id}: {content[:50]}...")
         except Exception as e:
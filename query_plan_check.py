@@ -0,0 +1,151 @@
+# query_plan_check.py
+# Run this with: python query_plan_check.py [-v]
+# Pulls every SQL string the route modules pass to execute()/executemany(), runs
+# EXPLAIN QUERY PLAN for each against a freshly migrated scratch database, and exits
+# non-zero if any of them does a full SCAN of a table that grows with usage.
+# Run it after adding a query or a migration; it never touches database.db.
+
+import ast
+import os
+import re
+import sys
+import tempfile
+
+ROUTE_MODULES = ['app.py', 'auth.py', 'home_routes.py', 'post_routes.py', 'lesson_routes.py',
+                 'user_routes.py', 'assess_routes.py', 'game_routes.py', 'feed_cache.py', 'timeline.py',
+                 'notification_routes.py', 'notification_bus.py', 'unread_counts.py',
+                 'notifications.py', 'idempotency.py', 'drawings.py',
+                 'lesson_progress.py', 'lesson_assignment.py', 'lesson_search.py']
+
+# Tables that grow with users/activity. Scanning lessons (the catalog) or a
+# per-request temp b-tree is fine; scanning any of these is not.
+LARGE_TABLES = {'users', 'posts', 'likes', 'reposts', 'comments', 'completed_lessons', 'lessons_users',
+                'activity_responses', 'friendships', 'tests', 'games', 'badges', 'feedback', 'user_points',
+                'notifications', 'notification_actors'}
+
+# Values substituted for {name} fields inside f-string queries
+FSTRING_VALUES = {
+    'placeholders': '?, ?, ?',
+    'user_placeholders': '?, ?, ?',
+    'lesson_placeholders': '?, ?, ?',
+    'filters': 'AND l.subject = ?',
+    'order_by': 'l.title COLLATE NOCASE, l.id',
+    'key': 'created_at',
+    'after': 'AND (created_at, id) < (?, ?)',
+    'after_entry': 'AND (t.created_at, t.post_id) < (?, ?)',
+    'after_comment': 'AND (c.created_at, c.id) < (?, ?)',
+    'COMMENT_COLUMNS': 'c.id, c.post_id, c.user_id, c.content, c.created_at, COALESCE(u.handle, c.handle) as handle',
+    'ACTOR_KINDS_SQL': "'comment', 'like', 'repost'",
+    'UNREAD_FOR_USER_SQL': "((p.type = 'post' AND p.user_id != u.id) OR (p.type = 'lesson' AND p.user_id = u.id))",
+}
+
+# Known full scans, matched by a fragment of the SQL, with the reason they are allowed
+ALLOWED_SCANS = {
+    'INTO home_timeline': 'fan-out writes one timeline row per user by design',
+    'INTO unread_counts': 'fan-out bumps one counter per user by design',
+    'GROUP BY user_id, kind, target_id': 'daily notification compaction walks the whole table',
+    'PARTITION BY user_id ORDER BY id DESC': 'daily per-user notification cap walks the whole table',
+    'FROM notification_actors WHERE notification_id NOT IN': 'daily compaction drops actors of deleted rows',
+}
+
+SQL_START = re.compile(r'^\s*(SELECT|INSERT|UPDATE|DELETE|REPLACE|WITH)\b', re.IGNORECASE)
+TABLE_ALIAS = re.compile(r'\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+SQL_KEYWORDS = {'where', 'on', 'left', 'join', 'inner', 'order', 'group', 'limit', 'set', 'values', 'select', 'union', 'and', 'as'}
+
+def sql_text(node):
+    """Return the SQL of a str/f-string AST node, or None if it can't be rendered."""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if isinstance(node, ast.JoinedStr):
+        parts = []
+        for value in node.values:
+            if isinstance(value, ast.Constant):
+                parts.append(value.value)
+            elif isinstance(value, ast.FormattedValue) and isinstance(value.value, ast.Name) and value.value.id in FSTRING_VALUES:
+                parts.append(FSTRING_VALUES[value.value.id])
+            else:
+                return None
+        return ''.join(parts)
+    return None
+
+def collect_statements(root):
+    statements = []
+    for module in ROUTE_MODULES:
+        path = os.path.join(root, module)
+        if not os.path.exists(path):
+            continue
+        tree = ast.parse(open(path, encoding='utf-8').read(), filename=module)
+        # Resolve "query = '''...'''; c.execute(query, ...)" as well as inline strings
+        assigned = {}
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+                text = sql_text(node.value)
+                if text is not None:
+                    assigned[node.targets[0].id] = text
+        for node in ast.walk(tree):
+            if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                    and node.func.attr in ('execute', 'executemany') and node.args):
+                continue
+            arg = node.args[0]
+            text = assigned.get(arg.id) if isinstance(arg, ast.Name) else sql_text(arg)
+            if text and SQL_START.match(text):
+                statements.append((module, node.lineno, ' '.join(text.split())))
+    return statements
+
+def table_aliases(sql):
+    aliases = {}
+    for table, alias in TABLE_ALIAS.findall(sql):
+        aliases[table.lower()] = table.lower()
+        if alias and alias.lower() not in SQL_KEYWORDS:
+            aliases[alias.lower()] = table.lower()
+    return aliases
+
+def full_scans(conn, sql):
+    """Return the large tables the plan for sql scans without an index search."""
+    params = [None] * sql.count('?')
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    aliases = table_aliases(sql)
+    scanned = []
+    for row in plan:
+        detail = row[3]
+        match = re.match(r'SCAN (?:TABLE )?(\w+)', detail)
+        if not match:
+            continue
+        table = aliases.get(match.group(1).lower(), match.group(1).lower())
+        if table in LARGE_TABLES:
+            scanned.append((table, detail))
+    return scanned, plan
+
+def main(verbose=False):
+    root = os.path.dirname(os.path.abspath(__file__))
+    scratch = tempfile.mkdtemp(prefix='edugrok-eqp-')
+    os.environ['DATABASE_PATH'] = os.path.join(scratch, 'plan_check.db')
+    sys.path.insert(0, root)
+    from db import connect
+    from migrations import run_migrations
+    conn = connect()
+    run_migrations(conn)
+    failures = 0
+    statements = collect_statements(root)
+    for module, line, sql in statements:
+        try:
+            scanned, plan = full_scans(conn, sql)
+        except Exception as e:
+            print(f"ERROR {module}:{line}: {e}\n    {sql[:160]}")
+            failures += 1
+            continue
+        allowed = next((reason for fragment, reason in ALLOWED_SCANS.items() if fragment in sql), None)
+        if scanned and not allowed:
+            failures += 1
+            print(f"FAIL  {module}:{line}: full scan of {', '.join(sorted({t for t, _ in scanned}))}\n    {sql[:160]}")
+            for row in plan:
+                print(f"      {row[3]}")
+        elif verbose:
+            status = f"ok (allowed: {allowed})" if scanned else "ok"
+            print(f"{status:5} {module}:{line}: {sql[:100]}")
+    conn.close()
+    print(f"Checked {len(statements)} statements: {failures} problem(s)")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main(verbose='-v' in sys.argv))
@@ -0,0 +1,36 @@
+# ranking.py
+# "hot" feed ranking. posts.hot_score is stored and indexed on (type, hot_score), so the
+# hot feed is the same keyset range scan as the other sorts instead of a full sort.
+#
+# The score never has to be recomputed as time passes:
+#     hot_score = log10(max(engagement, 1)) + created_at_epoch / HOT_DECAY_SECONDS
+# A post needs 10x the engagement of one posted HOT_DECAY_SECONDS later to rank level with
+# it, which is the same as decaying every score over time, without the periodic rewrite.
+# Routes call refresh_hot_score() after changing a post's likes, reposts, views or
+# comment_count, and after inserting a post.
+import math
+import os
+from datetime import datetime
+
+# Relative value of each counter; views are cheap, reposts are the strongest signal
+HOT_WEIGHTS = {'likes': 2.0, 'reposts': 3.0, 'comments': 2.0, 'views': 0.1}
+
+def decay_seconds():
+    return float(os.environ.get('HOT_DECAY_SECONDS', 45000))
+
+def hot_score(likes, reposts, views, comment_count, created_at):
+    """SQL function hot_score(likes, reposts, views, comment_count, created_at)."""
+    engagement = (HOT_WEIGHTS['likes'] * (likes or 0) + HOT_WEIGHTS['reposts'] * (reposts or 0)
+                  + HOT_WEIGHTS['views'] * (views or 0) + HOT_WEIGHTS['comments'] * (comment_count or 0))
+    try:
+        # posts.created_at holds both datetime('now') and isoformat() values
+        epoch = datetime.fromisoformat(created_at).timestamp() if created_at else 0
+    except (TypeError, ValueError):
+        epoch = 0
+    return round(math.log10(max(engagement, 1)) + epoch / decay_seconds(), 6)
+
+def register(conn):
+    conn.create_function('hot_score', 5, hot_score, deterministic=True)
+
+def refresh_hot_score(c, post_id):
+    c.execute("UPDATE posts SET hot_score = hot_score(likes, reposts, views, comment_count, created_at) WHERE id = ?", (post_id,))
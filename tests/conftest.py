@@ -0,0 +1,24 @@
+# tests/conftest.py
+# One app for the whole test session, on a scratch database: app.py runs the migrations when
+# it is imported, so every test module has to share that import.
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    # Set before app is imported: the pool, migrations and feed cache read these on import
+    os.environ['DATABASE_PATH'] = str(tmp_path_factory.mktemp('db') / 'test.db')
+    os.environ['DRAWINGS_DIR'] = str(tmp_path_factory.mktemp('drawings'))
+    # Build the feed on every request instead of serving it from the feed cache
+    os.environ['FEED_CACHE_TTL_SECONDS'] = '0'
+    os.environ['MAINTENANCE_DISABLED'] = '1'
+    import db
+    db.reset_pool()
+    from app import app
+    app.config['TESTING'] = True
+    return app
@@ -0,0 +1,33 @@
+# tests/test_feed_cursor.py
+# Feed and comment cursors come from the client; anything that isn't (sort key, post id)
+# of types sqlite can bind is a 400, not a 500 from the query.
+import base64
+import json
+
+import pytest
+
+from test_trace_submission import ok
+
+def cursor(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+BAD_CURSORS = ['not base64!', cursor('x'), cursor([1]), cursor([{'a': 1}, 3]), cursor([[1], 3]),
+               cursor(['2024-01-01', '3']), cursor(['2024-01-01', True]), cursor([None, 3]), cursor([1, 2**70])]
+
+@pytest.mark.parametrize('bad', BAD_CURSORS)
+def test_malformed_cursor_is_rejected(app, bad):
+    client = app.test_client()
+    ok(client.post('/register', data={'email': 'cursor@example.com', 'password': 'secret1', 'grade': '1', 'handle': 'Cursor'}))
+    ok(client.post('/login', data={'email': 'cursor@example.com', 'password': 'secret1'}))
+    for url in ('/api/feed', '/api/posts/1/comments'):
+        response = client.get(url, query_string={'cursor': bad})
+        assert response.status_code == 400, (url, bad, response.data[:200])
+        assert response.get_json()['success'] is False
+
+def test_well_formed_cursor_is_accepted(app):
+    client = app.test_client()
+    ok(client.post('/register', data={'email': 'cursor@example.com', 'password': 'secret1', 'grade': '1', 'handle': 'Cursor'}))
+    ok(client.post('/login', data={'email': 'cursor@example.com', 'password': 'secret1'}))
+    for value in (['2024-01-01T00:00:00', 3], [12.5, 3], [7, 3]):
+        response = client.get('/api/feed', query_string={'cursor': cursor(value)})
+        assert response.status_code == 200, (value, response.data[:200])
@@ -0,0 +1,97 @@
+# tests/test_home_statement_count.py
+# /home builds the feed from a fixed set of batched queries (lessons, completion flags and
+# comments for the visible posts), so the number of SQL statements one render issues must
+# not depend on how many posts and comments there are.
+#
+#     python -m pytest -q tests
+from collections import Counter
+
+def ok(response):
+    assert response.status_code in (200, 302), (response.status_code, response.data[:300])
+    return response
+
+def query(sql, params=()):
+    from db import connect
+    conn = connect()
+    try:
+        return [row[0] for row in conn.execute(sql, params).fetchall()]
+    finally:
+        conn.close()
+
+def add_content(parent, kid, kid_id, posts, comments_per_post, lessons):
+    """posts new posts (split between parent and kid), comments on each, then lessons new
+    lesson posts in the kid's feed, so the newest page has every kind of item."""
+    for i in range(posts):
+        client = parent if i % 2 else kid
+        ok(client.post('/create_post', data={'content': f'post {i} of {posts}'}))
+    for post_id in query("SELECT id FROM posts WHERE type = 'post' ORDER BY id DESC LIMIT ?", (posts,)):
+        for i in range(comments_per_post):
+            ok(parent.post(f'/comment/{post_id}', data={'content': f'comment {i}'}))
+    lesson_ids = query("""SELECT id FROM lessons WHERE grade = 1 AND id NOT IN
+                          (SELECT lesson_id FROM posts WHERE type = 'lesson' AND user_id = ?) ORDER BY id LIMIT ?""",
+                       (kid_id, lessons))
+    for lesson_id in lesson_ids:
+        ok(parent.post('/add_to_feed', json={'lesson_id': lesson_id, 'target_user_id': kid_id}))
+
+def home_statements(client):
+    """Statements one /home request runs on its pooled connection, after a warm-up request."""
+    import db
+    ok(client.get('/home'))
+    # The test client runs requests one at a time, so the request gets an idle connection
+    connections = list(db.get_pool().idle.queue)
+    assert connections, "expected a warm connection pool"
+    statements = []
+    for conn in connections:
+        conn.set_trace_callback(statements.append)
+    try:
+        response = ok(client.get('/home'))
+    finally:
+        for conn in connections:
+            conn.set_trace_callback(None)
+    assert response.status_code == 200
+    return response, statements
+
+def assert_same_count(small, large):
+    extra = Counter(large) - Counter(small)
+    missing = Counter(small) - Counter(large)
+    assert len(large) == len(small), f"/home ran {len(small)} statements, then {len(large)} with more data: " \
+                                     f"extra {list(extra.elements())[:5]}, missing {list(missing.elements())[:5]}"
+
+def test_home_statement_count_is_constant(app):
+    import timeline
+    from db import connect
+    parent, kid = app.test_client(), app.test_client()
+    ok(parent.post('/register', data={'email': 'parent@example.com', 'password': 'secret1', 'grade': '1', 'handle': 'Parent'}))
+    ok(parent.post('/login', data={'email': 'parent@example.com', 'password': 'secret1'}))
+    ok(parent.post('/register_child', data={'email': 'kid@example.com', 'password': 'secret1', 'grade': '1', 'handle': 'Kid'}))
+    ok(kid.post('/login', data={'email': 'kid@example.com', 'password': 'secret1'}))
+    kid_id = query("SELECT id FROM users WHERE email = 'kid@example.com'")[0]
+
+    # A feed shorter than a page runs off the end of the timeline and continues from posts
+    # (one more query), so each count is compared with one served the same way.
+
+    # Short feed: 5 items, timeline then posts
+    add_content(parent, kid, kid_id, posts=3, comments_per_post=1, lessons=2)
+    page, short_feed = home_statements(kid)
+    assert b'post 2 of 3' in page.data
+
+    # Full page from the timeline, then the same with four times the posts and comments
+    add_content(parent, kid, kid_id, posts=20, comments_per_post=1, lessons=1)
+    page, full_page = home_statements(kid)
+    assert b'post 19 of 20' in page.data
+    add_content(parent, kid, kid_id, posts=100, comments_per_post=4, lessons=4)
+    page, full_page_more_data = home_statements(kid)
+    assert b'post 99 of 100' in page.data
+    assert query("SELECT COUNT(*) FROM comments")[0] >= 400
+    assert_same_count(full_page, full_page_more_data)
+
+    # A full page that again runs off the timeline (trimmed to 5 entries) after 5 items: it
+    # has four times as many items as the short feed, each with more comments
+    conn = connect()
+    try:
+        timeline.trim(conn, keep=5)
+    finally:
+        conn.close()
+    page, continued_page = home_statements(kid)
+    assert page.data.count(b'comment 3') >= 10
+    assert_same_count(short_feed, continued_page)
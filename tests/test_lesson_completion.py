@@ -0,0 +1,34 @@
+# tests/test_lesson_completion.py
+# A lesson is complete once every activity it can be graded on is right. An activity whose
+# checker can't be compiled from the lesson's data is left out of that, rather than
+# keeping the lesson from ever completing.
+from datetime import datetime
+
+from test_trace_submission import ok, query
+
+def test_lesson_with_broken_activity_can_complete(app):
+    import lesson_catalog
+    from db import connect
+    parent, kid = app.test_client(), app.test_client()
+    ok(parent.post('/register', data={'email': 'broken-parent@example.com', 'password': 'secret1', 'grade': '1', 'handle': 'BrokenParent'}))
+    ok(parent.post('/login', data={'email': 'broken-parent@example.com', 'password': 'secret1'}))
+    ok(parent.post('/register_child', data={'email': 'broken-kid@example.com', 'password': 'secret1', 'grade': '1', 'handle': 'BrokenKid'}))
+    ok(kid.post('/login', data={'email': 'broken-kid@example.com', 'password': 'secret1'}))
+    kid_id = query("SELECT id FROM users WHERE email = 'broken-kid@example.com'")[0]
+
+    # Trace plus a multiple choice whose options aren't strings
+    conn = connect()
+    try:
+        c = conn.cursor()
+        c.execute("""INSERT INTO lessons (title, grade, subject, content, created_at, trace_word, mc_question, mc_options, mc_answer)
+                     VALUES ('Broken', 1, 'reading', 'x', ?, 'cat', 'Pick one', '[1, 2]', '1')""", (datetime.now().isoformat(),))
+        lesson_id = c.lastrowid
+        lesson_catalog.bump_version(c)
+        conn.commit()
+    finally:
+        conn.close()
+
+    data = ok(kid.post(f'/api/lessons/{lesson_id}/submit',
+                       json={'activities': {'trace': 'strokes:v1:300x150:10,10,5,5'}})).get_json()
+    assert data['success'] and data['lesson_complete']
+    assert query("SELECT COUNT(*) FROM completed_lessons WHERE user_id = ? AND lesson_id = ?", (kid_id, lesson_id)) == [1]
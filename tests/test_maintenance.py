@@ -0,0 +1,33 @@
+# tests/test_maintenance.py
+# One failing maintenance task must not stop the others, and the /admin pages are only for
+# the users listed in ADMIN_EMAILS.
+import pytest
+
+from test_trace_submission import ok
+
+def test_failing_task_is_recorded_and_others_run(app, monkeypatch):
+    import maintenance
+
+    def broken(conn):
+        raise KeyError('boom')
+    tasks = {'broken': (broken, 3600), 'optimize': (maintenance.optimize, 3600)}
+    monkeypatch.setattr(maintenance, 'TASKS', tasks)
+
+    assert maintenance.run_due_tasks(force=True) == ['optimize']
+    report = maintenance.status()
+    assert report['broken']['error'] == "KeyError: 'boom'"
+    assert report['optimize']['error'] is None and report['optimize']['result'] == {'ok': True}
+
+@pytest.mark.parametrize('url', ['/admin/maintenance', '/admin/feed_cache'])
+def test_admin_pages_need_an_admin(app, monkeypatch, url):
+    client = app.test_client()
+    ok(client.post('/register', data={'email': 'admin-parent@example.com', 'password': 'secret1', 'grade': '1', 'handle': 'AdminParent'}))
+    ok(client.post('/login', data={'email': 'admin-parent@example.com', 'password': 'secret1'}))
+
+    monkeypatch.delenv('ADMIN_EMAILS', raising=False)
+    assert client.get(url).status_code == 403
+    monkeypatch.setenv('ADMIN_EMAILS', 'someone@example.com')
+    assert client.get(url).status_code == 403
+    monkeypatch.setenv('ADMIN_EMAILS', 'someone@example.com, Admin-Parent@example.com')
+    response = client.get(url)
+    assert response.status_code == 200 and response.get_json()['success']
@@ -0,0 +1,62 @@
+# tests/test_notifications.py
+# For likes, comments and reposts a notification's count is the number of different people,
+# however many flushes and windows their activity was spread over.
+import time
+
+import pytest
+
+def notification_rows(user_id):
+    from db import connect
+    conn = connect()
+    try:
+        return [tuple(row) for row in conn.execute(
+            "SELECT kind, target_id, count FROM notifications WHERE user_id = ? ORDER BY id", (user_id,))]
+    finally:
+        conn.close()
+
+@pytest.fixture
+def writer(app):
+    from notifications import NotificationWriter
+    writer = NotificationWriter(flush_seconds=3600)
+    yield writer
+    writer.shutdown()
+
+def test_same_actor_counted_once_across_flushes(writer):
+    user_id = 9001
+    writer.notify(user_id, 'comment', 7, 1, 'one')
+    writer.notify(user_id, 'comment', 7, 1, 'one')
+    writer.flush()
+    writer.notify(user_id, 'comment', 7, 1, 'one')
+    writer.notify(user_id, 'comment', 7, 2, 'two')
+    writer.flush()
+    writer.notify(user_id, 'comment', 7, 2, 'two')
+    writer.notify(user_id, 'lesson_assigned', 0, 1, 'one', 3)
+    writer.flush()
+    writer.notify(user_id, 'lesson_assigned', 0, 1, 'one', 2)
+    writer.flush()
+    # Lesson kinds still count lessons
+    assert notification_rows(user_id) == [('comment', 7, 2), ('lesson_assigned', 0, 5)]
+
+def test_compaction_counts_distinct_actors(writer, monkeypatch):
+    import notifications
+    from db import connect
+    user_id = 9002
+    now = time.time()
+    for offset, actors in ((-3 * 3600, (1, 2)), (-2 * 3600, (2,)), (-3600, (2, 3))):
+        monkeypatch.setattr(notifications.time, 'time', lambda: now + offset)
+        for actor_id in actors:
+            writer.notify(user_id, 'like', 8, actor_id, f'actor {actor_id}')
+        writer.notify(user_id, 'lesson_confirmed', 0, 1, 'one')
+        writer.flush()
+    monkeypatch.undo()
+    assert [count for kind, _, count in notification_rows(user_id) if kind == 'like'] == [2, 1, 2]
+
+    monkeypatch.setenv('NOTIFY_COMPACT_DAYS', '0')
+    conn = connect()
+    try:
+        assert notifications.compact(conn)['merged'] == 4
+        orphans = conn.execute("SELECT COUNT(*) FROM notification_actors WHERE notification_id NOT IN (SELECT id FROM notifications)").fetchone()[0]
+    finally:
+        conn.close()
+    assert sorted(notification_rows(user_id)) == [('lesson_confirmed', 0, 3), ('like', 8, 3)]
+    assert orphans == 0
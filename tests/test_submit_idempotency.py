@@ -0,0 +1,59 @@
+# tests/test_submit_idempotency.py
+# A lesson answer is graded once however often it is sent: a resend with the same
+# idempotency key replays the first response, the same key on another lesson is refused,
+# and a second tap while the first request is in flight sends nothing.
+import json
+import shutil
+import subprocess
+
+import pytest
+
+from test_trace_submission import STUB_DOM, ok, page_function, query
+
+def setup_kid(app, name):
+    parent, kid = app.test_client(), app.test_client()
+    ok(parent.post('/register', data={'email': f'{name}-parent@example.com', 'password': 'secret1', 'grade': '1', 'handle': f'{name}Parent'}))
+    ok(parent.post('/login', data={'email': f'{name}-parent@example.com', 'password': 'secret1'}))
+    ok(parent.post('/register_child', data={'email': f'{name}-kid@example.com', 'password': 'secret1', 'grade': '1', 'handle': f'{name}Kid'}))
+    ok(kid.post('/login', data={'email': f'{name}-kid@example.com', 'password': 'secret1'}))
+    kid_id = query("SELECT id FROM users WHERE email = ?", (f'{name}-kid@example.com',))[0]
+    return parent, kid, kid_id
+
+def test_key_replays_on_same_lesson_and_is_refused_on_another(app):
+    parent, kid, kid_id = setup_kid(app, 'idem')
+    first, second = query("SELECT id FROM lessons WHERE grade = 1 AND trace_word IS NOT NULL ORDER BY id LIMIT 2")
+    body = {'activities': {'trace': 'strokes:v1:300x150:10,10,5,5'}, 'idempotency_key': 'tap-1'}
+
+    response = kid.post(f'/api/lessons/{first}/submit', json=body)
+    assert response.status_code == 200 and not response.get_json().get('replayed')
+    response = kid.post(f'/api/lessons/{first}/submit', json=body)
+    assert response.status_code == 200 and response.get_json()['replayed']
+
+    response = kid.post(f'/api/lessons/{second}/submit', json=body)
+    assert response.status_code == 422 and not response.get_json()['success']
+    assert query("SELECT COUNT(*) FROM activity_responses WHERE user_id = ? AND lesson_id = ?", (kid_id, second)) == [0]
+    assert query("SELECT COUNT(*) FROM activity_responses WHERE user_id = ? AND lesson_id = ?", (kid_id, first)) == [1]
+
+@pytest.mark.skipif(not shutil.which('node'), reason="needs node to run the page's JavaScript")
+def test_double_tap_sends_one_request(app):
+    parent, kid, kid_id = setup_kid(app, 'tap')
+    lesson_id = query("SELECT id FROM lessons WHERE grade = 1 AND trace_word IS NOT NULL ORDER BY id LIMIT 1")[0]
+    ok(parent.post('/add_to_feed', json={'lesson_id': lesson_id, 'target_user_id': kid_id}))
+
+    html = ok(kid.get('/home')).get_data(as_text=True)
+    event = '{preventDefault() {}, stopPropagation() {}}'
+    script = (STUB_DOM.replace('LESSON_ID', str(lesson_id))
+              + page_function(html, 'traceResponse') + '\n'
+              + page_function(html, 'submitActivity') + '\n'
+              + f"Promise.all([window.submitActivity({event}, {lesson_id}, 'trace'),"
+              + f" window.submitActivity({event}, {lesson_id}, 'trace')])"
+              + ".then(() => window.submitActivity(" + event + f", {lesson_id}, 'trace'))"
+              + ".then(() => console.log(JSON.stringify(requests)));\n")
+    result = subprocess.run(['node', '-e', script], capture_output=True, text=True, timeout=30)
+    assert result.returncode == 0, result.stderr
+    requests = json.loads(result.stdout.strip().splitlines()[-1])
+
+    # The overlapping taps send one request; a later, separate answer sends its own
+    assert len(requests) == 2
+    keys = [json.loads(r['body'])['idempotency_key'] for r in requests]
+    assert keys[0] and keys[1] and keys[0] != keys[1]
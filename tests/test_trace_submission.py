@@ -0,0 +1,84 @@
+# tests/test_trace_submission.py
+# The lesson card's "Save & Check" button must upload the trace as strokes (strokes:v1:...,
+# see drawings.py), not as a PNG data URL. The page's own submitActivity is run under node
+# with a stub DOM, and the request it makes is then sent to the server.
+import json
+import re
+import shutil
+import subprocess
+
+import pytest
+
+def ok(response):
+    assert response.status_code in (200, 302), (response.status_code, response.data[:300])
+    return response
+
+def query(sql, params=()):
+    from db import connect
+    conn = connect()
+    try:
+        return [row[0] for row in conn.execute(sql, params).fetchall()]
+    finally:
+        conn.close()
+
+def page_function(html, name):
+    """Source of `window.<name> = ...;` as defined in the rendered page."""
+    match = re.search(r'^( *)window\.' + name + r' = (?:async )?function.*?^\1\};', html, re.M | re.S)
+    assert match, f"window.{name} is not defined on the page"
+    return match.group(0)
+
+STUB_DOM = """
+const canvas = {width: 300, height: 150, traceStrokes: [[10, 10, 5, 5, 3, 0], [50, 60, 1, 1]],
+                dataset: {}, toDataURL() { return 'data:image/png;base64,AAAA'; }};
+const card = {dataset: {completed: 'false'}, classList: {add() {}}, querySelector() { return null; }};
+globalThis.window = globalThis;
+globalThis.document = {
+    getElementById(id) { return id === 'trace-canvas-LESSON_ID' ? canvas : id === 'lesson-LESSON_ID' ? card : null; },
+    querySelector() { return null; },
+    createElement() { return {}; },
+};
+globalThis.alert = () => {};
+const requests = [];
+globalThis.fetch = async (url, options) => {
+    requests.push({url, method: options.method, body: options.body});
+    return {json: async () => ({success: false, error: 'stub'})};
+};
+"""
+
+@pytest.mark.skipif(not shutil.which('node'), reason="needs node to run the page's JavaScript")
+def test_trace_submission_sends_strokes(app):
+    parent, kid = app.test_client(), app.test_client()
+    ok(parent.post('/register', data={'email': 'trace-parent@example.com', 'password': 'secret1', 'grade': '1', 'handle': 'TraceParent'}))
+    ok(parent.post('/login', data={'email': 'trace-parent@example.com', 'password': 'secret1'}))
+    ok(parent.post('/register_child', data={'email': 'trace-kid@example.com', 'password': 'secret1', 'grade': '1', 'handle': 'TraceKid'}))
+    ok(kid.post('/login', data={'email': 'trace-kid@example.com', 'password': 'secret1'}))
+    kid_id = query("SELECT id FROM users WHERE email = 'trace-kid@example.com'")[0]
+    lesson_id = query("SELECT id FROM lessons WHERE grade = 1 AND trace_word IS NOT NULL ORDER BY id LIMIT 1")[0]
+    ok(parent.post('/add_to_feed', json={'lesson_id': lesson_id, 'target_user_id': kid_id}))
+
+    html = ok(kid.get('/home')).get_data(as_text=True)
+    assert f'id="trace-canvas-{lesson_id}"' in html
+    # One definition, so nothing later on the page can replace it
+    assert html.count('window.submitActivity =') == 1
+    script = (STUB_DOM.replace('LESSON_ID', str(lesson_id))
+              + page_function(html, 'traceResponse') + '\n'
+              + page_function(html, 'submitActivity') + '\n'
+              + f"window.submitActivity({{preventDefault() {{}}, stopPropagation() {{}}}}, {lesson_id}, 'trace')"
+              + ".then(() => console.log(JSON.stringify(requests)));\n")
+    result = subprocess.run(['node', '-e', script], capture_output=True, text=True, timeout=30)
+    assert result.returncode == 0, result.stderr
+    requests = json.loads(result.stdout.strip().splitlines()[-1])
+
+    assert len(requests) == 1
+    request = requests[0]
+    assert request['url'] == f'/api/lessons/{lesson_id}/submit'
+    body = json.loads(request['body'])
+    assert body['activities']['trace'] == 'strokes:v1:300x150:10,10,5,5,3,0;50,60,1,1'
+    assert body['idempotency_key']
+
+    # The server keeps the strokes by digest
+    data = ok(kid.post(request['url'], json=body)).get_json()
+    assert data['success'] and data['results']['trace']['is_correct']
+    stored = query("SELECT response FROM activity_responses WHERE user_id = ? AND lesson_id = ? AND activity_type = 'trace'",
+                   (kid_id, lesson_id))
+    assert len(stored) == 1 and re.fullmatch(r'strokes:[0-9a-f]{64}', stored[0])
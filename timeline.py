@@ -0,0 +1,116 @@
+# timeline.py
+# Materialised "latest" home timeline. Every new post is fanned out on write into
+# home_timeline: global posts to every user, lesson posts to their owner only. home()
+# then reads a user's page as one range scan of the (user_id, created_at, post_id) key.
+# Deleted posts are skipped on read and swept out by trim().
+#
+# Each user's timeline holds only the newest TIMELINE_MAX_ENTRIES entries (trimmed by the
+# maintenance job), which is always an unbroken prefix of their feed. Once a reader runs off
+# the end of it, home_routes continues from the same (created_at, id) cursor against posts.
+# Users with no entries yet (new accounts, before a backfill) just take that path from page one.
+#
+# Run with: python timeline.py backfill   (rebuilds every user's timeline from posts)
+import logging
+import os
+import sys
+import unread_counts
+
+logger = logging.getLogger(__name__)
+
+def max_entries():
+    return int(os.environ.get('TIMELINE_MAX_ENTRIES', 1000))
+
+def fan_out_post(c, post_id):
+    """Add a newly inserted post to the timelines that should show it and bump those users'
+    unread counters. Call inside the transaction that inserted the post."""
+    return fan_out_posts(c, [post_id])
+
+def fan_out_posts(c, post_ids):
+    """fan_out_post() for several posts inserted in one transaction."""
+    placeholders = ', '.join('?' * len(post_ids))
+    c.execute(f"""
+        INSERT OR IGNORE INTO home_timeline (user_id, created_at, post_id, lesson_id)
+        SELECT u.id, p.created_at, p.id, p.lesson_id
+        FROM posts p JOIN users u ON p.type = 'post' OR (p.type = 'lesson' AND u.id = p.user_id)
+        WHERE p.id IN ({placeholders}) AND p.created_at IS NOT NULL
+    """, post_ids)
+    fanned_out = c.rowcount
+    unread_counts.increment_for_posts(c, post_ids)
+    return fanned_out
+
+def fetch_rows(c, user_id, cursor, limit):
+    """Up to `limit` timeline entries after cursor, joined to their posts. Returns
+    (rows, exhausted). Rows for deleted posts or completed lessons are skipped but still
+    count towards the limit, so `exhausted` means the timeline itself ran out."""
+    after_entry = "AND (t.created_at, t.post_id) < (?, ?)" if cursor else ""
+    query = f'''SELECT p.*, t.created_at as sort_key, t.post_id as timeline_post_id,
+                COALESCE(u.handle, p.handle) as handle, orig_u.handle as original_handle, COALESCE(u.profile_picture, '') as profile_picture,
+                EXISTS (SELECT 1 FROM completed_lessons cl WHERE cl.user_id = t.user_id AND cl.lesson_id = t.lesson_id) as lesson_done
+                FROM home_timeline t
+                LEFT JOIN posts p ON p.id = t.post_id
+                LEFT JOIN users u ON p.user_id = u.id
+                LEFT JOIN posts orig ON p.original_post_id = orig.id
+                LEFT JOIN users orig_u ON orig.user_id = orig_u.id
+                WHERE t.user_id = ? {after_entry}
+                ORDER BY t.created_at DESC, t.post_id DESC
+                LIMIT ?'''
+    params = [user_id] + (list(cursor) if cursor else []) + [limit]
+    c.execute(query, params)
+    rows = [dict(row) for row in c.fetchall()]
+    exhausted = len(rows) < limit
+    return rows, exhausted
+
+def trim(conn, keep=None):
+    """Drop entries beyond the newest `keep` per user and entries whose post is gone."""
+    keep = keep or max_entries()
+    c = conn.cursor()
+    c.execute("""
+        DELETE FROM home_timeline
+        WHERE (user_id, created_at, post_id) IN (
+            SELECT user_id, created_at, post_id FROM (
+                SELECT user_id, created_at, post_id,
+                       ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY created_at DESC, post_id DESC) as rn
+                FROM home_timeline
+            ) WHERE rn > ?
+        )
+    """, (keep,))
+    trimmed = c.rowcount
+    c.execute("DELETE FROM home_timeline WHERE post_id NOT IN (SELECT id FROM posts)")
+    orphaned = c.rowcount
+    conn.commit()
+    return {'trimmed': trimmed, 'orphaned': orphaned}
+
+def backfill(conn, keep=None):
+    """Rebuild every user's timeline from posts: their newest `keep` feed entries."""
+    keep = keep or max_entries()
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        c.execute("DELETE FROM home_timeline")
+        c.execute("""
+            INSERT INTO home_timeline (user_id, created_at, post_id, lesson_id)
+            SELECT user_id, created_at, post_id, lesson_id FROM (
+                SELECT u.id as user_id, p.created_at, p.id as post_id, p.lesson_id,
+                       ROW_NUMBER() OVER (PARTITION BY u.id ORDER BY p.created_at DESC, p.id DESC) as rn
+                FROM users u
+                JOIN posts p ON p.type = 'post' OR (p.type = 'lesson' AND p.user_id = u.id)
+                WHERE p.created_at IS NOT NULL
+            ) WHERE rn <= ?
+        """, (keep,))
+        inserted = c.rowcount
+        conn.commit()
+        logger.info(f"Backfilled {inserted} home_timeline entries")
+        return inserted
+    except Exception:
+        conn.rollback()
+        raise
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    if sys.argv[1:2] != ['backfill']:
+        print("Usage: python timeline.py backfill")
+        sys.exit(2)
+    from db import connect
+    conn = connect()
+    print(f"Inserted {backfill(conn)} timeline entries")
+    conn.close()
@@ -0,0 +1,78 @@
+# unread_counts.py
+# Per-user unread notification counters. A post counts as unread for the users whose
+# timeline it lands in (see timeline.py), except its own author: everyone else for a global
+# post, the owner for a lesson post. timeline.fan_out_post() bumps the counters in the
+# post's transaction and opening the feed or marking notifications read resets them, so
+# /api/notifications_count is a primary-key lookup.
+#
+# Users who have never opened the feed have no unread count, as before.
+#
+# Counters can drift (deleted posts are never decremented); repair() recomputes them from
+# posts and users.last_feed_view and runs as a maintenance task.
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Python and SQL forms of the same rule, for the notification stream and the repair job
+def is_unread_for(user_id, post_user_id, post_type):
+    if post_type == 'lesson':
+        return post_user_id == user_id
+    return post_type == 'post' and post_user_id != user_id
+
+UNREAD_FOR_USER_SQL = "((p.type = 'post' AND p.user_id != u.id) OR (p.type = 'lesson' AND p.user_id = u.id))"
+
+def get_count(c, user_id):
+    c.execute("SELECT count FROM unread_counts WHERE user_id = ?", (user_id,))
+    row = c.fetchone()
+    return row[0] if row else 0
+
+def increment_for_posts(c, post_ids):
+    placeholders = ', '.join('?' * len(post_ids))
+    c.execute(f"""
+        INSERT INTO unread_counts (user_id, count)
+        SELECT u.id, COUNT(*) FROM posts p JOIN users u ON {UNREAD_FOR_USER_SQL}
+        WHERE p.id IN ({placeholders}) AND u.last_feed_view IS NOT NULL
+        GROUP BY u.id
+        ON CONFLICT(user_id) DO UPDATE SET count = count + excluded.count
+    """, post_ids)
+
+def reset(c, user_id):
+    c.execute("INSERT INTO unread_counts (user_id, count) VALUES (?, 0) ON CONFLICT(user_id) DO UPDATE SET count = 0", (user_id,))
+
+# What each user's counter should be: posts since they last opened the feed that count for them.
+# julianday() because created_at mixes datetime('now') and isoformat() values, which don't
+# compare correctly as strings.
+EXPECTED_COUNTS_SQL = f"""
+    SELECT u.id as user_id,
+           CASE WHEN u.last_feed_view IS NULL THEN 0 ELSE
+               (SELECT COUNT(*) FROM posts p
+                WHERE julianday(p.created_at) > julianday(u.last_feed_view) AND {UNREAD_FOR_USER_SQL})
+           END as count
+    FROM users u
+"""
+
+def recompute(c):
+    """Rewrite every counter from source data. Returns the number of users that had drifted."""
+    c.execute(f"""
+        WITH expected AS ({EXPECTED_COUNTS_SQL})
+        SELECT COUNT(*) FROM expected e
+        LEFT JOIN unread_counts uc ON uc.user_id = e.user_id
+        WHERE COALESCE(uc.count, 0) != e.count
+    """)
+    drifted = c.fetchone()[0]
+    c.execute("DELETE FROM unread_counts")
+    c.execute(f"INSERT INTO unread_counts (user_id, count) {EXPECTED_COUNTS_SQL}")
+    return drifted
+
+def repair(conn):
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        drifted = recompute(c)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    if drifted:
+        logger.warning(f"Repaired unread counters for {drifted} users")
+    return {'drifted': drifted}
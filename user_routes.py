@@ -7,6 +7,12 @@ from datetime import datetime
 from werkzeug.security import generate_password_hash
 from werkzeug.utils import secure_filename
 from db import get_db
+import drawings
+from feed_cache import feed_cache
+import timeline
+from lesson_catalog import lesson_catalog
+from notifications import notification_writer
+from ranking import refresh_hot_score
 from utils import allowed_file
 
 logger = logging.getLogger(__name__)
@@ -239,6 +245,10 @@ def parent_dashboard():
                 LIMIT 20
             """, (selected_kid_id,))
             responses = [dict(row) for row in c.fetchall()]
+            for response in responses:
+                # Trace drawings are shown as images (thumbnails are rendered on request)
+                if response['activity_type'] == 'trace':
+                    response['drawing'] = drawings.parse_ref(response['response']) or drawings.parse_ref(response['response'], drawings.STROKES_REF_PREFIX)
 
         # Get selected kid handle
         selected_kid_handle = next((kid['handle'] for kid in kids if kid['id'] == selected_kid_id), kids[0]['handle'])
@@ -296,7 +306,9 @@ def confirm_lesson(lesson_id):
         if updated > 0:
             # Delete the lesson post
             c.execute("DELETE FROM posts WHERE type = 'lesson' AND lesson_id = ? AND user_id = ?", (lesson_id, kid_id))
+            feed_cache.publish_user(c, kid_id)
             conn.commit()
+            notification_writer.notify(kid_id, 'lesson_confirmed', 0, session['user_id'], session.get('handle'))
             logger.info(f"Parent {session['user_id']} confirmed lesson {lesson_id} for kid {kid_id}")
             return jsonify({'success': True})
         else:
@@ -337,15 +349,18 @@ def restore_lesson(lesson_id):
         c.execute("DELETE FROM completed_lessons WHERE lesson_id = ? AND user_id = ?", (lesson_id, kid_id))
 
         # Re-create lesson post
-        c.execute("SELECT title, subject, grade, description FROM lessons WHERE id = ?", (lesson_id,))
-        lesson = c.fetchone()
+        lesson = lesson_catalog.get(c, lesson_id)
         if lesson:
             now = datetime.now().isoformat()
-            content = f"{lesson['title']} - {lesson['description'][:100]}..." if lesson['description'] else lesson['title']
+            content = f"{lesson.title} - {lesson.description[:100]}..." if lesson.description else lesson.title
             c.execute("""
                 INSERT INTO posts (user_id, content, created_at, likes, reposts, views, subject, grade, handle, type, lesson_id)
                 VALUES (?, ?, ?, 0, 0, 0, ?, ?, ?, 'lesson', ?)
-            """, (kid_id, content, now, lesson['subject'], lesson['grade'], kid_handle, lesson_id))
+            """, (kid_id, content, now, lesson.subject, lesson.grade, kid_handle, lesson_id))
+            new_post_id = c.lastrowid
+            refresh_hot_score(c, new_post_id)
+            timeline.fan_out_post(c, new_post_id)
+            feed_cache.publish_user(c, kid_id)
             conn.commit()
             logger.info(f"Parent {session['user_id']} restored lesson {lesson_id} for kid {kid_id}")
             return jsonify({'success': True})
@@ -0,0 +1,95 @@
+# view_counter.py
+# Write-behind buffer for posts.views. The feed records views here instead of
+# running one UPDATE per rendered post; a background thread per worker flushes
+# the aggregated increments in a single transaction.
+#
+# Loss is bounded: a worker that dies without a clean shutdown loses at most
+# VIEW_FLUSH_SECONDS worth of views, capped at VIEW_FLUSH_MAX_PENDING distinct posts
+# (reaching the cap triggers an immediate flush). Clean exits flush via atexit.
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+class ViewCounterBuffer:
+    def __init__(self, flush_seconds=None, max_pending=None):
+        self.flush_seconds = float(flush_seconds or os.environ.get('VIEW_FLUSH_SECONDS', 10))
+        self.max_pending = int(max_pending or os.environ.get('VIEW_FLUSH_MAX_PENDING', 500))
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.pid = None
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.flushed_total = 0
+
+    def _ensure_worker(self):
+        # Called with self.lock held. Gunicorn forks workers after the app is imported,
+        # so the thread (and any counts inherited from the master) belong to one pid.
+        if self.pid == os.getpid() and self.thread and self.thread.is_alive():
+            return
+        if self.pid != os.getpid():
+            self.pending = {}
+            self.pid = os.getpid()
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._run, name='view-counter-flush', daemon=True)
+        self.thread.start()
+
+    def record(self, post_ids):
+        """Count one view for each post id. Never touches the database."""
+        with self.lock:
+            self._ensure_worker()
+            for post_id in post_ids:
+                self.pending[post_id] = self.pending.get(post_id, 0) + 1
+            if len(self.pending) >= self.max_pending:
+                self.wakeup.set()
+
+    def pending_for(self, post_id):
+        """Views recorded in this worker but not yet written, so pages can show them."""
+        with self.lock:
+            return self.pending.get(post_id, 0)
+
+    def flush(self):
+        with self.lock:
+            if not self.pending:
+                return 0
+            batch, self.pending = self.pending, {}
+        conn = None
+        try:
+            from db import connect
+            conn = connect()
+            conn.executemany("UPDATE posts SET views = views + ? WHERE id = ?",
+                             [(count, post_id) for post_id, count in batch.items()])
+            conn.executemany("UPDATE posts SET hot_score = hot_score(likes, reposts, views, comment_count, created_at) WHERE id = ?",
+                             [(post_id,) for post_id in batch])
+            conn.commit()
+            self.flushed_total += sum(batch.values())
+            logger.debug(f"Flushed views for {len(batch)} posts")
+            return len(batch)
+        except sqlite3.Error as e:
+            logger.error(f"View counter flush failed, keeping {len(batch)} posts for retry: {str(e)}")
+            with self.lock:
+                for post_id, count in batch.items():
+                    self.pending[post_id] = self.pending.get(post_id, 0) + count
+            return 0
+        finally:
+            if conn:
+                conn.close()
+
+    def _run(self):
+        while not self.stopped.is_set():
+            self.wakeup.wait(self.flush_seconds)
+            self.wakeup.clear()
+            self.flush()
+
+    def shutdown(self):
+        self.stopped.set()
+        self.wakeup.set()
+        if self.pid == os.getpid():
+            self.flush()
+
+view_counter = ViewCounterBuffer()
+atexit.register(view_counter.shutdown)